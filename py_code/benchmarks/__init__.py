@@ -0,0 +1,6 @@
+"""
+File: __init__.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+离线基准测试：使用模拟模型测量游戏图编排、提示词构建与计票的开销
+"""
@@ -0,0 +1,414 @@
+"""
+File: run.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+基准测试套件：离线运行（模拟模型，无延迟），输出JSON结果并与基线比较
+
+用法（在 py_code 目录下）：
+    python -m benchmarks.run                              # 运行并与 benchmarks/baseline.json 比较
+    python -m benchmarks.run --output results.json        # 同时保存本次结果
+    python -m benchmarks.run --save-baseline              # 以本次结果更新基线
+    python -m benchmarks.run --filter elimination --quick # 只运行部分用例，减少重复次数
+
+比较使用各轮最小耗时（受系统抖动影响最小）；任一用例比基线慢超过 --threshold（默认25%）时
+以退出码1结束，可直接用于部署前检查。
+"""
+import argparse
+import contextlib
+import functools
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable
+
+from src.agents.fake import FakeChatModel
+from src.agents.llm import set_llm
+from src.graph import events, instrumentation
+from src.graph.builder import build_game_graph, GAME_RECURSION_LIMIT
+from src.graph.history import GameHistory
+from src.graph.leaks import LeakScanner, WordAutomaton, get_automaton
+from src.graph.nodes import process_elimination_node
+from src.graph.suspicion import score_speeches
+from src.graph.types import (
+    GameState, GameStatus, Player, PlayerRegistry, PlayerRole, PlayerType, TableConfig, UnderCoverGameManager
+)
+from .startup import cold_start_seconds
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+
+# ==================== 测量 ====================
+@dataclass
+class BenchResult:
+    """一个用例的测量结果（耗时单位：秒/次）"""
+    name: str
+    median: float
+    min: float
+    number: int  # 每轮执行次数
+    repeat: int  # 轮数
+    extra: dict
+
+    @property
+    def ops_per_sec(self) -> float:
+        return 1 / self.median if self.median > 0 else float("inf")
+
+
+def measure(
+        name: str,
+        fn: Callable,
+        setup: Callable[[], object] | None = None,
+        number: int = 100,
+        repeat: int = 5,
+        **extra,
+) -> BenchResult:
+    """多轮测量 fn 的单次耗时，记录各轮平均耗时的中位数与最小值（测量期间关闭GC，同 timeit）
+
+    传入 setup 时每次调用前准备一个新参数（不计入耗时），fn 以该参数调用
+    """
+    timings = []
+    for _ in range(repeat):
+        args = [setup() for _ in range(number)] if setup else None
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            if args is None:
+                for _ in range(number):
+                    fn()
+            else:
+                for arg in args:
+                    fn(arg)
+            timings.append((time.perf_counter() - start) / number)
+        finally:
+            gc.enable()
+    return BenchResult(name, statistics.median(timings), min(timings), number, repeat, extra)
+
+
+class _StepTimer(instrumentation.NullTracer):
+    """统计节点本身的执行次数与耗时，用于从整局耗时中分离出图调度开销"""
+
+    def __init__(self):
+        self.steps = 0
+        self.node_seconds = 0.0
+
+    def wrap_node(self, name: str, node: Callable) -> Callable:
+        @functools.wraps(node)
+        def wrapper(state, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return node(state, *args, **kwargs)
+            finally:
+                self.node_seconds += time.perf_counter() - start
+                self.steps += 1
+        return wrapper
+
+
+# ==================== 用例数据 ====================
+def _make_players(count: int, seed: int = 0) -> list[Player]:
+    rng = random.Random(seed)
+    undercover_id = rng.randrange(count)
+    return [
+        Player(
+            id=i,
+            name=f"AI{i + 1}",
+            player_type=PlayerType.AI,
+            player_role=PlayerRole.UNDERCOVER if i == undercover_id else PlayerRole.NORMAL,
+            word="挖掘机" if i == undercover_id else "拖拉机",
+        )
+        for i in range(count)
+    ]
+
+
+def _make_history(players: list[Player], rounds: int) -> GameHistory:
+    history = GameHistory()
+    for game_round in range(1, rounds + 1):
+        history.record_round({
+            "round": game_round,
+            "eliminated_id": players[game_round].id,
+            "eliminated_name": players[game_round].name,
+            "eliminated_role": players[game_round].player_role.value,
+            "votes": {p.id: players[(p.id + 1) % len(players)].id for p in players},
+            "speeches": {p.id: "这个东西在生活中很常见" for p in players},
+        })
+    return history
+
+
+def _elimination_state(count: int, seed: int) -> GameState:
+    """一个待计票的回合状态：所有玩家存活且已投票"""
+    rng = random.Random(seed)
+    players = _make_players(count, seed)
+    ids = [p.id for p in players]
+    return GameState(
+        seed=seed,
+        game_status=GameStatus.ROUND_VOTING,
+        players=PlayerRegistry(players),
+        current_round=1,
+        speech_turn=count,
+        round_speech={p.id: "这个东西在生活中很常见" for p in players},
+        round_votes={voter: rng.choice([i for i in ids if i != voter]) for voter in ids},
+        revote_candidates=[],
+        revotes=0,
+        vote_result=None,
+        game_history=GameHistory(),
+        eliminated_players=[],
+        messages=[],
+    )
+
+
+# ==================== 用例 ====================
+def bench_graph_compile(scale: float) -> list[BenchResult]:
+    return [measure("graph_compile", build_game_graph, number=max(1, int(20 * scale)))]
+
+
+def bench_graph_step(scale: float) -> list[BenchResult]:
+    """整局游戏中每一步的图调度开销（整局耗时减去节点自身耗时，除以步数）"""
+    timer = _StepTimer()
+    previous = instrumentation.get_tracer()
+    instrumentation.set_tracer(timer)
+    try:
+        graph = build_game_graph()
+    finally:
+        instrumentation.set_tracer(previous)
+    manager = UnderCoverGameManager()
+    games, repeat = max(2, int(10 * scale)), 5
+    overheads = []
+    for _ in range(repeat):
+        timer.steps, timer.node_seconds = 0, 0.0
+        states = [manager.initialize_game(num_humans=0, seed=seed, table=TableConfig()) for seed in range(games)]
+        start = time.perf_counter()
+        for state in states:
+            graph.invoke(state, {"recursion_limit": GAME_RECURSION_LIMIT})
+        overheads.append((time.perf_counter() - start - timer.node_seconds) / timer.steps)
+    return [BenchResult(
+        "graph_step_overhead", statistics.median(overheads), min(overheads), timer.steps, repeat, {"games": games}
+    )]
+
+
+def bench_prompts(scale: float) -> list[BenchResult]:
+    manager = UnderCoverGameManager()
+    players = _make_players(12)
+    player = players[0]
+    history = _make_history(players, 3).prompt_context()
+    speeches = {p.id: "这个东西在生活中很常见" for p in players}
+    alive = [p.id for p in players]
+    number = max(10, int(2000 * scale))
+    return [
+        measure(
+            "speech_prompt",
+            lambda: manager.get_player_speech_prompt(player, speeches, 4, history),
+            number=number,
+        ),
+        measure(
+            "vote_prompt",
+            lambda: manager.get_player_vote_prompt(player, speeches, alive, history),
+            number=number,
+        ),
+    ]
+
+
+def bench_suspicion(scale: float) -> list[BenchResult]:
+    """一回合全部发言的本地可疑度评分（VOTE_MODE=hint/local 时每回合每次投票计算一次）"""
+    rng = random.Random(0)
+    phrases = ["这个东西在生活中很常见", "颜色比较鲜艳", "小朋友很喜欢", "可以在超市买到", "和季节有关", "形状是圆的"]
+    number = max(10, int(500 * scale))
+    results = []
+    for count in (4, 12):
+        speeches = {player_id: "，".join(rng.sample(phrases, 2)) for player_id in range(count)}
+        results.append(measure(
+            f"suspicion_scores_{count}", lambda: score_speeches(speeches), number=number, players=count
+        ))
+    return results
+
+
+def bench_leaks(scale: float) -> list[BenchResult]:
+    """流式发言泄词检测（每条发言按5个分块送入），词表大小不同时单条发言的检测耗时应基本不变"""
+    rng = random.Random(0)
+    alphabet = "常见日生活中经常用到颜色形状和有关大家都见过的东西味道不错小时候"
+    synthetic = WordAutomaton({"".join(rng.choices(alphabet, k=rng.randint(2, 4))) for _ in range(10000)})
+    speech = "它在日常生活中很常见，颜色比较鲜艳，小朋友很喜欢，可以在超市买到"
+    chunks = [speech[i:i + 6] for i in range(0, len(speech), 6)]
+    number = max(10, int(2000 * scale))
+    results = []
+    for name, automaton in [("leak_scan_store", get_automaton()), ("leak_scan_10k", synthetic)]:
+        forbidden = frozenset(["棉花糖"])
+
+        def scan(automaton=automaton):
+            scanner = LeakScanner(automaton, forbidden)
+            for chunk in chunks:
+                scanner.feed(chunk)
+            scanner.flush()
+
+        results.append(measure(name, scan, number=number, words=len(automaton)))
+    return results
+
+
+def bench_elimination(scale: float) -> list[BenchResult]:
+    results = []
+    number = max(10, int(500 * scale))
+    for count in (4, 12, 100):
+        # 每轮使用同一组种子，各轮的计票输入一致
+        seeds = itertools.cycle(range(number))
+        results.append(measure(
+            f"process_elimination_{count}",
+            process_elimination_node,
+            setup=lambda: _elimination_state(count, next(seeds)),
+            number=number,
+            players=count,
+        ))
+    return results
+
+
+def bench_games(scale: float) -> list[BenchResult]:
+    """端到端整局耗时（结果中的 ops_per_sec 即每秒局数）：默认4人局与12人2卧底1白板局"""
+    graph = build_game_graph()
+    manager = UnderCoverGameManager()
+    results = []
+    for name, table, number in [
+        ("game_end_to_end", TableConfig(), max(2, int(20 * scale))),
+        ("game_end_to_end_12", TableConfig(12, 2, 1), max(2, int(5 * scale))),
+    ]:
+        # 每轮使用同一组种子，各轮的对局内容与回合数一致
+        seeds = itertools.cycle(range(number))
+        results.append(measure(
+            name,
+            lambda state: graph.invoke(state, {"recursion_limit": GAME_RECURSION_LIMIT}),
+            setup=lambda: manager.initialize_game(num_humans=0, seed=next(seeds), table=table),
+            number=number,
+        ))
+    return results
+
+
+def bench_startup(scale: float) -> list[BenchResult]:
+    """冷启动：全新解释器中导入入口模块，以及导入后取得编译好的游戏图"""
+    number = max(2, int(5 * scale))
+    return [
+        measure("startup_import_main", lambda: cold_start_seconds("import src.app.main"), number=number, repeat=3),
+        measure(
+            "startup_first_graph",
+            lambda: cold_start_seconds("import src.app.main as main; main.game_graph"),
+            number=number,
+            repeat=3,
+        ),
+    ]
+
+
+BENCHMARKS: dict[str, Callable[[float], list[BenchResult]]] = {
+    "startup": bench_startup,
+    "graph_compile": bench_graph_compile,
+    "graph_step": bench_graph_step,
+    "prompts": bench_prompts,
+    "suspicion": bench_suspicion,
+    "leaks": bench_leaks,
+    "elimination": bench_elimination,
+    "games": bench_games,
+}
+
+
+# ==================== 结果与基线 ====================
+def run_benchmarks(names: list[str], scale: float) -> dict:
+    """运行用例，返回可写入JSON的结果"""
+    # 无延迟的模拟模型，只测量本项目代码与 LangGraph 的开销
+    set_llm(FakeChatModel(seed=0, ttft_ms=0, tokens_per_sec=0))
+    instrumentation.set_tracer(instrumentation.NullTracer())
+    # 基准只测编排开销，游戏事件不渲染
+    events.set_event_bus(events.EventBus())
+    results: list[BenchResult] = []
+    # 其余控制台输出不应刷屏
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        for name in names:
+            results.extend(BENCHMARKS[name](scale))
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "scale": scale,
+        },
+        "results": {
+            result.name: {**asdict(result), "ops_per_sec": result.ops_per_sec}
+            for result in results
+        },
+    }
+
+
+def compare(current: dict, baseline: dict) -> list[tuple[str, float, float, float]]:
+    """与基线比较最小耗时，返回 [(用例, 基线, 当前, 变化比例)]，基线中不存在的用例跳过"""
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        rows.append((name, base["min"], result["min"], result["min"] / base["min"] - 1))
+    return rows
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds * 1e6:.1f}µs"
+
+
+def print_report(current: dict, rows: list[tuple[str, float, float, float]], threshold: float) -> None:
+    print("=" * 84)
+    print("基准测试结果")
+    print("=" * 84)
+    compared = {row[0]: row for row in rows}
+    print(f"{'用例':<26}{'中位耗时':>12}{'最小耗时':>12}{'次/秒':>12}{'基线':>12}{'变化':>10}")
+    for name, result in current["results"].items():
+        line = (
+            f"{name:<26}{_format_seconds(result['median']):>12}{_format_seconds(result['min']):>12}"
+            f"{result['ops_per_sec']:>12.1f}"
+        )
+        if name in compared:
+            _, base, _, change = compared[name]
+            flag = " ⚠" if change > threshold else ""
+            line += f"{_format_seconds(base):>12}{change:>+10.1%}{flag}"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="谁是卧底 - 基准测试")
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的用例组")
+    parser.add_argument("--quick", action="store_true", help="减少重复次数，用于快速检查")
+    parser.add_argument("--output", help="结果JSON的保存路径")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="基线JSON路径")
+    parser.add_argument("--save-baseline", action="store_true", help="以本次结果覆盖基线")
+    parser.add_argument("--threshold", type=float, default=0.25, help="判定为性能回退的耗时增幅")
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    if not names:
+        parser.error(f"没有匹配的用例组，可选：{', '.join(BENCHMARKS)}")
+    current = run_benchmarks(names, scale=0.1 if args.quick else 1.0)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(current, ensure_ascii=False, indent=2), encoding="utf-8")
+    baseline_path = Path(args.baseline)
+    rows = []
+    if baseline_path.exists() and not args.save_baseline:
+        rows = compare(current, json.loads(baseline_path.read_text(encoding="utf-8")))
+    print_report(current, rows, args.threshold)
+
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(current, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n基线已更新：{baseline_path}")
+        return
+    regressions = [row for row in rows if row[3] > args.threshold]
+    if regressions:
+        print(f"\n{len(regressions)} 个用例慢于基线超过 {args.threshold:.0%}：{', '.join(row[0] for row in regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+File: startup.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+冷启动检查：导入耗时剖析报告 + 延迟导入约束
+
+用法（在 py_code 目录下）：
+    python -m benchmarks.startup                       # 剖析 src.app.main 的导入耗时并检查延迟导入
+    python -m benchmarks.startup --module src.app.simulate --top 30
+
+入口模块导入时不应加载 LAZY_MODULES 中登记的重量级依赖（它们在开始游戏、编译游戏图时才加载），
+违反时以退出码1结束。冷启动耗时与基线的比较见 benchmarks.run 的 startup 用例组。
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+# 项目根目录（py_code），子进程在此目录下运行以导入 src 包
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# 入口模块 -> 导入该模块时不应加载的重量级依赖
+LAZY_MODULES: dict[str, list[str]] = {
+    "src.app.main": ["langgraph", "langchain_core", "langchain_openai", "numpy", "ormsgpack"],
+}
+
+
+@dataclass
+class ImportRecord:
+    """-X importtime 输出中的一行（耗时单位：微秒）"""
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def _python(code: str, *flags: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def import_profile(module: str) -> list[ImportRecord]:
+    """在全新解释器中导入模块，解析 -X importtime 的输出，只保留该模块的导入子树
+
+    输出按后序排列：子模块在前，顶层模块（depth 0）在其子树之后
+    """
+    result = _python(f"import {module}", "-X", "importtime")
+    records = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        records.append(ImportRecord(
+            name=name.strip(),
+            self_us=int(self_us),
+            cumulative_us=int(cumulative_us),
+            depth=(len(name) - len(name.lstrip()) - 1) // 2,
+        ))
+    end = next(i for i in range(len(records) - 1, -1, -1) if records[i].depth == 0 and records[i].name == module)
+    start = end
+    while start > 0 and records[start - 1].depth > 0:
+        start -= 1
+    return records[start:end + 1]
+
+
+def loaded_modules(module: str) -> set[str]:
+    """导入模块后解释器中已加载的顶层包"""
+    code = f"import json, sys, {module}; print(json.dumps(sorted({{m.split('.')[0] for m in sys.modules}})))"
+    return set(json.loads(_python(code).stdout))
+
+
+def cold_start_seconds(code: str) -> float:
+    """在全新解释器中执行代码的总耗时（含解释器自身启动）"""
+    start = time.perf_counter()
+    _python(code)
+    return time.perf_counter() - start
+
+
+def print_profile(module: str, records: list[ImportRecord], top: int) -> None:
+    print("=" * 72)
+    print(f"导入耗时剖析：{module}（累计 {records[-1].cumulative_us / 1000:.1f}ms）")
+    print("=" * 72)
+    # 按累计耗时列出最重的依赖，缩进表示导入层级
+    print(f"{'模块':<48}{'自身ms':>10}{'累计ms':>12}")
+    for record in sorted(records, key=lambda r: r.cumulative_us, reverse=True)[:top]:
+        print(f"{'  ' * min(record.depth, 6)}{record.name:<{48 - 2 * min(record.depth, 6)}}"
+              f"{record.self_us / 1000:>10.1f}{record.cumulative_us / 1000:>12.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="谁是卧底 - 冷启动检查")
+    parser.add_argument("--module", default="src.app.main", help="要剖析的入口模块")
+    parser.add_argument("--top", type=int, default=20, help="列出累计耗时最高的模块数")
+    args = parser.parse_args()
+
+    print_profile(args.module, import_profile(args.module), args.top)
+
+    lazy = LAZY_MODULES.get(args.module)
+    if not lazy:
+        return
+    eager = sorted(set(lazy) & loaded_modules(args.module))
+    if eager:
+        print(f"\n导入 {args.module} 时加载了应延迟导入的依赖：{', '.join(eager)}")
+        sys.exit(1)
+    print(f"\n延迟导入检查通过：导入 {args.module} 未加载 {', '.join(lazy)}")
+
+
+if __name__ == "__main__":
+    main()
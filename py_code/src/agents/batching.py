@@ -0,0 +1,282 @@
+"""
+File: batching.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+跨对局请求合批：收集各对局节点同时发出的LLM请求，攒够一批或等待超时后整批提交，结果再分发回等待的节点
+
+适用于不关心单局延迟、只关心总吞吐的批量模拟。提交方式：
+- batch：调用客户端的 batch（一次提交多条提示词）
+- file：按 OpenAI Batch API 的 JSONL 格式写入请求文件，交给批处理执行器，再读取结果文件；
+  执行器为 local（本地用客户端逐批执行，作为离线替身）或 openai（上传到 OpenAI Batch API 并轮询结果）
+流式调用在合批模式下等整条响应返回后作为一个分块输出。
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Callable
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+class BatchItemError(RuntimeError):
+    """批处理结果中单条请求的错误，status_code 与提供方返回的一致，便于弹性中间层判断是否重试"""
+
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# ==================== 统计 ====================
+@dataclass
+class BatchStats:
+    """合批统计"""
+    batches: int = 0  # 提交的批次数
+    requests: int = 0  # 合批提交的请求数
+    full_batches: int = 0  # 攒满批大小后提交的批次数（其余为等待超时后提交）
+    max_batch: int = 0  # 最大批大小
+    wait_seconds: float = 0.0  # 请求在队列中等待的总时长
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    def merge(self, other: "BatchStats") -> None:
+        self.batches += other.batches
+        self.requests += other.requests
+        self.full_batches += other.full_batches
+        self.max_batch = max(self.max_batch, other.max_batch)
+        self.wait_seconds += other.wait_seconds
+
+
+# ==================== 批处理文件 ====================
+def _model_name(client) -> str:
+    return getattr(client, "model_name", None) or os.getenv("LLM_MODEL", "gpt-5-mini")
+
+
+def write_batch_file(path: str, prompts: list[str], model: str) -> None:
+    """按 OpenAI Batch API 的格式写入请求文件，custom_id 为请求在批内的序号"""
+    with open(path, "w", encoding="utf-8") as f:
+        for index, prompt in enumerate(prompts):
+            request = {
+                "custom_id": str(index),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": model, "messages": [{"role": "user", "content": prompt}]},
+            }
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+
+def read_batch_results(path: str, size: int) -> list:
+    """读取结果文件，按 custom_id 还原请求顺序；缺失的结果记为错误"""
+    results: list = [BatchItemError("批处理结果缺失")] * size
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            index = int(item["custom_id"])
+            response = item.get("response") or {}
+            if item.get("error") or response.get("status_code") != 200:
+                error = item.get("error") or response.get("body", {}).get("error") or {}
+                results[index] = BatchItemError(error.get("message", "批处理请求失败"), response.get("status_code"))
+                continue
+            body = response["body"]
+            usage = body.get("usage") or {}
+            results[index] = AIMessage(
+                content=body["choices"][0]["message"]["content"],
+                usage_metadata={
+                    "input_tokens": usage.get("prompt_tokens", 0),
+                    "output_tokens": usage.get("completion_tokens", 0),
+                    "total_tokens": usage.get("total_tokens", 0),
+                },
+            )
+    return results
+
+
+def run_local_batch(client, input_path: str, output_path: str) -> None:
+    """本地批处理执行器：读取请求文件，用客户端整批执行，按 OpenAI Batch API 的格式写入结果文件"""
+    with open(input_path, encoding="utf-8") as f:
+        requests = [json.loads(line) for line in f if line.strip()]
+    prompts = [request["body"]["messages"][-1]["content"] for request in requests]
+    responses = client.batch(prompts, return_exceptions=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        for request, response in zip(requests, responses):
+            if isinstance(response, Exception):
+                status = getattr(response, "status_code", None) or 500
+                item = {"response": {"status_code": status, "body": {"error": {"message": str(response)}}}}
+            else:
+                usage = response.usage_metadata or {}
+                item = {"response": {"status_code": 200, "body": {
+                    "choices": [{"message": {"role": "assistant", "content": response.content}}],
+                    "usage": {
+                        "prompt_tokens": usage.get("input_tokens", 0),
+                        "completion_tokens": usage.get("output_tokens", 0),
+                        "total_tokens": usage.get("total_tokens", 0),
+                    },
+                }}}
+            f.write(json.dumps({"custom_id": request["custom_id"], **item, "error": None}, ensure_ascii=False) + "\n")
+
+
+def run_openai_batch(input_path: str, output_path: str, poll_seconds: float = 30.0) -> None:
+    """OpenAI Batch API 执行器：上传请求文件、创建批处理任务并轮询，完成后下载结果文件（及错误文件）"""
+    from openai import OpenAI
+    client = OpenAI()
+    with open(input_path, "rb") as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=uploaded.id, endpoint="/v1/chat/completions", completion_window="24h"
+    )
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(poll_seconds)
+        batch = client.batches.retrieve(batch.id)
+    if batch.status != "completed" and not batch.output_file_id:
+        raise BatchItemError(f"批处理任务 {batch.id} 状态为 {batch.status}")
+    with open(output_path, "w", encoding="utf-8") as f:
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                f.write(client.files.content(file_id).text)
+
+
+class BatchFileSubmitter:
+    """批处理文件提交：每批写入一个请求文件，由执行器生成结果文件"""
+
+    def __init__(self, client, directory: str, runner: str = "local"):
+        if runner not in ("local", "openai"):
+            raise ValueError(f"未知的批处理执行器：{runner}，可选：local / openai")
+        self.client = client
+        self.directory = directory
+        self.runner = runner
+        self._sequence = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, prompts: list[str]) -> list:
+        with self._lock:
+            self._sequence += 1
+            name = f"batch-{os.getpid()}-{self._sequence:06d}"
+        input_path = os.path.join(self.directory, f"{name}-input.jsonl")
+        output_path = os.path.join(self.directory, f"{name}-output.jsonl")
+        write_batch_file(input_path, prompts, _model_name(self.client))
+        if self.runner == "openai":
+            run_openai_batch(input_path, output_path, float(os.getenv("LLM_BATCH_POLL_SECONDS", "30")))
+        else:
+            run_local_batch(self.client, input_path, output_path)
+        return read_batch_results(output_path, len(prompts))
+
+
+# ==================== 合批调度 ====================
+@dataclass(slots=True)
+class _PendingRequest:
+    prompt: str
+    future: Future
+    enqueued: float
+
+
+class BatchingLLM:
+    """包装LLM客户端：把并发的单条请求合并为批量提交
+
+    调度线程在队列攒满 max_batch_size 条或最早的请求等待超过 max_wait 秒时取出一批，
+    交给提交线程池执行，最多同时有 max_inflight_batches 批在途
+    """
+
+    def __init__(
+            self,
+            client,
+            max_batch_size: int = 32,
+            max_wait: float = 0.05,
+            max_inflight_batches: int = 4,
+            submit: Callable[[list[str]], list] | None = None,
+    ):
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        # 提交一批提示词，按顺序返回响应或异常
+        self.submit = submit or (lambda prompts: self.client.batch(prompts, return_exceptions=True))
+        self.stats = BatchStats()
+        self._pending: list[_PendingRequest] = []
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight_batches, thread_name_prefix="llm-batch")
+        # 调度线程在首次请求时启动（工作进程 fork 之后）
+        self._dispatcher: threading.Thread | None = None
+
+    @classmethod
+    def from_env(cls, client) -> "BatchingLLM":
+        """从环境变量读取配置"""
+        submit = None
+        if os.getenv("LLM_BATCH_MODE", "batch") == "file":
+            submit = BatchFileSubmitter(
+                client, os.getenv("LLM_BATCH_DIR", "batches"), os.getenv("LLM_BATCH_RUNNER", "local")
+            )
+        return cls(
+            client,
+            max_batch_size=int(os.getenv("LLM_BATCH_SIZE", "32")),
+            max_wait=float(os.getenv("LLM_BATCH_WAIT_MS", "50")) / 1000,
+            max_inflight_batches=int(os.getenv("LLM_BATCH_INFLIGHT", "4")),
+            submit=submit,
+        )
+
+    def _enqueue(self, prompt) -> Future:
+        future: Future = Future()
+        with self._cond:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name="llm-batch-dispatcher", daemon=True)
+                self._dispatcher.start()
+            self._pending.append(_PendingRequest(str(prompt), future, time.monotonic()))
+            # 队列由空变为非空时唤醒调度线程开始计时，攒满一批时唤醒其立即提交
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch_size:
+                self._cond.notify()
+        return future
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = self._pending[0].enqueued + self.max_wait
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+            self._record(batch)
+            self._executor.submit(self._submit, batch)
+
+    def _record(self, batch: list[_PendingRequest]) -> None:
+        now = time.monotonic()
+        stats = self.stats
+        stats.batches += 1
+        stats.requests += len(batch)
+        stats.full_batches += len(batch) == self.max_batch_size
+        stats.max_batch = max(stats.max_batch, len(batch))
+        stats.wait_seconds += sum(now - request.enqueued for request in batch)
+
+    def _submit(self, batch: list[_PendingRequest]) -> None:
+        try:
+            results = self.submit([request.prompt for request in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for request, result in zip(batch, results):
+            if isinstance(result, Exception):
+                request.future.set_exception(result)
+            else:
+                request.future.set_result(result)
+
+    def invoke(self, prompt, **kwargs):
+        if kwargs:
+            # 带额外参数的请求（如预热前缀的 max_tokens）无法与其他请求合批，直接提交
+            return self.client.invoke(prompt, **kwargs)
+        return self._enqueue(prompt).result()
+
+    def stream(self, prompt, **kwargs):
+        if kwargs:
+            yield from self.client.stream(prompt, **kwargs)
+            return
+        message = self._enqueue(prompt).result()
+        yield AIMessageChunk(content=message.content, usage_metadata=message.usage_metadata)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
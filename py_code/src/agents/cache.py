@@ -0,0 +1,210 @@
+"""
+File: cache.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+提示词/响应缓存：按内容寻址，内存LRU + 可选SQLite磁盘层
+
+缓存值为响应的流式分块文本列表，命中时 stream 按原分块逐个回放，invoke 返回拼接后的完整内容。
+调用方判定响应不可用（如投票无法解析）时用 evict 删除该条目，重试时重新请求模型而不是回放同一个响应。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from .llm import is_abandoned
+
+
+@dataclass
+class CacheStats:
+    """缓存命中统计"""
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "hits": self.hits, "hit_rate": self.hit_rate}
+
+
+class LRUCache:
+    """线程安全的内存LRU缓存，支持条目数上限与过期时间"""
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 0):
+        self.maxsize = maxsize
+        # 过期时间（秒），0表示永不过期
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, list[str]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> list[str] | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            created, value = item
+            if self.ttl and time.time() - created > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: list[str]) -> None:
+        with self._lock:
+            self._data[key] = (time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache:
+    """SQLite磁盘缓存，可在多次运行、多个进程之间共享"""
+
+    def __init__(self, path: str, ttl: float = 0):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> list[str] | None:
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if self.ttl and time.time() - created > self.ttl:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+        return json.loads(value)
+
+    def set(self, key: str, value: list[str]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+
+class CachedLLM:
+    """在LLM客户端的 invoke / stream 之前加一层缓存"""
+
+    def __init__(self, client, memory: LRUCache, disk: SQLiteCache | None = None):
+        self.client = client
+        self.memory = memory
+        self.disk = disk
+        self.stats = CacheStats()
+        self._stats_lock = threading.Lock()
+        # 模型及其参数的标识，不同模型/参数的缓存互不干扰
+        llm_string = getattr(client, "_get_llm_string", None)
+        self.namespace = llm_string() if llm_string else type(client).__name__
+
+    @classmethod
+    def from_env(cls, client) -> "CachedLLM":
+        """从环境变量读取缓存配置"""
+        ttl = float(os.getenv("LLM_CACHE_TTL", "0"))
+        memory = LRUCache(maxsize=int(os.getenv("LLM_CACHE_SIZE", "4096")), ttl=ttl)
+        path = os.getenv("LLM_CACHE_PATH")
+        return cls(client, memory, SQLiteCache(path, ttl=ttl) if path else None)
+
+    def _key(self, prompt) -> str:
+        return hashlib.sha256(f"{self.namespace}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def _count(self, field: str) -> None:
+        with self._stats_lock:
+            setattr(self.stats, field, getattr(self.stats, field) + 1)
+
+    def _lookup(self, key: str) -> list[str] | None:
+        chunks = self.memory.get(key)
+        if chunks is not None:
+            self._count("memory_hits")
+            return chunks
+        if self.disk is not None:
+            chunks = self.disk.get(key)
+            if chunks is not None:
+                self._count("disk_hits")
+                self.memory.set(key, chunks)
+                return chunks
+        self._count("misses")
+        return None
+
+    def _store(self, key: str, chunks: list[str]) -> None:
+        if is_abandoned():
+            # 调用方已放弃的请求，响应直接丢弃
+            return
+        self.memory.set(key, chunks)
+        if self.disk is not None:
+            self.disk.set(key, chunks)
+
+    def evict(self, prompt) -> None:
+        """删除提示词对应的缓存条目（内存与磁盘）"""
+        key = self._key(prompt)
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def invoke(self, prompt, **kwargs):
+        # 带额外调用参数时不走缓存
+        if kwargs:
+            return self.client.invoke(prompt, **kwargs)
+        key = self._key(prompt)
+        chunks = self._lookup(key)
+        if chunks is not None:
+            return AIMessage(content="".join(chunks))
+        response = self.client.invoke(prompt)
+        self._store(key, [str(response.content)])
+        return response
+
+    def stream(self, prompt, **kwargs):
+        if kwargs:
+            yield from self.client.stream(prompt, **kwargs)
+            return
+        key = self._key(prompt)
+        chunks = self._lookup(key)
+        if chunks is not None:
+            # 按原始分块回放，调用方仍可逐块输出
+            for text in chunks:
+                yield AIMessageChunk(content=text)
+            return
+        chunks = []
+        for chunk in self.client.stream(prompt):
+            if chunk.text:
+                chunks.append(chunk.text)
+            yield chunk
+        # 只缓存完整读取的流
+        self._store(key, chunks)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
@@ -0,0 +1,80 @@
+"""
+File: fairness.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+多桌共享LLM客户端的公平调度：总并发受限，各桌排队的请求按桌轮转获得许可
+
+LLM调用发生在节点的工作线程中，所属牌桌通过上下文变量 current_table 传递。
+"""
+import threading
+from collections import deque, OrderedDict
+from contextvars import ContextVar
+
+# 当前LLM请求所属的牌桌
+current_table: ContextVar[str] = ContextVar("current_table", default="")
+
+
+class FairLimiter:
+    """按牌桌轮转分配的并发许可"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._available = capacity
+        self._cond = threading.Condition()
+        # 牌桌 -> 排队中的请求，字典顺序即轮转顺序
+        self._queues: OrderedDict[str, deque[object]] = OrderedDict()
+        self.waiting = 0
+
+    def _head(self) -> object | None:
+        """轮转顺序上第一张有排队请求的牌桌的队首请求"""
+        return next(iter(self._queues.values()))[0] if self._queues else None
+
+    def acquire(self, table: str) -> None:
+        ticket = object()
+        with self._cond:
+            self._queues.setdefault(table, deque()).append(ticket)
+            self.waiting += 1
+            while not (self._available > 0 and self._head() is ticket):
+                self._cond.wait()
+            self._available -= 1
+            self.waiting -= 1
+            queue = self._queues.pop(table)
+            queue.popleft()
+            if queue:
+                # 该桌仍有排队请求，排到轮转队尾
+                self._queues[table] = queue
+            self._cond.notify_all()
+
+    def release(self) -> None:
+        with self._cond:
+            self._available += 1
+            self._cond.notify_all()
+
+    @property
+    def in_flight(self) -> int:
+        return self.capacity - self._available
+
+
+class FairLLM:
+    """包装共享LLM客户端，所有调用经过 FairLimiter 调度"""
+
+    def __init__(self, client, limiter: FairLimiter):
+        self.client = client
+        self.limiter = limiter
+
+    def invoke(self, prompt, **kwargs):
+        self.limiter.acquire(current_table.get())
+        try:
+            return self.client.invoke(prompt, **kwargs)
+        finally:
+            self.limiter.release()
+
+    def stream(self, prompt, **kwargs):
+        self.limiter.acquire(current_table.get())
+        try:
+            yield from self.client.stream(prompt, **kwargs)
+        finally:
+            self.limiter.release()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
@@ -0,0 +1,217 @@
+"""
+File: fake.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+本地模拟模型：输出与延迟均由种子和提示词决定，用于离线压测游戏流程
+
+将首token延迟与输出速度都配置为0即可得到“零延迟”模型，此时测得的耗时即为编排开销。
+"""
+import asyncio
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+# 投票提示词中其他玩家发言的格式：玩家{id}的发言：...
+_VOTE_CANDIDATE = re.compile(r"玩家(\d+)的发言")
+# 发言提示词中玩家拿到的词语（白板的提示以括号开头，不匹配）
+_SPEECH_WORD = re.compile(r"【词语】\n([^\n（]+)\n")
+
+# 生成发言使用的片段
+_SPEECH_FRAGMENTS = [
+    "它", "很", "常见", "日常", "生活中", "经常", "用到", "颜色", "形状",
+    "和", "有关", "大家", "都", "见过", "的", "东西", "味道", "不错", "小时候",
+]
+
+
+class FakeRateLimitError(Exception):
+    """模拟提供方返回的429限流错误"""
+    status_code = 429
+
+    def __init__(self, retry_after: float | None = None):
+        super().__init__("Rate limit exceeded (fake)")
+        self.retry_after = retry_after
+
+
+class FakeChatModel(BaseChatModel):
+    """可设定种子、延迟分布与输出速度的模拟聊天模型"""
+    seed: int = 0
+    ttft_ms: float = 200.0  # 首token延迟中位数（毫秒），0表示无延迟
+    ttft_sigma: float = 0.5  # 首token延迟的对数正态分布sigma
+    tokens_per_sec: float = 50.0  # 平均输出速度，0表示无延迟
+    tokens_per_sec_jitter: float = 0.2  # 输出速度的相对标准差
+    max_tokens: int = 20  # 单次发言的最大token数
+    rate_limit: float = 0.0  # 每次调用返回429的概率，用于测试限流与重试
+    leak_rate: float = 0.0  # 发言中说出自己词语的概率，用于测试泄词检测
+    # 各提示词已发出的请求次数（按提示词的哈希计），决定第几次请求返回429
+    _attempts: Counter = PrivateAttr(default_factory=Counter)
+    _attempts_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-undercover"
+
+    @classmethod
+    def from_env(cls) -> "FakeChatModel":
+        """从环境变量读取配置"""
+        return cls(
+            seed=int(os.getenv("FAKE_LLM_SEED", "0")),
+            ttft_ms=float(os.getenv("FAKE_LLM_TTFT_MS", "200")),
+            ttft_sigma=float(os.getenv("FAKE_LLM_TTFT_SIGMA", "0.5")),
+            tokens_per_sec=float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", "50")),
+            tokens_per_sec_jitter=float(os.getenv("FAKE_LLM_TPS_JITTER", "0.2")),
+            max_tokens=int(os.getenv("FAKE_LLM_MAX_TOKENS", "20")),
+            rate_limit=float(os.getenv("FAKE_LLM_RATE_LIMIT", "0")),
+            leak_rate=float(os.getenv("FAKE_LLM_LEAK_RATE", "0")),
+        )
+
+    @staticmethod
+    def _prompt(messages: list[BaseMessage]) -> str:
+        return "\n".join(str(message.content) for message in messages)
+
+    def _check_rate_limit(self, messages: list[BaseMessage]) -> None:
+        """按 rate_limit 的概率返回429
+
+        随机源由种子、提示词与该提示词是第几次请求决定：同一请求重试时结果不同，且与并发调用的先后顺序无关
+        """
+        if self.rate_limit <= 0:
+            return
+        prompt = self._prompt(messages)
+        key = hash(prompt)
+        with self._attempts_lock:
+            attempt = self._attempts[key]
+            self._attempts[key] += 1
+        if random.Random(f"{self.seed}:{attempt}:{prompt}").random() < self.rate_limit:
+            raise FakeRateLimitError()
+
+    def _plan(self, messages: list[BaseMessage]) -> tuple[list[str], float, float, int]:
+        """确定本次调用的输出token、首token延迟、单token间隔与输入token数"""
+        prompt = self._prompt(messages)
+        # 以种子+提示词作为随机源，相同输入在任何进程、任何调用顺序下输出一致
+        rng = random.Random(f"{self.seed}:{prompt}")
+
+        candidates = _VOTE_CANDIDATE.findall(prompt)
+        if candidates:
+            tokens = [rng.choice(candidates)]
+        else:
+            tokens = [rng.choice(_SPEECH_FRAGMENTS) for _ in range(rng.randint(3, self.max_tokens))]
+
+        ttft = 0.0
+        if self.ttft_ms > 0:
+            ttft = rng.lognormvariate(math.log(self.ttft_ms / 1000), self.ttft_sigma)
+        interval = 0.0
+        if self.tokens_per_sec > 0:
+            tps = rng.gauss(self.tokens_per_sec, self.tokens_per_sec * self.tokens_per_sec_jitter)
+            interval = 1 / max(tps, 1.0)
+        word = _SPEECH_WORD.search(prompt) if not candidates and self.leak_rate > 0 else None
+        if word and rng.random() < self.leak_rate:
+            # 逐字插入到发言中间，跨多个分块
+            position = rng.randint(0, len(tokens))
+            tokens[position:position] = list(word.group(1))
+        # 粗略估算输入token数
+        return tokens, ttft, interval, max(1, len(prompt) // 2)
+
+    @staticmethod
+    def _usage(input_tokens: int, output_tokens: int) -> dict:
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+    def _generate(
+            self,
+            messages: list[BaseMessage],
+            stop: list[str] | None = None,
+            run_manager: CallbackManagerForLLMRun | None = None,
+            **kwargs: Any,
+    ) -> ChatResult:
+        self._check_rate_limit(messages)
+        tokens, ttft, interval, input_tokens = self._plan(messages)
+        time.sleep(ttft + interval * len(tokens))
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(input_tokens, len(tokens)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def batch(self, inputs: list, config=None, *, return_exceptions: bool = False, **kwargs: Any) -> list:
+        """整批请求共用一次往返：首token延迟只计一次（取批内第一条请求的），输出时间取批内最长的"""
+        results: list = []
+        ttft = None
+        decode = 0.0
+        for value in inputs:
+            try:
+                messages = self._convert_input(value).to_messages()
+                self._check_rate_limit(messages)
+                tokens, item_ttft, interval, input_tokens = self._plan(messages)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+                continue
+            ttft = item_ttft if ttft is None else ttft
+            decode = max(decode, interval * len(tokens))
+            results.append(AIMessage(content="".join(tokens), usage_metadata=self._usage(input_tokens, len(tokens))))
+        time.sleep((ttft or 0.0) + decode)
+        return results
+
+    async def _agenerate(
+            self,
+            messages: list[BaseMessage],
+            stop: list[str] | None = None,
+            run_manager: AsyncCallbackManagerForLLMRun | None = None,
+            **kwargs: Any,
+    ) -> ChatResult:
+        self._check_rate_limit(messages)
+        tokens, ttft, interval, input_tokens = self._plan(messages)
+        await asyncio.sleep(ttft + interval * len(tokens))
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(input_tokens, len(tokens)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+            self,
+            messages: list[BaseMessage],
+            stop: list[str] | None = None,
+            run_manager: CallbackManagerForLLMRun | None = None,
+            **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        self._check_rate_limit(messages)
+        tokens, ttft, interval, input_tokens = self._plan(messages)
+        time.sleep(ttft)
+        for token in tokens:
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+            time.sleep(interval)
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(content="", usage_metadata=self._usage(input_tokens, len(tokens)))
+        )
+
+    async def _astream(
+            self,
+            messages: list[BaseMessage],
+            stop: list[str] | None = None,
+            run_manager: AsyncCallbackManagerForLLMRun | None = None,
+            **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        self._check_rate_limit(messages)
+        tokens, ttft, interval, input_tokens = self._plan(messages)
+        await asyncio.sleep(ttft)
+        for token in tokens:
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+            await asyncio.sleep(interval)
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(content="", usage_metadata=self._usage(input_tokens, len(tokens)))
+        )
@@ -2,12 +2,168 @@
 File: llm.py
 Created Time: 2026-01-05
 Author: falcon (liuc47810@gmail.com)
+LLM后端注册表：按配置选择后端，首次使用时才创建客户端
 """
-import os, dotenv
-from langchain_openai import ChatOpenAI
+import contextlib
+import contextvars
+import logging
+import os
+import re
+import threading
+from typing import Callable
+
+import dotenv
 
 dotenv.load_dotenv()
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
-os.environ["OPENAI_BASE_URL"] = os.getenv("OPENAI_BASE_URL")
-llm = ChatOpenAI(model="gpt-5-mini")
 
+logger = logging.getLogger(__name__)
+
+# 后端名称 -> 客户端构造函数
+_BACKENDS: dict[str, Callable[[], object]] = {}
+
+# 当前使用的LLM客户端（首次调用 get_llm 时创建，批量模拟等场景可替换为包装后的客户端）
+_current_llm = None
+_lock = threading.Lock()
+
+# 推理模型（o系列、gpt-5系列）不接受 max_tokens，输出上限（含推理token）需用 max_completion_tokens
+_REASONING_MODEL = re.compile(r"(?:^|/)(?:o\d|gpt-5)")
+
+# 调用方已放弃等待的请求（如投票超过截止时间）：事件置位后各包装层不再重试，响应也不写入缓存
+abandoned: contextvars.ContextVar[threading.Event | None] = contextvars.ContextVar("llm_abandoned", default=None)
+
+
+def register_backend(name: str):
+    """注册LLM后端构造函数（装饰器）"""
+    def decorator(factory: Callable[[], object]) -> Callable[[], object]:
+        _BACKENDS[name] = factory
+        return factory
+    return decorator
+
+
+@register_backend("openai")
+def _create_openai_llm():
+    """OpenAI兼容接口，密钥与地址读取 OPENAI_API_KEY / OPENAI_BASE_URL"""
+    from langchain_openai import ChatOpenAI
+    kwargs = {}
+    if os.getenv("LLM_RESILIENCE", "1") == "1":
+        # 重试交给弹性中间层；请求超时同时作用于流式响应的每次读取，用于中止卡住的流
+        kwargs = {"max_retries": 0, "timeout": float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))}
+    return ChatOpenAI(model=os.getenv("LLM_MODEL", "gpt-5-mini"), **kwargs)
+
+
+@register_backend("fake")
+def _create_fake_llm():
+    """本地可复现的模拟模型，用于离线压测"""
+    from .fake import FakeChatModel
+    return FakeChatModel.from_env()
+
+
+def create_llm(backend: str | None = None):
+    """按名称创建LLM客户端，未指定时读取 LLM_BACKEND（默认 openai）"""
+    name = backend or os.getenv("LLM_BACKEND", "openai")
+    if name not in _BACKENDS:
+        raise ValueError(f"未知的LLM后端：{name}，可选后端：{', '.join(_BACKENDS)}")
+    return _BACKENDS[name]()
+
+
+def _create_default_llm():
+    """按环境变量创建默认客户端
+
+    由内到外：LLM_BATCH=1 时跨对局合批提交；LLM_RESILIENCE=1（默认）时包一层限流/重试/熔断中间层，
+    按单条请求限流与重试；LLM_CACHE=1 时在最外层加响应缓存，命中缓存不占用配额
+    """
+    client = create_llm()
+    if os.getenv("LLM_BATCH", "0") == "1":
+        from .batching import BatchingLLM
+        client = BatchingLLM.from_env(client)
+    if os.getenv("LLM_RESILIENCE", "1") == "1":
+        from .resilience import ResilientLLM
+        client = ResilientLLM.from_env(client)
+    if os.getenv("LLM_CACHE", "0") == "1":
+        from .cache import CachedLLM
+        client = CachedLLM.from_env(client)
+    return client
+
+
+def find_client(cls: type, client=None):
+    """沿包装链（各包装层的 .client）查找指定类型的客户端，未找到时返回 None
+
+    :param client: 包装链的最外层，为空时使用当前客户端
+    """
+    client = get_llm() if client is None else client
+    while client is not None:
+        if isinstance(client, cls):
+            return client
+        client = vars(client).get("client") if hasattr(client, "__dict__") else None
+    return None
+
+
+def get_llm():
+    """获取当前使用的LLM客户端"""
+    global _current_llm
+    if _current_llm is None:
+        with _lock:
+            if _current_llm is None:
+                _current_llm = _create_default_llm()
+    return _current_llm
+
+
+def _output_limit(client, tokens: int) -> dict:
+    """按包装链最内层客户端的模型名给出限制输出长度的请求参数"""
+    model = ""
+    while client is not None and not model:
+        model = getattr(client, "model_name", None) or ""
+        client = vars(client).get("client") if hasattr(client, "__dict__") else None
+    key = "max_completion_tokens" if _REASONING_MODEL.search(model) else "max_tokens"
+    return {key: tokens}
+
+
+def warm_prefix(prompt: str) -> None:
+    """预热模型提供方的提示词前缀缓存：只请求1个token并丢弃结果，失败时记录日志
+
+    推理模型用 max_completion_tokens 限制输出，推理token同样计入上限，不会在预热请求上消耗推理
+    """
+    client = get_llm()
+    try:
+        client.invoke(prompt, **_output_limit(client, 1))
+    except Exception as e:
+        logger.warning("提示词前缀预热失败：%s: %s", type(e).__name__, e)
+
+
+def is_abandoned() -> bool:
+    """当前上下文中的请求是否已被调用方放弃"""
+    event = abandoned.get()
+    return event is not None and event.is_set()
+
+
+def evict_cached(prompt) -> None:
+    """当前客户端带响应缓存时删除提示词对应的条目，使下一次请求重新调用模型"""
+    from .cache import CachedLLM
+    cache = find_client(CachedLLM)
+    if cache is not None:
+        cache.evict(prompt)
+
+
+def set_llm(client) -> None:
+    """替换当前使用的LLM客户端"""
+    global _current_llm
+    _current_llm = client
+
+
+@contextlib.contextmanager
+def override_llm(client):
+    """在上下文中临时替换当前客户端，退出时恢复（不会因此创建默认客户端）"""
+    global _current_llm
+    previous = _current_llm
+    _current_llm = client
+    try:
+        yield client
+    finally:
+        _current_llm = previous
+
+
+def __getattr__(name: str):
+    # 兼容旧的 `from src.agents.llm import llm` 写法
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
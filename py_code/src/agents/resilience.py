@@ -0,0 +1,482 @@
+"""
+File: resilience.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+共享LLM客户端的弹性中间层：令牌桶限流（RPM/TPM）、自适应并发（429时乘性减小）、熔断、重试与调用截止时间
+
+每次调用依次经过：熔断检查 -> 并发许可 -> 请求数/token数令牌桶 -> 请求，失败时按类型处理：
+- 429：并发上限减半，按 Retry-After 或指数退避后重试，不计入熔断
+- 超时、连接错误、5xx：计入熔断，指数退避后重试
+- 其他错误：直接抛出
+流式调用只在收到第一个分块之前重试；截止时间覆盖排队、等待令牌、重试与读取流的全过程。
+熔断半开时放行的试探请求无论以何种方式结束都会得出结果：成功则关闭，任何失败（含429与超过截止时间）则重新打开，
+未发出或被调用方提前关闭时释放试探名额。
+"""
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, asdict
+
+from langchain_core.messages import AIMessageChunk
+
+from .llm import is_abandoned
+
+
+class DeadlineExceeded(TimeoutError):
+    """调用超过截止时间"""
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器打开，调用被直接拒绝"""
+
+
+# ==================== 错误分类 ====================
+def _status_code(error: Exception) -> int | None:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(error: Exception) -> float | None:
+    """错误响应中的 Retry-After（秒）"""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is None:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        retry_after = headers.get("retry-after")
+    try:
+        return float(retry_after) if retry_after is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return _status_code(error) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def is_transient(error: Exception) -> bool:
+    """可重试的暂时性错误：超时、连接错误与服务端5xx"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status >= 500 or status in (408, 409)
+    return type(error).__name__ in ("APITimeoutError", "APIConnectionError", "InternalServerError")
+
+
+# ==================== 令牌桶 ====================
+class TokenBucket:
+    """令牌桶：容量为每分钟配额，按配额匀速补充；rate 为0时不限制
+
+    实际用量可通过 adjust 补记，余额可以为负，之后的请求等待补足后再发出
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self._level = per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float, deadline: float) -> float:
+        """取出令牌，不足时等待，返回等待的秒数；等待会超过截止时间时抛出 DeadlineExceeded"""
+        if not self.enabled:
+            return 0.0
+        # 单次请求超过桶容量时按满桶计，避免永远等不到
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._level >= amount:
+                    self._level -= amount
+                    return waited
+                wait = (amount - self._level) / self.rate
+            if time.monotonic() + wait > deadline:
+                raise DeadlineExceeded("等待限流令牌超过截止时间")
+            time.sleep(wait)
+            waited += wait
+
+    def adjust(self, amount: float) -> None:
+        """补记（正数）或退还（负数）令牌"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._refill()
+            self._level = min(self.capacity, self._level - amount)
+
+    @property
+    def level(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._level
+
+
+# ==================== 自适应并发 ====================
+class AdaptiveLimiter:
+    """AIMD并发上限：每次成功加性增加，收到429时减半（冷却期内只减一次）"""
+
+    def __init__(self, max_limit: int, min_limit: int = 1, cooldown: float = 1.0):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.cooldown = cooldown
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, deadline: float) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceeded("等待并发许可超过截止时间")
+                self._cond.wait(remaining)
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self) -> None:
+        with self._cond:
+            if self.limit < self.max_limit:
+                # 约每个并发窗口增加1
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self._cond.notify()
+
+    def on_rate_limited(self) -> bool:
+        """收到429时减半并发上限，返回本次是否实际减小"""
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return False
+            self._last_decrease = now
+            self.limit = max(self.min_limit, self.limit / 2)
+            return True
+
+
+# ==================== 熔断器 ====================
+class CircuitBreaker:
+    """连续失败达到阈值后打开，冷却时间后半开放行一个试探请求，成功则关闭"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.threshold <= 0:
+            return True
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+            self._probing = False
+
+    def on_failure(self, transient: bool = True) -> bool:
+        """记录一次失败，返回熔断器是否因此打开
+
+        :param transient: 是否为暂时性错误；429、不可重试的错误与超过截止时间只在半开试探时计入（重新打开）
+        """
+        if self.threshold <= 0:
+            return False
+        with self._lock:
+            if not transient and self.state != self.HALF_OPEN:
+                return False
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                tripped = self.state != self.OPEN
+                self.state = self.OPEN
+                self._opened = time.monotonic()
+                self._probing = False
+                return tripped
+            return False
+
+    def release_probe(self) -> None:
+        """试探请求未得出结果（未发出、被取消或调用方提前关闭流）时释放试探名额，下一次调用重新试探"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+
+
+# ==================== 指标 ====================
+@dataclass
+class ResilienceMetrics:
+    """弹性中间层指标（计数类字段可跨进程累加）"""
+    requests: int = 0  # 调用次数（不含重试）
+    attempts: int = 0  # 实际发出的请求次数（含重试）
+    successes: int = 0
+    failures: int = 0  # 重试耗尽或不可重试而最终失败的调用
+    retries: int = 0
+    rate_limited: int = 0  # 收到429的次数
+    concurrency_decreases: int = 0  # 因429减小并发上限的次数
+    transient_errors: int = 0  # 超时、连接错误与5xx的次数
+    deadline_exceeded: int = 0
+    breaker_rejections: int = 0  # 熔断打开期间被直接拒绝的调用
+    breaker_trips: int = 0  # 熔断器打开的次数
+    throttle_wait_seconds: float = 0.0  # 等待令牌桶的总时长
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    def merge(self, other: "ResilienceMetrics") -> None:
+        for name, value in other.as_dict().items():
+            setattr(self, name, getattr(self, name) + value)
+
+
+# ==================== 中间层 ====================
+class ResilientLLM:
+    """包装LLM客户端：限流、自适应并发、熔断、重试与截止时间"""
+
+    def __init__(
+            self,
+            client,
+            rpm: float = 0,
+            tpm: float = 0,
+            max_concurrency: int = 32,
+            min_concurrency: int = 1,
+            max_retries: int = 3,
+            backoff: float = 0.5,
+            max_backoff: float = 20.0,
+            timeout: float = 120.0,
+            breaker_threshold: int = 5,
+            breaker_reset: float = 30.0,
+            expected_output_tokens: int = 64,
+    ):
+        self.client = client
+        self.requests_bucket = TokenBucket(rpm)
+        self.tokens_bucket = TokenBucket(tpm)
+        self.concurrency = AdaptiveLimiter(max_concurrency, min_concurrency)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # 单次调用的截止时间（秒），0表示不限
+        self.timeout = timeout
+        # 估算TPM用量时预计的输出token数，请求完成后按实际用量补记
+        self.expected_output_tokens = expected_output_tokens
+        self.metrics = ResilienceMetrics()
+        self._metrics_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, client) -> "ResilientLLM":
+        """从环境变量读取配置"""
+        return cls(
+            client,
+            rpm=float(os.getenv("LLM_RPM", "0")),
+            tpm=float(os.getenv("LLM_TPM", "0")),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+            min_concurrency=int(os.getenv("LLM_MIN_CONCURRENCY", "1")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+            backoff=float(os.getenv("LLM_RETRY_BACKOFF", "0.5")),
+            max_backoff=float(os.getenv("LLM_RETRY_MAX_BACKOFF", "20")),
+            timeout=float(os.getenv("LLM_CALL_TIMEOUT", "120")),
+            breaker_threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+            breaker_reset=float(os.getenv("LLM_BREAKER_RESET", "30")),
+            expected_output_tokens=int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "64")),
+        )
+
+    def scale_quota(self, fraction: float) -> None:
+        """按比例缩小RPM/TPM配额与并发上限（多个进程分摊同一份配额时使用）"""
+        for bucket in (self.requests_bucket, self.tokens_bucket):
+            bucket.capacity *= fraction
+            bucket.rate *= fraction
+            bucket.adjust(bucket.level - bucket.capacity)
+        limiter = self.concurrency
+        limiter.max_limit = max(limiter.min_limit, int(limiter.max_limit * fraction))
+        limiter.limit = float(limiter.max_limit)
+
+    def _count(self, field: str, amount: float = 1) -> None:
+        with self._metrics_lock:
+            setattr(self.metrics, field, getattr(self.metrics, field) + amount)
+
+    def snapshot(self) -> dict:
+        """指标与当前状态"""
+        return {
+            **self.metrics.as_dict(),
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            "breaker_state": self.breaker.state,
+            "rpm_available": round(self.requests_bucket.level, 1) if self.requests_bucket.enabled else None,
+            "tpm_available": round(self.tokens_bucket.level, 1) if self.tokens_bucket.enabled else None,
+        }
+
+    # ==================== 调用流程 ====================
+    def _deadline(self) -> float:
+        return time.monotonic() + self.timeout if self.timeout > 0 else float("inf")
+
+    def _estimate_tokens(self, prompt) -> int:
+        # 提示词编译器的分词器按文本缓存计数，编译时已计算过的提示词不会重复分词
+        from src.prompts.compiler import count_tokens
+        return count_tokens(str(prompt)) + self.expected_output_tokens
+
+    def _admit(self, estimated_tokens: int, deadline: float) -> None:
+        """熔断检查、并发许可与令牌桶，通过后占用一个并发许可"""
+        if not self.breaker.allow():
+            self._count("breaker_rejections")
+            raise CircuitOpenError("LLM熔断中，暂停调用")
+        try:
+            self.concurrency.acquire(deadline)
+        except BaseException as e:
+            # 请求未发出，不计入熔断
+            self.breaker.release_probe()
+            if isinstance(e, DeadlineExceeded):
+                self._count("deadline_exceeded")
+                self._count("failures")
+            raise
+        try:
+            waited = self.requests_bucket.acquire(1, deadline)
+            waited += self.tokens_bucket.acquire(estimated_tokens, deadline)
+        except BaseException as e:
+            self.concurrency.release()
+            self.breaker.release_probe()
+            if isinstance(e, DeadlineExceeded):
+                self._count("deadline_exceeded")
+                self._count("failures")
+            raise
+        if waited:
+            self._count("throttle_wait_seconds", waited)
+        self._count("attempts")
+
+    def _on_success(self, message, estimated_tokens: int) -> None:
+        self.breaker.on_success()
+        self.concurrency.on_success()
+        self._count("successes")
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            self.tokens_bucket.adjust(usage.get("total_tokens", estimated_tokens) - estimated_tokens)
+
+    def _breaker_failure(self, transient: bool) -> None:
+        if self.breaker.on_failure(transient):
+            self._count("breaker_trips")
+
+    def _on_error(self, error: Exception, attempt: int, deadline: float) -> None:
+        """处理一次失败的请求：可重试时退避等待后返回，否则重新抛出"""
+        if isinstance(error, DeadlineExceeded):
+            self._count("deadline_exceeded")
+            self._count("failures")
+            self._breaker_failure(False)
+            raise error
+        retry_after = None
+        if is_rate_limited(error):
+            self._count("rate_limited")
+            self._breaker_failure(False)
+            if self.concurrency.on_rate_limited():
+                self._count("concurrency_decreases")
+            retry_after = _retry_after(error)
+        elif is_transient(error):
+            self._count("transient_errors")
+            self._breaker_failure(True)
+        else:
+            self._count("failures")
+            self._breaker_failure(False)
+            raise error
+        if attempt >= self.max_retries or is_abandoned():
+            # 重试次数用尽，或调用方已放弃等待
+            self._count("failures")
+            raise error
+        # 指数退避加随机抖动，服务端给出 Retry-After 时以其为准
+        delay = retry_after if retry_after is not None else min(self.max_backoff, self.backoff * 2 ** attempt)
+        delay *= random.uniform(1.0, 1.25)
+        if time.monotonic() + delay > deadline:
+            self._count("deadline_exceeded")
+            self._count("failures")
+            raise DeadlineExceeded("重试等待超过截止时间") from error
+        self._count("retries")
+        time.sleep(delay)
+
+    def invoke(self, prompt, **kwargs):
+        self._count("requests")
+        deadline = self._deadline()
+        estimated_tokens = self._estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            self._admit(estimated_tokens, deadline)
+            try:
+                response = self.client.invoke(prompt, **kwargs)
+            except Exception as e:
+                self.concurrency.release()
+                self._on_error(e, attempt, deadline)
+                attempt += 1
+                continue
+            except BaseException:
+                # 调用被中断（如 KeyboardInterrupt）
+                self.concurrency.release()
+                self.breaker.release_probe()
+                raise
+            self.concurrency.release()
+            if time.monotonic() > deadline:
+                # 响应已取得，只记录超时不丢弃结果
+                self._count("deadline_exceeded")
+            self._on_success(response, estimated_tokens)
+            return response
+
+    def stream(self, prompt, **kwargs):
+        self._count("requests")
+        deadline = self._deadline()
+        estimated_tokens = self._estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            self._admit(estimated_tokens, deadline)
+            received = False
+            usage_chunk = None
+            try:
+                for chunk in self.client.stream(prompt, **kwargs):
+                    if getattr(chunk, "usage_metadata", None):
+                        usage_chunk = chunk
+                    received = True
+                    yield chunk
+                    # 流读取过慢时在分块之间中止；阻塞在单次读取上的流由客户端的请求超时（LLM_REQUEST_TIMEOUT）中止
+                    if time.monotonic() > deadline:
+                        raise DeadlineExceeded("读取流式响应超过截止时间")
+            except Exception as e:
+                self.concurrency.release()
+                if received and not isinstance(e, DeadlineExceeded):
+                    # 已经输出过分块，无法透明重试
+                    self._count("failures")
+                    self._breaker_failure(is_transient(e))
+                    raise
+                self._on_error(e, attempt, deadline)
+                attempt += 1
+                continue
+            except BaseException:
+                # 调用方提前关闭生成器
+                self.concurrency.release()
+                self.breaker.release_probe()
+                raise
+            self.concurrency.release()
+            self._on_success(usage_chunk or AIMessageChunk(content=""), estimated_tokens)
+            return
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
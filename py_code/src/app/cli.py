@@ -0,0 +1,26 @@
+"""
+File: cli.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+命令行入口共用的参数
+"""
+import argparse
+
+from src.graph.types import TableConfig
+
+
+def add_table_arguments(parser: argparse.ArgumentParser) -> None:
+    """添加牌桌配置参数，未指定的项读取 GAME_NUM_* 环境变量"""
+    parser.add_argument("--players", type=int, help="玩家总数（4~50）")
+    parser.add_argument("--undercovers", type=int, help="卧底人数")
+    parser.add_argument("--blanks", type=int, help="白板人数")
+
+
+def table_from_args(args: argparse.Namespace) -> TableConfig:
+    """由命令行参数与环境变量得到牌桌配置"""
+    default = TableConfig.from_env()
+    return TableConfig(
+        num_players=default.num_players if args.players is None else args.players,
+        num_undercovers=default.num_undercovers if args.undercovers is None else args.undercovers,
+        num_blanks=default.num_blanks if args.blanks is None else args.blanks,
+    )
@@ -0,0 +1,222 @@
+"""
+File: evaluate.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+自博弈评估：批量运行全AI对局，收集列式对局记录，向量化计算胜率、置信区间、座位偏差与词语对难度
+
+用法：
+    python -m src.app.evaluate --games 5000 --workers 4 --backend fake --output eval.npz
+    python -m src.app.evaluate --input eval.npz          # 只对已有记录做统计
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+from src.app.cli import add_table_arguments, table_from_args
+from src.app.records import GameRecords, BLANK, NORMAL, UNDERCOVER
+
+# 95% 置信区间对应的正态分位数
+Z_95 = 1.959964
+
+
+def wilson_interval(successes: np.ndarray, totals: np.ndarray, z: float = Z_95) -> tuple[np.ndarray, np.ndarray]:
+    """Wilson 得分区间（对数组逐元素计算），样本数为0时区间为 [0, 1]"""
+    successes = np.asarray(successes, dtype=np.float64)
+    totals = np.asarray(totals, dtype=np.float64)
+    n = np.maximum(totals, 1.0)
+    p = successes / n
+    denominator = 1 + z ** 2 / n
+    center = (p + z ** 2 / (2 * n)) / denominator
+    margin = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denominator
+    empty = totals == 0
+    return np.where(empty, 0.0, center - margin), np.where(empty, 1.0, center + margin)
+
+
+def vote_outcomes(records: GameRecords) -> tuple[np.ndarray, np.ndarray]:
+    """每局平民玩家的有效投票数，以及其中投中卧底（或白板）的票数"""
+    count = len(records)
+    valid = records.votes >= 0
+    voter_roles = records.roles[:, None, :records.votes.shape[2]]
+    target_roles = records.roles[np.arange(count)[:, None, None], np.where(valid, records.votes, 0)]
+    normal_votes = valid & (voter_roles == NORMAL)
+    hits = normal_votes & ((target_roles == UNDERCOVER) | (target_roles == BLANK))
+    return normal_votes.sum(axis=(1, 2)), hits.sum(axis=(1, 2))
+
+
+def empty_report() -> dict:
+    """没有对局记录时的评估结果"""
+    return {
+        "games": 0,
+        "undercover_win_rate": 0.0,
+        "undercover_win_rate_ci95": [0.0, 1.0],
+        "normal_win_rate": 0.0,
+        "mean_rounds": 0.0,
+        "normal_vote_accuracy": 0.0,
+        "seat_bias": {"chi2": 0.0, "dof": 0, "seats": []},
+        "pair_difficulty": [],
+    }
+
+
+def evaluate(records: GameRecords) -> dict:
+    """计算评估指标，返回可写入JSON的结果"""
+    count = len(records)
+    if count == 0:
+        return empty_report()
+    # 白板与卧底同一阵营，白板获胜计入卧底方
+    undercover_wins = records.winner != NORMAL
+    low, high = wilson_interval(undercover_wins.sum(), count)
+    normal_votes, hits = vote_outcomes(records)
+
+    # 座位偏差：按座位统计该座位为卧底阵营（卧底或白板）的局数与卧底方胜率，以及各座位在首轮被淘汰的频率
+    seats = records.roles.shape[1]
+    undercover_mask = records.undercover_mask
+    seat_games = undercover_mask.sum(axis=0)
+    seat_wins = (undercover_mask & undercover_wins[:, None]).sum(axis=0)
+    seat_low, seat_high = wilson_interval(seat_wins, seat_games)
+    first_out = records.eliminated[:, 0] if records.eliminated.shape[1] else np.full(count, -1)
+    first_out_counts = np.bincount(first_out[first_out >= 0], minlength=seats)
+    # 卧底胜率在各座位间的卡方统计量（各座位胜率相同的零假设）
+    expected = seat_games * (undercover_wins.sum() / max(count, 1))
+    observed = np.stack([seat_wins, seat_games - seat_wins])
+    expected_both = np.stack([expected, seat_games - expected])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chi2 = np.nansum(np.where(expected_both > 0, (observed - expected_both) ** 2 / expected_both, 0.0))
+
+    # 词语对难度：平民识破卧底（平民获胜）的比例越低越难
+    pairs = len(records.pairs)
+    pair_games = np.bincount(records.pair, minlength=pairs)
+    pair_detected = np.bincount(records.pair, weights=~undercover_wins, minlength=pairs)
+    pair_low, pair_high = wilson_interval(pair_detected, pair_games)
+    pair_rounds = np.bincount(records.pair, weights=records.rounds, minlength=pairs)
+    pair_votes = np.bincount(records.pair, weights=normal_votes, minlength=pairs)
+    pair_hits = np.bincount(records.pair, weights=hits, minlength=pairs)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        detection = pair_detected / pair_games
+        accuracy = pair_hits / pair_votes
+        mean_rounds = pair_rounds / pair_games
+    order = np.lexsort((-pair_games, detection))
+
+    return {
+        "games": count,
+        "undercover_win_rate": float(undercover_wins.mean()) if count else 0.0,
+        "undercover_win_rate_ci95": [float(low), float(high)],
+        "normal_win_rate": float(1 - undercover_wins.mean()) if count else 0.0,
+        "mean_rounds": float(records.rounds.mean()) if count else 0.0,
+        "normal_vote_accuracy": float(hits.sum() / max(normal_votes.sum(), 1)),
+        "seat_bias": {
+            "chi2": float(chi2),
+            "dof": int((seat_games > 0).sum() - 1),
+            "seats": [
+                {
+                    "seat": int(s),
+                    "undercover_games": int(seat_games[s]),
+                    "undercover_win_rate": float(seat_wins[s] / seat_games[s]) if seat_games[s] else None,
+                    "ci95": [float(seat_low[s]), float(seat_high[s])],
+                    "first_eliminated_rate": float(first_out_counts[s] / max(count, 1)),
+                }
+                for s in range(seats)
+            ],
+        },
+        "pair_difficulty": [
+            {
+                "normal_word": records.pairs[p][0],
+                "undercover_word": records.pairs[p][1],
+                "games": int(pair_games[p]),
+                "detection_rate": float(detection[p]),
+                "ci95": [float(pair_low[p]), float(pair_high[p])],
+                "normal_vote_accuracy": float(accuracy[p]) if pair_votes[p] else None,
+                "mean_rounds": float(mean_rounds[p]),
+            }
+            for p in order if pair_games[p]
+        ],
+    }
+
+
+def print_report(result: dict, top: int = 10) -> None:
+    """打印评估报告"""
+    low, high = result["undercover_win_rate_ci95"]
+    print("=" * 60)
+    print("自博弈评估结果")
+    print("=" * 60)
+    if not result["games"]:
+        print("没有对局记录")
+        return
+    print(f"对局数：{result['games']}，平均回合数：{result['mean_rounds']:.2f}")
+    print(f"卧底胜率：{result['undercover_win_rate']:.2%}（95%置信区间 {low:.2%} ~ {high:.2%}）")
+    print(f"平民投票命中卧底的比例：{result['normal_vote_accuracy']:.2%}")
+    print("-" * 60)
+    bias = result["seat_bias"]
+    print(f"座位偏差（卡方={bias['chi2']:.2f}，自由度={bias['dof']}）")
+    print(f"{'座位':<6}{'卧底局数':>10}{'卧底胜率':>12}{'95%置信区间':>20}{'首轮出局率':>12}")
+    for seat in bias["seats"]:
+        rate = "-" if seat["undercover_win_rate"] is None else f"{seat['undercover_win_rate']:.2%}"
+        interval = f"{seat['ci95'][0]:.2%} ~ {seat['ci95'][1]:.2%}"
+        print(f"{seat['seat']:<6}{seat['undercover_games']:>10}{rate:>12}{interval:>20}{seat['first_eliminated_rate']:>12.2%}")
+    print("-" * 60)
+    print(f"最难识破的词语对（前{top}）")
+    print(f"{'词语对':<16}{'局数':>6}{'识破率':>10}{'95%置信区间':>20}{'平均回合':>10}")
+    for pair in result["pair_difficulty"][:top]:
+        name = f"{pair['normal_word']}/{pair['undercover_word']}"
+        interval = f"{pair['ci95'][0]:.2%} ~ {pair['ci95'][1]:.2%}"
+        print(f"{name:<16}{pair['games']:>6}{pair['detection_rate']:>10.2%}{interval:>20}{pair['mean_rounds']:>10.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="谁是卧底 - 自博弈评估")
+    parser.add_argument("--games", type=int, default=1000, help="对局总数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="工作进程数")
+    parser.add_argument("--concurrency", type=int, default=16, help="每个进程内的并发对局数")
+    parser.add_argument("--max-inflight", type=int, default=32, help="全局在途LLM请求上限")
+    parser.add_argument("--seed", type=int, default=0, help="起始随机种子")
+    parser.add_argument("--category", help="只使用指定类别的词语对")
+    parser.add_argument("--difficulty", choices=["easy", "normal", "hard"], help="只使用指定难度的词语对")
+    parser.add_argument("--backend", help="LLM后端（如 openai / fake），默认读取 LLM_BACKEND")
+    parser.add_argument("--input", help="读取已有的对局记录（.npz），不再运行对局")
+    parser.add_argument("--output", help="对局记录保存路径（.npz，或 .parquet 需安装 pyarrow）")
+    parser.add_argument("--report", help="评估结果JSON保存路径")
+    parser.add_argument("--top", type=int, default=10, help="报告中列出的词语对数量")
+    parser.add_argument(
+        "--vote-mode", choices=["llm", "hint", "local"],
+        help="AI投票方式：llm / hint（本地可疑度提示）/ local（本地投票，不调用模型），默认读取 VOTE_MODE",
+    )
+    add_table_arguments(parser)
+    args = parser.parse_args()
+
+    if args.input:
+        records = GameRecords.load(args.input)
+    else:
+        if args.backend:
+            os.environ["LLM_BACKEND"] = args.backend
+        # 模拟模块依赖 LangGraph，只在需要运行对局时导入
+        from src.app.simulate import run_simulation
+        from src.graph.suspicion import VoteMode
+
+        stats, elapsed = run_simulation(
+            games=args.games,
+            workers=args.workers,
+            concurrency=args.concurrency,
+            max_inflight=args.max_inflight,
+            seed=args.seed,
+            category=args.category,
+            difficulty=args.difficulty,
+            collect_records=True,
+            table=table_from_args(args),
+            vote_mode=VoteMode(args.vote_mode) if args.vote_mode else None,
+        )
+        records = stats.records or GameRecords.empty()
+        print(f"完成对局：{stats.games}，失败对局：{stats.errors}，耗时：{elapsed:.2f}s")
+        if args.output:
+            records.save(args.output)
+            print(f"对局记录已保存：{args.output}")
+
+    result = evaluate(records)
+    print_report(result, args.top)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,35 +3,104 @@ File: main.py
 Created Time: 2026-01-06
 Author: falcon (liuc47810@gmail.com)
 """
-from src.graph.types import UnderCoverGameManager
-from src.graph.builder import build_game_graph
+import argparse
+import os
+import uuid
+
+from src.app.cli import add_table_arguments, table_from_args
+from src.graph.types import TableConfig, UnderCoverGameManager, PlayerType
+
+# 对局存档的默认路径
+DEFAULT_CHECKPOINT_PATH = "checkpoints.db"
+
 
 # ==================== 游戏主入口 ====================
-def play_game():
-    """主游戏函数"""
-    print("🐱 欢迎来到【谁是卧底】游戏！")
-    print("-" * 60)
-    print("游戏规则：")
-    print("1. 4名玩家，其中1名是卧底")
-    print("2. 卧底看到的词与其他玩家不同")
-    print("3. 每一轮，每个玩家用一句话描述自己的词（不能直接说出来）")
-    print("4. 然后所有玩家投票淘汰可疑的玩家")
-    print("5. 如果卧底被淘汰，普通玩家获胜；否则卧底获胜")
-    print("=" * 60)
-
-    # 初始化游戏
-    manager = UnderCoverGameManager()
-    initial_state = manager.initialize_game()
-
-    # 构建和执行游戏流程
-    game_graph = build_game_graph()
-
-    # 进行游戏
-    game_graph.invoke(initial_state)
+def play_game(checkpoint_path: str | None = None, resume_id: str | None = None, table: TableConfig | None = None):
+    """主游戏函数
+
+    :param checkpoint_path: 对局存档路径，指定后每个节点完成时保存进度
+    :param resume_id: 要恢复的对局编号，从该对局最后完成的节点继续
+    :param table: 牌桌配置，为空时读取 GAME_NUM_* 环境变量
+    """
+    # LangGraph 及节点依赖在开始游戏时才导入，导入本模块（如 --help）保持轻量
+    from src.graph.builder import build_game_graph, get_game_graph, GAME_RECURSION_LIMIT
+    from src.graph.events import current_game
+    from src.graph.instrumentation import get_tracer
+
+    checkpointer = None
+    if checkpoint_path or resume_id:
+        from src.graph.checkpoint import create_sqlite_checkpointer
+        checkpointer = create_sqlite_checkpointer(checkpoint_path or DEFAULT_CHECKPOINT_PATH)
+
+    # 构建游戏流程：带存档时绑定检查点，否则复用进程内缓存的游戏图
+    game_graph = build_game_graph(checkpointer) if checkpointer else get_game_graph()
+    game_id = resume_id or uuid.uuid4().hex[:8]
+    config = {"configurable": {"thread_id": game_id}, "recursion_limit": GAME_RECURSION_LIMIT}
+
+    if resume_id:
+        snapshot = game_graph.get_state(config)
+        if not snapshot.values:
+            print(f"未找到对局【{resume_id}】的存档")
+            return
+        if not snapshot.next:
+            print(f"对局【{resume_id}】已经结束")
+            return
+        print(f"🐱 继续对局【{resume_id}】，第 {snapshot.values['current_round']} 回合")
+        for player in snapshot.values["players"]:
+            if player.player_type == PlayerType.HUMAN:
+                print(f"你看到的词语是: {player.word}" if player.word else "你是白板，没有拿到词语")
+        # 从最后完成的节点继续
+        initial_state = None
+    else:
+        table = table or TableConfig.from_env()
+        print("🐱 欢迎来到【谁是卧底】游戏！")
+        print("-" * 60)
+        print("游戏规则：")
+        print(f"1. {table.describe()}")
+        print("2. 卧底看到的词与其他玩家不同" + ("，白板没有词语" if table.num_blanks else ""))
+        print("3. 每一轮，每个玩家用一句话描述自己的词（不能直接说出来）")
+        print("4. 然后所有玩家投票淘汰可疑的玩家")
+        if table.num_undercovers == 1 and not table.num_blanks:
+            print("5. 如果卧底被淘汰，普通玩家获胜；否则卧底获胜")
+        else:
+            print("5. 卧底（和白板）全部被淘汰，普通玩家获胜；存活平民不多于卧底与白板之和时，卧底获胜")
+        print("=" * 60)
+        if checkpointer:
+            print(f"本局编号：{game_id}，中断后可使用 --resume {game_id} 继续")
+
+        # 初始化游戏
+        manager = UnderCoverGameManager()
+        initial_state = manager.initialize_game(table=table)
+
+    # 进行游戏（对局编号用于事件与录制日志）
+    token = current_game.set(game_id)
+    try:
+        game_graph.invoke(initial_state, config)
+    except KeyboardInterrupt:
+        if checkpointer:
+            print(f"\n游戏已暂停，可使用 --resume {game_id} 继续")
+            return
+        raise
+    finally:
+        current_game.reset(token)
+    # 开启埋点（GAME_TRACE）时输出本局耗时汇总
+    get_tracer().print_summary()
 
     print("\n✨ 感谢游玩！")
-# 导出 game_graph 供 langgraph 使用
-game_graph = build_game_graph()
+
+
+def __getattr__(name: str):
+    # 导出 game_graph 供 langgraph 使用，首次访问时才编译
+    if name == "game_graph":
+        from src.graph.builder import get_game_graph
+        return get_game_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == "__main__":
-    play_game()
+    parser = argparse.ArgumentParser(description="谁是卧底")
+    parser.add_argument("--checkpoint", default=os.getenv("GAME_CHECKPOINT"), help="对局存档路径（SQLite）")
+    parser.add_argument("--resume", metavar="GAME_ID", help="恢复指定编号的对局")
+    add_table_arguments(parser)
+    args = parser.parse_args()
+    play_game(args.checkpoint, args.resume, table_from_args(args))
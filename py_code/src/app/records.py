@@ -0,0 +1,194 @@
+"""
+File: records.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+对局记录的列式存储：每局一行，各字段为定长 NumPy 数组，便于对大批量对局做向量化统计
+
+编码约定：
+- 角色、胜方按 PlayerRole 的成员序号编码（与存档序列化一致），-1 表示填充位
+- eliminated[g, r] 为第 r+1 回合被淘汰的玩家id，votes[g, r, v] 为该回合玩家 v 投给的玩家id，-1 表示无
+- 词语对存为 pairs 词表中的下标，合并批次时自动重新编码
+"""
+from dataclasses import dataclass, fields
+
+import numpy as np
+
+from src.graph.types import GameState, PlayerRole
+
+ROLE_CODES: dict[PlayerRole, int] = {role: code for code, role in enumerate(PlayerRole)}
+NORMAL = ROLE_CODES[PlayerRole.NORMAL]
+UNDERCOVER = ROLE_CODES[PlayerRole.UNDERCOVER]
+BLANK = ROLE_CODES[PlayerRole.BLANK]
+
+
+@dataclass
+class GameRecords:
+    """一批对局的列式记录（N局，最多P名玩家、R个回合）"""
+    pairs: list[tuple[str, str]]  # 词语对词表（平民词, 卧底词）
+    seed: np.ndarray  # int64 [N]
+    pair: np.ndarray  # int32 [N]，pairs 中的下标
+    num_players: np.ndarray  # int16 [N]
+    roles: np.ndarray  # int8 [N, P]
+    winner: np.ndarray  # int8 [N]
+    rounds: np.ndarray  # int16 [N]
+    eliminated: np.ndarray  # int16 [N, R]
+    votes: np.ndarray  # int16 [N, R, P]
+
+    def __len__(self) -> int:
+        return len(self.seed)
+
+    @classmethod
+    def empty(cls) -> "GameRecords":
+        return cls(
+            pairs=[],
+            seed=np.zeros(0, dtype=np.int64),
+            pair=np.zeros(0, dtype=np.int32),
+            num_players=np.zeros(0, dtype=np.int16),
+            roles=np.zeros((0, 0), dtype=np.int8),
+            winner=np.zeros(0, dtype=np.int8),
+            rounds=np.zeros(0, dtype=np.int16),
+            eliminated=np.zeros((0, 0), dtype=np.int16),
+            votes=np.zeros((0, 0, 0), dtype=np.int16),
+        )
+
+    @property
+    def undercover_mask(self) -> np.ndarray:
+        """bool [N, P]：每局各座位是否为卧底阵营（卧底或白板）"""
+        return (self.roles == UNDERCOVER) | (self.roles == BLANK)
+
+    @staticmethod
+    def _pad(array: np.ndarray, shape: tuple[int, ...]) -> np.ndarray:
+        """用 -1 将数组的非首维填充到指定大小"""
+        if array.shape[1:] == shape:
+            return array
+        padded = np.full((len(array), *shape), -1, dtype=array.dtype)
+        padded[(slice(None), *(slice(0, n) for n in array.shape[1:]))] = array
+        return padded
+
+    @classmethod
+    def concatenate(cls, batches: list["GameRecords"]) -> "GameRecords":
+        """合并多批记录：统一玩家数与回合数维度，并合并词语对词表"""
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return cls.empty()
+        players = max(batch.roles.shape[1] for batch in batches)
+        rounds = max(batch.eliminated.shape[1] for batch in batches)
+        vocabulary: dict[tuple[str, str], int] = {}
+        pair_codes = []
+        for batch in batches:
+            # 本批词表下标 -> 合并词表下标
+            remap = np.array([vocabulary.setdefault(pair, len(vocabulary)) for pair in batch.pairs], dtype=np.int32)
+            pair_codes.append(remap[batch.pair])
+        return cls(
+            pairs=list(vocabulary),
+            seed=np.concatenate([batch.seed for batch in batches]),
+            pair=np.concatenate(pair_codes),
+            num_players=np.concatenate([batch.num_players for batch in batches]),
+            roles=np.concatenate([cls._pad(batch.roles, (players,)) for batch in batches]),
+            winner=np.concatenate([batch.winner for batch in batches]),
+            rounds=np.concatenate([batch.rounds for batch in batches]),
+            eliminated=np.concatenate([cls._pad(batch.eliminated, (rounds,)) for batch in batches]),
+            votes=np.concatenate([cls._pad(batch.votes, (rounds, players)) for batch in batches]),
+        )
+
+    # ==================== 存取 ====================
+    def save(self, path: str) -> None:
+        """保存为 .npz；路径以 .parquet 结尾时保存为 Arrow/Parquet（需安装 pyarrow）"""
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            pq.write_table(self.to_arrow(), path)
+            return
+        columns = {field.name: getattr(self, field.name) for field in fields(self) if field.name != "pairs"}
+        pairs = np.array(self.pairs, dtype=str).reshape(-1, 2)
+        np.savez_compressed(path, pairs=pairs, **columns)
+
+    @classmethod
+    def load(cls, path: str) -> "GameRecords":
+        with np.load(path) as data:
+            columns = {name: data[name] for name in data.files if name != "pairs"}
+            return cls(pairs=[tuple(pair) for pair in data["pairs"].tolist()], **columns)
+
+    def to_arrow(self):
+        """转换为 pyarrow.Table，多维字段存为定长列表列"""
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("导出 Arrow/Parquet 需要安装 pyarrow：pip install pyarrow") from e
+
+        def nested(array: np.ndarray):
+            column = pa.array(array.reshape(-1))
+            for size in reversed(array.shape[1:]):
+                column = pa.FixedSizeListArray.from_arrays(column, size)
+            return column
+
+        normal_words = np.array([normal for normal, _ in self.pairs] or [""], dtype=object)
+        undercover_words = np.array([undercover for _, undercover in self.pairs] or [""], dtype=object)
+        return pa.table({
+            "seed": self.seed,
+            "normal_word": normal_words[self.pair],
+            "undercover_word": undercover_words[self.pair],
+            "num_players": self.num_players,
+            "roles": nested(self.roles),
+            "winner": self.winner,
+            "rounds": self.rounds,
+            "eliminated": nested(self.eliminated),
+            "votes": nested(self.votes),
+        })
+
+
+class GameRecordBuilder:
+    """逐局收集对局记录，最后一次性转换为列式数组"""
+
+    def __init__(self):
+        self._pairs: dict[tuple[str, str], int] = {}
+        self._rows: list[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, seed: int, initial_state: GameState, final_state: GameState, rounds: list[tuple[int, dict]]) -> None:
+        """记录一局对局
+
+        :param rounds: 每回合的 (被淘汰玩家id, 投票 {投票者id: 被投玩家id})，按回合顺序
+        """
+        players = list(initial_state["players"])
+        normal_word = next((p.word for p in players if p.player_role == PlayerRole.NORMAL), "")
+        undercover_word = next((p.word for p in players if p.player_role == PlayerRole.UNDERCOVER), "")
+        pair = self._pairs.setdefault((normal_word, undercover_word), len(self._pairs))
+        winner = PlayerRole(final_state["game_history"][-1]["winner"])
+        self._rows.append((
+            seed,
+            pair,
+            [ROLE_CODES[p.player_role] for p in players],
+            ROLE_CODES[winner],
+            final_state["current_round"],
+            rounds,
+        ))
+
+    def build(self) -> GameRecords:
+        count = len(self._rows)
+        players = max((len(row[2]) for row in self._rows), default=0)
+        max_rounds = max((len(row[5]) for row in self._rows), default=0)
+        roles = np.full((count, players), -1, dtype=np.int8)
+        eliminated = np.full((count, max_rounds), -1, dtype=np.int16)
+        votes = np.full((count, max_rounds, players), -1, dtype=np.int16)
+        for game, (_, _, game_roles, _, _, game_rounds) in enumerate(self._rows):
+            roles[game, :len(game_roles)] = game_roles
+            for round_index, (eliminated_id, round_votes) in enumerate(game_rounds):
+                if eliminated_id is not None:
+                    eliminated[game, round_index] = eliminated_id
+                if round_votes:
+                    votes[game, round_index, list(round_votes)] = [
+                        -1 if target is None else target for target in round_votes.values()
+                    ]
+        return GameRecords(
+            pairs=list(self._pairs),
+            seed=np.fromiter((row[0] for row in self._rows), dtype=np.int64, count=count),
+            pair=np.fromiter((row[1] for row in self._rows), dtype=np.int32, count=count),
+            num_players=np.fromiter((len(row[2]) for row in self._rows), dtype=np.int16, count=count),
+            roles=roles,
+            winner=np.fromiter((row[3] for row in self._rows), dtype=np.int8, count=count),
+            rounds=np.fromiter((row[4] for row in self._rows), dtype=np.int16, count=count),
+            eliminated=eliminated,
+            votes=votes,
+        )
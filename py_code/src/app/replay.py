@@ -0,0 +1,56 @@
+"""
+File: replay.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+对局回放：读取录制日志（GAME_RECORD），不调用模型，按日志重新执行游戏图，核对胜方与回合数是否与录制时一致
+
+用法：
+    GAME_RECORD=games.jsonl python -m src.app.simulate --games 100
+    python -m src.app.replay games.jsonl
+    python -m src.app.replay games.jsonl --game 42 --verbose   # 在控制台重现单局
+"""
+import argparse
+import time
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="谁是卧底 - 对局回放")
+    parser.add_argument("log", help="录制日志路径")
+    parser.add_argument("--game", action="append", help="只回放指定编号的对局（可重复）")
+    parser.add_argument("--verbose", action="store_true", help="在控制台输出回放过程")
+    args = parser.parse_args()
+
+    # 游戏图依赖在解析参数之后才导入，--help 保持轻量
+    from src.graph import events
+    from src.graph.recording import load_games, replay_games
+
+    games = load_games(args.log)
+    if args.game:
+        missing = [game_id for game_id in args.game if game_id not in games]
+        if missing:
+            raise ValueError(f"日志中没有对局：{', '.join(missing)}")
+        games = {game_id: games[game_id] for game_id in args.game}
+    # 未结束的对局无法核对结果，不参与回放
+    games = {game_id: game for game_id, game in games.items() if game.winner is not None}
+    if not args.verbose:
+        events.set_event_bus(events.EventBus())
+
+    start = time.perf_counter()
+    results = replay_games(games)
+    elapsed = time.perf_counter() - start
+
+    mismatched = [result for result in results if not result.matched]
+    calls = sum(result.stats.calls for result in results)
+    misses = sum(result.stats.misses for result in results)
+    diverged = sum(result.stats.diverged for result in results)
+    print("=" * 60)
+    print(f"回放对局：{len(results)}，结果一致：{len(results) - len(mismatched)}，耗时：{elapsed:.2f}s"
+          f"（{len(results) / max(elapsed, 1e-9):.1f} 局/秒）")
+    print(f"回放LLM调用：{calls}，日志缺失：{misses}，提示词偏离：{diverged}")
+    for result in mismatched:
+        print(f"对局【{result.game_id}】结果不一致：录制 {result.recorded_winner}/{result.recorded_rounds}回合，"
+              f"回放 {result.winner}/{result.rounds}回合")
+
+
+if __name__ == "__main__":
+    main()
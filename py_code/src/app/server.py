@@ -0,0 +1,299 @@
+"""
+File: server.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+多桌游戏服务：单进程内并发运行大量牌桌，人类玩家通过 HTTP / WebSocket 参与
+
+所有牌桌共用一个编译好的游戏图（以 thread_id 区分对局）和一个LLM客户端，LLM请求按牌桌轮转调度。
+人类玩家的发言与投票通过 LangGraph interrupt 挂起对局等待，挂起期间不占用工作线程。
+
+用法：python -m src.app.server --port 8000 --max-inflight 64
+
+接口：
+- POST /tables                      创建牌桌 {"num_humans": 1, "seed": null, "num_players": 6, "num_undercovers": 1, "num_blanks": 0}
+- GET  /tables                      牌桌列表
+- GET  /tables/{table_id}           牌桌状态
+- POST /tables/{table_id}/input     提交人类玩家输入 {"value": "...", "player_id": 0}
+- WS   /tables/{table_id}/ws?player_id=0
+  订阅牌桌事件（AI发言逐token推送），可发送 {"type": "input", "value": "..."} 作答
+"""
+import argparse
+import asyncio
+import contextlib
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.types import Command
+from pydantic import BaseModel
+
+from src.agents.fairness import FairLimiter, FairLLM, current_table
+from src.agents.llm import find_client, get_llm, set_llm
+from src.agents.resilience import ResilientLLM
+from src.graph.builder import build_game_graph, GAME_RECURSION_LIMIT
+from src.graph.checkpoint import CompactSerializer
+from src.graph.events import configured_sinks, create_event_bus, current_game, set_event_bus
+from src.graph.types import GameState, PlayerType, TableConfig, UnderCoverGameManager
+
+
+class CreateTableRequest(BaseModel):
+    num_humans: int = 1
+    seed: int | None = None
+    # 牌桌配置，未指定的项读取 GAME_NUM_* 环境变量
+    num_players: int | None = None
+    num_undercovers: int | None = None
+    num_blanks: int | None = None
+
+    def table(self) -> TableConfig:
+        default = TableConfig.from_env()
+        return TableConfig(
+            num_players=default.num_players if self.num_players is None else self.num_players,
+            num_undercovers=default.num_undercovers if self.num_undercovers is None else self.num_undercovers,
+            num_blanks=default.num_blanks if self.num_blanks is None else self.num_blanks,
+        )
+
+
+class InputRequest(BaseModel):
+    value: str
+    player_id: int | None = None
+
+
+# ==================== 牌桌 ====================
+class Table:
+    """一张牌桌：运行一局游戏，向订阅方广播事件，并转交人类玩家的输入"""
+
+    def __init__(self, table_id: str, initial_state: GameState):
+        self.id = table_id
+        self.initial_state = initial_state
+        self.status = "running"  # running / waiting_input / finished / error
+        self.pending: dict | None = None  # 当前等待的人类输入
+        self.events: list[dict] = []  # 已广播的事件，供后加入的订阅方补发
+        self.subscribers: set[asyncio.Queue] = set()
+        self.inputs: asyncio.Queue[str] = asyncio.Queue()
+
+    def publish(self, event: dict) -> None:
+        self.events.append(event)
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in self.events:
+            queue.put_nowait(event)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.subscribers.discard(queue)
+
+    def submit(self, value: str, player_id: int | None = None) -> None:
+        """提交人类玩家输入"""
+        if self.status != "waiting_input":
+            raise ValueError("当前不需要输入")
+        if player_id is not None and player_id != self.pending.get("player_id"):
+            raise ValueError(f"当前等待玩家【{self.pending.get('player_id')}】输入")
+        self.status = "running"
+        self.inputs.put_nowait(value)
+
+    def summary(self) -> dict:
+        return {"table_id": self.id, "status": self.status, "pending": self.pending}
+
+    async def run(self, game_graph, checkpointer: InMemorySaver) -> None:
+        """运行对局，直到游戏结束"""
+        # LLM请求在节点工作线程中按该上下文识别所属牌桌
+        current_table.set(self.id)
+        current_game.set(self.id)
+        config = {
+            "configurable": {"thread_id": self.id, "human_input": "interrupt"},
+            "recursion_limit": GAME_RECURSION_LIMIT,
+        }
+        payload = self.initial_state
+        try:
+            while True:
+                async for mode, chunk in game_graph.astream(payload, config, stream_mode=["custom", "updates"]):
+                    if mode == "custom":
+                        self.publish(chunk)
+                    elif "__interrupt__" in chunk:
+                        self.pending = chunk["__interrupt__"][0].value
+                    else:
+                        for node, state in chunk.items():
+                            self.publish(self._node_event(node, state))
+                snapshot = await game_graph.aget_state(config)
+                if not snapshot.next:
+                    break
+                self.status = "waiting_input"
+                self.publish({"type": "input_required", **self.pending})
+                value = await self.inputs.get()
+                self.pending = None
+                payload = Command(resume=value)
+
+            # 终局事件（game_over）已由终局节点经自定义流发出
+            self.status = "finished"
+        except Exception as e:
+            self.status = "error"
+            self.publish({"type": "error", "message": f"{type(e).__name__}: {e}"})
+        finally:
+            # 对局结束后释放检查点
+            checkpointer.delete_thread(self.id)
+
+    @staticmethod
+    def _node_event(node: str, state: GameState) -> dict:
+        """节点完成事件，只包含公开信息"""
+        event = {"type": "node", "node": node, "round": state["current_round"]}
+        if node == "process_elimination" and state["revote_candidates"]:
+            event.update(revote_candidates=state["revote_candidates"], vote_result=state["vote_result"].as_dict())
+        elif node == "process_elimination":
+            record = state["game_history"][-1]
+            event.update(
+                eliminated_id=record["eliminated_id"],
+                eliminated_name=record["eliminated_name"],
+                eliminated_role=record["eliminated_role"],
+                votes=record["votes"],
+                vote_result=state["vote_result"].as_dict(),
+            )
+        return event
+
+
+# ==================== 服务 ====================
+def create_app(max_inflight: int = 64, max_threads: int = 256, verbose: bool = False) -> FastAPI:
+    """创建游戏服务
+
+    :param max_inflight: 所有牌桌共享的在途LLM请求上限
+    :param max_threads: 执行同步节点的线程数上限
+    :param verbose: 是否在服务端控制台渲染各桌的游戏过程
+    """
+    @contextlib.asynccontextmanager
+    async def lifespan(_: FastAPI):
+        executor = ThreadPoolExecutor(max_workers=max_threads)
+        asyncio.get_running_loop().set_default_executor(executor)
+        yield
+        for task in list(tasks):
+            task.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    app = FastAPI(title="谁是卧底", lifespan=lifespan)
+    checkpointer = InMemorySaver(serde=CompactSerializer())
+    game_graph = build_game_graph(checkpointer)
+    manager = UnderCoverGameManager()
+    tables: dict[str, Table] = {}
+    tasks: set[asyncio.Task] = set()
+    limiter = FairLimiter(max_inflight)
+    set_llm(FairLLM(get_llm(), limiter))
+    # 游戏事件经自定义流推送给各桌订阅方
+    set_event_bus(create_event_bus(["stream", *configured_sinks(console=verbose)]))
+
+    def get_table(table_id: str) -> Table:
+        table = tables.get(table_id)
+        if table is None:
+            raise HTTPException(status_code=404, detail=f"牌桌【{table_id}】不存在")
+        return table
+
+    @app.post("/tables")
+    async def create_table(request: CreateTableRequest) -> dict:
+        table_id = uuid.uuid4().hex[:8]
+        try:
+            initial_state = manager.initialize_game(
+                num_humans=request.num_humans, seed=request.seed, table=request.table()
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        table = Table(table_id, initial_state)
+        tables[table_id] = table
+        task = asyncio.create_task(table.run(game_graph, checkpointer))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        humans = [p.id for p in table.initial_state["players"] if p.player_type == PlayerType.HUMAN]
+        return {"table_id": table_id, "human_player_ids": humans}
+
+    @app.get("/metrics")
+    async def metrics() -> dict:
+        """LLM调用指标：公平调度的在途请求数，以及限流/重试/熔断中间层的计数与当前状态"""
+        resilient = find_client(ResilientLLM)
+        return {
+            "in_flight": limiter.in_flight,
+            "resilience": resilient.snapshot() if resilient is not None else None,
+        }
+
+    @app.get("/tables")
+    async def list_tables() -> list[dict]:
+        return [table.summary() for table in tables.values()]
+
+    @app.get("/tables/{table_id}")
+    async def table_status(table_id: str) -> dict:
+        return get_table(table_id).summary()
+
+    @app.post("/tables/{table_id}/input")
+    async def submit_input(table_id: str, request: InputRequest) -> dict:
+        table = get_table(table_id)
+        try:
+            table.submit(request.value, request.player_id)
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return {"ok": True}
+
+    @app.websocket("/tables/{table_id}/ws")
+    async def table_events(websocket: WebSocket, table_id: str, player_id: int | None = None) -> None:
+        table = tables.get(table_id)
+        # 牌桌或玩家不存在时拒绝连接
+        if table is None or (player_id is not None and player_id not in table.initial_state["players"].by_id):
+            await websocket.close(code=4404)
+            return
+        await websocket.accept()
+        if player_id is not None:
+            player = table.initial_state["players"].get(player_id)
+            if player.player_type == PlayerType.HUMAN:
+                # 只向玩家本人发送其词语
+                await websocket.send_json({"type": "welcome", "player_id": player_id, "word": player.word})
+        queue = table.subscribe()
+
+        async def send_events() -> None:
+            while True:
+                event = await queue.get()
+                await websocket.send_json(event)
+                if event["type"] in ("game_over", "error"):
+                    return
+
+        async def receive_inputs() -> None:
+            while True:
+                message = await websocket.receive_json()
+                if message.get("type") != "input":
+                    continue
+                try:
+                    table.submit(str(message.get("value", "")), player_id)
+                except ValueError as e:
+                    await websocket.send_json({"type": "rejected", "message": str(e)})
+
+        sender = asyncio.create_task(send_events())
+        receiver = asyncio.create_task(receive_inputs())
+        try:
+            await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            sender.cancel()
+            receiver.cancel()
+            table.unsubscribe(queue)
+            with contextlib.suppress(RuntimeError):
+                await websocket.close()
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="谁是卧底 - 多桌游戏服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-inflight", type=int, default=64, help="所有牌桌共享的在途LLM请求上限")
+    parser.add_argument("--max-threads", type=int, default=256, help="执行同步节点的线程数上限")
+    parser.add_argument("--verbose", action="store_true", help="在服务端控制台输出各桌的游戏过程")
+    args = parser.parse_args()
+
+    app = create_app(args.max_inflight, args.max_threads, args.verbose)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
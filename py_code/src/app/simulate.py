@@ -0,0 +1,435 @@
+"""
+File: simulate.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+无人值守批量模拟：并发运行大量全AI对局，统计吞吐与胜率
+
+用法：python -m src.app.simulate --games 1000 --workers 4 --concurrency 32 --max-inflight 64 --backend fake
+"""
+import argparse
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from src.agents.batching import BatchingLLM, BatchStats
+from src.agents.cache import CacheStats, CachedLLM
+from src.agents.llm import find_client, get_llm, set_llm
+from src.agents.resilience import ResilienceMetrics, ResilientLLM
+from src.app.cli import add_table_arguments, table_from_args
+from src.app.records import GameRecordBuilder, GameRecords
+from src.graph import nodes
+from src.graph.builder import get_game_graph, GAME_RECURSION_LIMIT
+from src.graph.leaks import LeakStats, get_leak_stats, reset_leak_stats
+from src.graph.instrumentation import Tracer, get_tracer, merge_trace_files, set_tracer, worker_trace_path
+from src.graph.events import configured_sinks, create_event_bus, current_game, get_event_bus, set_event_bus
+from src.graph.suspicion import VoteMode
+from src.graph.votes import get_vote_stats, reset_vote_stats
+from src.prompts.compiler import PromptStats, get_prompt_stats, reset_prompt_stats
+from src.graph.types import GameState, PlayerRole, TableConfig, UnderCoverGameManager
+
+
+# ==================== LLM调用限流与用量统计 ====================
+class ThrottledLLM:
+    """包装LLM客户端：限制全局在途请求数，并统计请求数与token用量"""
+
+    def __init__(self, client, semaphore):
+        self.client = client
+        # 跨进程共享的信号量，限制所有工作进程的在途LLM请求总数
+        self.semaphore = semaphore
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def _record(self, message, estimated_output: int = 0) -> None:
+        """记录一次请求的token用量，未返回用量信息时使用估算的输出token数"""
+        usage = getattr(message, "usage_metadata", None) or {}
+        with self._lock:
+            self.requests += 1
+            self.input_tokens += usage.get("input_tokens", 0)
+            self.output_tokens += usage.get("output_tokens", estimated_output)
+
+    def invoke(self, prompt, **kwargs):
+        with self.semaphore:
+            response = self.client.invoke(prompt, **kwargs)
+        self._record(response)
+        return response
+
+    def stream(self, prompt, **kwargs):
+        usage_chunk = None
+        chunks = 0
+        try:
+            with self.semaphore:
+                for chunk in self.client.stream(prompt, **kwargs):
+                    if getattr(chunk, "usage_metadata", None):
+                        usage_chunk = chunk
+                    # 流式块数近似为输出token数
+                    chunks += 1
+                    yield chunk
+        finally:
+            # 调用方提前关闭的流（如检测到泄词后中止）同样计入
+            self._record(usage_chunk, estimated_output=chunks)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+# ==================== 模拟结果 ====================
+@dataclass
+class SimulationStats:
+    """一批对局的统计结果"""
+    games: int = 0
+    errors: int = 0
+    rounds: int = 0
+    undercover_wins: int = 0
+    normal_wins: int = 0
+    blank_wins: int = 0
+    requests: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    vote_retries: int = 0
+    vote_fallbacks: int = 0
+    local_votes: int = 0
+    prompts: PromptStats = field(default_factory=PromptStats)  # 提示词token统计
+    leaks: LeakStats = field(default_factory=LeakStats)  # 发言泄词统计
+    resilience: ResilienceMetrics = field(default_factory=ResilienceMetrics)  # 限流/重试/熔断指标
+    batching: BatchStats = field(default_factory=BatchStats)  # 跨对局合批统计
+    error_samples: list[str] = field(default_factory=list)
+    records: GameRecords | None = None  # 逐局记录（仅在 collect_records 时收集）
+    trace_files: list[str] = field(default_factory=list)  # 各工作进程的追踪分片文件（开启 GAME_TRACE 时）
+
+    def merge(self, other: "SimulationStats") -> None:
+        """合并另一批对局的统计结果"""
+        self.games += other.games
+        self.errors += other.errors
+        self.rounds += other.rounds
+        self.undercover_wins += other.undercover_wins
+        self.normal_wins += other.normal_wins
+        self.blank_wins += other.blank_wins
+        self.requests += other.requests
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        self.vote_retries += other.vote_retries
+        self.vote_fallbacks += other.vote_fallbacks
+        self.local_votes += other.local_votes
+        for name, value in other.prompts.as_dict().items():
+            setattr(self.prompts, name, getattr(self.prompts, name) + value)
+        for name, value in other.leaks.as_dict().items():
+            setattr(self.leaks, name, getattr(self.leaks, name) + value)
+        self.resilience.merge(other.resilience)
+        self.batching.merge(other.batching)
+        self.error_samples.extend(other.error_samples[:5 - len(self.error_samples)])
+        if other.records is not None:
+            self.records = GameRecords.concatenate([r for r in (self.records, other.records) if r is not None])
+        self.trace_files.extend(path for path in other.trace_files if path not in self.trace_files)
+
+
+# ==================== 工作进程 ====================
+_worker_llm: ThrottledLLM | None = None
+
+
+_worker_cache: CachedLLM | None = None
+_worker_resilient: ResilientLLM | None = None
+_worker_batching: BatchingLLM | None = None
+
+
+def _init_worker(semaphore, workers: int) -> None:
+    """工作进程初始化：包装共享LLM客户端"""
+    global _worker_llm, _worker_cache, _worker_resilient, _worker_batching
+    trace_path = os.getenv("GAME_TRACE")
+    if trace_path:
+        # 各工作进程写自己的追踪分片，避免多个进程交错追加同一个文件；需在构建游戏图之前替换
+        set_tracer(Tracer(worker_trace_path(trace_path)))
+        # fork 出的进程会继承父进程已编译的游戏图，其节点包装绑定的是父进程的埋点收集器，需重新编译
+        get_game_graph.cache_clear()
+    client = get_llm()
+    _worker_resilient = find_client(ResilientLLM, client)
+    _worker_batching = find_client(BatchingLLM, client)
+    if _worker_resilient is not None:
+        # 各工作进程平分同一份RPM/TPM配额
+        _worker_resilient.scale_quota(1 / workers)
+    if _worker_batching is not None:
+        # 合批时在途请求上限按批计：一批只占一个名额，单条请求只做用量统计
+        submit = _worker_batching.submit
+
+        def throttled_submit(prompts: list[str]) -> list:
+            with semaphore:
+                return submit(prompts)
+
+        _worker_batching.submit = throttled_submit
+        semaphore = contextlib.nullcontext()
+    if isinstance(client, CachedLLM):
+        # 限流放在缓存之后，缓存命中不占用在途请求配额，也不计入token用量
+        _worker_cache = client
+        _worker_llm = client.client = ThrottledLLM(client.client, semaphore)
+    else:
+        _worker_llm = ThrottledLLM(client, semaphore)
+        set_llm(_worker_llm)
+
+
+async def _run_games(
+        num_games: int,
+        seed: int,
+        concurrency: int,
+        category: str | None = None,
+        difficulty: str | None = None,
+        collect_records: bool = False,
+        table: TableConfig | None = None,
+) -> SimulationStats:
+    """在当前进程内用asyncio并发运行一批对局"""
+    stats = SimulationStats()
+    game_graph = get_game_graph()
+    manager = UnderCoverGameManager()
+    limiter = asyncio.Semaphore(concurrency)
+    builder = GameRecordBuilder() if collect_records else None
+
+    async def run_one(game_seed: int) -> None:
+        # 每局在各自的任务上下文中运行，事件按种子区分所属对局
+        current_game.set(str(game_seed))
+        async with limiter:
+            state: GameState = manager.initialize_game(
+                num_humans=0, seed=game_seed, category=category, difficulty=difficulty, table=table
+            )
+            # 每回合的 (被淘汰玩家id, 投票)：游戏历史只保留最近几回合的完整记录，因此从节点更新中收集
+            rounds: list[tuple[int, dict]] = []
+            final_state = state
+            try:
+                async for update in game_graph.astream(
+                        state, {"recursion_limit": GAME_RECURSION_LIMIT}, stream_mode="updates"
+                ):
+                    for node, node_state in update.items():
+                        final_state = node_state
+                        # 平票重投时本轮尚未结束，等待重投结果
+                        if node == "process_elimination" and builder is not None and not node_state["revote_candidates"]:
+                            # 取自节点状态：窗口之外的历史记录已压缩为摘要（HISTORY_WINDOW=0 时当回合即压缩）
+                            rounds.append((node_state["vote_result"].eliminated, dict(node_state["round_votes"])))
+            except Exception as e:
+                stats.errors += 1
+                if len(stats.error_samples) < 5:
+                    stats.error_samples.append(f"{type(e).__name__}: {e}")
+                return
+        stats.games += 1
+        stats.rounds += final_state["current_round"]
+        winner = PlayerRole(final_state["game_history"][-1]["winner"])
+        if winner == PlayerRole.UNDERCOVER:
+            stats.undercover_wins += 1
+        elif winner == PlayerRole.BLANK:
+            stats.blank_wins += 1
+        else:
+            stats.normal_wins += 1
+        if builder is not None:
+            builder.add(game_seed, state, final_state, rounds)
+
+    # 同步节点由事件循环的默认线程池执行，线程数与并发对局数保持一致
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    await asyncio.gather(*(run_one(seed + i) for i in range(num_games)))
+    if builder is not None:
+        stats.records = builder.build()
+    return stats
+
+
+def _run_shard(
+        num_games: int,
+        seed: int,
+        concurrency: int,
+        verbose: bool,
+        category: str | None,
+        difficulty: str | None,
+        collect_records: bool = False,
+        table: TableConfig | None = None,
+        vote_mode: VoteMode | None = None,
+) -> SimulationStats:
+    """工作进程入口：运行一个分片的对局"""
+    if vote_mode is not None:
+        nodes.VOTE_MODE = vote_mode
+    _worker_llm.requests = _worker_llm.input_tokens = _worker_llm.output_tokens = 0
+    if _worker_cache is not None:
+        _worker_cache.stats = CacheStats()
+    if _worker_resilient is not None:
+        _worker_resilient.metrics = ResilienceMetrics()
+    if _worker_batching is not None:
+        _worker_batching.stats = BatchStats()
+    reset_vote_stats()
+    reset_prompt_stats()
+    reset_leak_stats()
+    # 批量模拟默认不渲染控制台输出，GAME_EVENTS 中的其他输出端（如 jsonl）照常写出
+    set_event_bus(create_event_bus(configured_sinks(console=verbose)))
+    stats = asyncio.run(_run_games(num_games, seed, concurrency, category, difficulty, collect_records, table))
+    get_event_bus().flush()
+    tracer = get_tracer()
+    if tracer.enabled:
+        tracer.flush()
+        stats.trace_files = [tracer.path]
+    stats.requests = _worker_llm.requests
+    stats.input_tokens = _worker_llm.input_tokens
+    stats.output_tokens = _worker_llm.output_tokens
+    stats.vote_retries = get_vote_stats().retries
+    stats.vote_fallbacks = get_vote_stats().fallbacks
+    stats.local_votes = get_vote_stats().local
+    stats.prompts = get_prompt_stats()
+    stats.leaks = get_leak_stats()
+    if _worker_cache is not None:
+        stats.cache_hits = _worker_cache.stats.hits
+        stats.cache_misses = _worker_cache.stats.misses
+    if _worker_resilient is not None:
+        stats.resilience = _worker_resilient.metrics
+    if _worker_batching is not None:
+        stats.batching = _worker_batching.stats
+    return stats
+
+
+# ==================== 模拟入口 ====================
+def run_simulation(
+        games: int,
+        workers: int = 1,
+        concurrency: int = 16,
+        max_inflight: int = 32,
+        seed: int = 0,
+        verbose: bool = False,
+        category: str | None = None,
+        difficulty: str | None = None,
+        collect_records: bool = False,
+        table: TableConfig | None = None,
+        vote_mode: VoteMode | None = None,
+) -> tuple[SimulationStats, float]:
+    """运行批量模拟，返回统计结果与耗时（秒）
+
+    :param collect_records: 是否收集逐局记录（stats.records），供评估统计使用
+    :param table: 牌桌配置，为空时读取 GAME_NUM_* 环境变量
+    :param vote_mode: AI投票方式，为空时读取 VOTE_MODE
+    """
+    workers = max(1, min(workers, games))
+    semaphore = multiprocessing.BoundedSemaphore(max_inflight)
+    # 按工作进程数切分对局，每个分片使用不重叠的种子区间
+    shard_sizes = [games // workers + (1 if i < games % workers else 0) for i in range(workers)]
+    shard_seeds = [seed + sum(shard_sizes[:i]) for i in range(workers)]
+
+    stats = SimulationStats()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(semaphore, workers)) as pool:
+        futures = [
+            pool.submit(
+                _run_shard,
+                size, shard_seed, concurrency, verbose, category, difficulty, collect_records, table, vote_mode,
+            )
+            for size, shard_seed in zip(shard_sizes, shard_seeds)
+        ]
+        for future in futures:
+            stats.merge(future.result())
+    if stats.trace_files:
+        merge_trace_files(os.getenv("GAME_TRACE"), stats.trace_files)
+    return stats, time.perf_counter() - start
+
+
+def print_report(stats: SimulationStats, elapsed: float) -> None:
+    """打印模拟报告"""
+    finished = max(stats.games, 1)
+    tokens = stats.input_tokens + stats.output_tokens
+    print("=" * 60)
+    print("批量模拟结果")
+    print("=" * 60)
+    print(f"完成对局：{stats.games}，失败对局：{stats.errors}，耗时：{elapsed:.2f}s")
+    print(f"吞吐：{stats.games / elapsed:.2f} 局/秒，{tokens / elapsed:.1f} tokens/秒")
+    print(f"LLM请求：{stats.requests}，输入tokens：{stats.input_tokens}，输出tokens：{stats.output_tokens}")
+    if stats.cache_hits or stats.cache_misses:
+        lookups = stats.cache_hits + stats.cache_misses
+        print(f"缓存命中：{stats.cache_hits}/{lookups}（{stats.cache_hits / lookups:.2%}），节省LLM请求：{stats.cache_hits}")
+    print(f"投票重试：{stats.vote_retries}，兜底投票：{stats.vote_fallbacks}" + (
+        f"，本地投票：{stats.local_votes}" if stats.local_votes else ""
+    ))
+    prompts = stats.prompts
+    if prompts.prompts:
+        print(
+            f"提示词：{prompts.prompts}，平均 {prompts.tokens / prompts.prompts:.0f} tokens/个"
+            f"（可复用前缀 {prompts.prefix_tokens / max(prompts.tokens, 1):.0%}），"
+            f"超预算裁剪：{prompts.truncated}，裁剪后仍超预算：{prompts.over_budget}"
+        )
+    if stats.leaks.leaks:
+        print(
+            f"发言泄词：{stats.leaks.leaks} 次（已中止），重新生成 {stats.leaks.regenerations} 次，"
+            f"按跳过发言处理 {stats.leaks.fallbacks} 次"
+        )
+    batching = stats.batching
+    if batching.batches:
+        print(
+            f"合批提交：{batching.batches} 批，平均 {batching.requests / batching.batches:.1f} 个/批"
+            f"（最大 {batching.max_batch}，攒满 {batching.full_batches} 批），"
+            f"平均排队 {batching.wait_seconds / batching.requests * 1000:.1f}ms"
+        )
+    resilience = stats.resilience
+    if resilience.attempts > resilience.requests or resilience.failures or resilience.throttle_wait_seconds:
+        print(
+            f"弹性中间层：429 {resilience.rate_limited} 次（并发下调 {resilience.concurrency_decreases} 次），"
+            f"暂时性错误 {resilience.transient_errors}，重试 {resilience.retries}，失败 {resilience.failures}，"
+            f"超时 {resilience.deadline_exceeded}，熔断 {resilience.breaker_trips} 次/拒绝 {resilience.breaker_rejections}，"
+            f"限流等待 {resilience.throttle_wait_seconds:.1f}s"
+        )
+    print(f"平均回合数：{stats.rounds / finished:.2f}")
+    print(f"普通玩家胜率：{stats.normal_wins / finished:.2%}")
+    print(f"卧底胜率：{stats.undercover_wins / finished:.2%}")
+    if stats.blank_wins:
+        print(f"白板胜率：{stats.blank_wins / finished:.2%}")
+    for sample in stats.error_samples:
+        print(f"失败示例：{sample}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="谁是卧底 - 全AI批量模拟")
+    parser.add_argument("--games", type=int, default=100, help="对局总数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="工作进程数")
+    parser.add_argument("--concurrency", type=int, default=16, help="每个进程内的并发对局数")
+    parser.add_argument("--max-inflight", type=int, default=32, help="全局在途LLM请求上限（合批时按批计）")
+    parser.add_argument("--seed", type=int, default=0, help="起始随机种子")
+    parser.add_argument("--category", help="只使用指定类别的词语对")
+    parser.add_argument("--difficulty", choices=["easy", "normal", "hard"], help="只使用指定难度的词语对")
+    parser.add_argument("--backend", help="LLM后端（如 openai / fake），默认读取 LLM_BACKEND")
+    parser.add_argument("--verbose", action="store_true", help="输出每局的游戏过程")
+    parser.add_argument("--batch-size", type=int, help="跨对局合批提交LLM请求的批大小（设置后开启合批）")
+    parser.add_argument("--batch-wait-ms", type=float, help="合批的最长等待时间（毫秒），默认读取 LLM_BATCH_WAIT_MS")
+    parser.add_argument("--batch-mode", choices=["batch", "file"], help="合批提交方式，默认读取 LLM_BATCH_MODE")
+    parser.add_argument(
+        "--vote-mode", choices=[mode.value for mode in VoteMode],
+        help="AI投票方式：llm / hint（本地可疑度提示）/ local（本地投票，不调用模型），默认读取 VOTE_MODE",
+    )
+    add_table_arguments(parser)
+    args = parser.parse_args()
+    if args.backend:
+        # 工作进程继承环境变量，在各自进程内按该后端创建客户端
+        os.environ["LLM_BACKEND"] = args.backend
+    if args.batch_size:
+        os.environ["LLM_BATCH"] = "1"
+        os.environ["LLM_BATCH_SIZE"] = str(args.batch_size)
+        # 弹性中间层按单条请求限制并发，未指定时放宽到能攒满所有在途批次
+        inflight_batches = int(os.getenv("LLM_BATCH_INFLIGHT", "4"))
+        os.environ.setdefault("LLM_MAX_CONCURRENCY", str(args.batch_size * inflight_batches * args.workers))
+    if args.batch_wait_ms is not None:
+        os.environ["LLM_BATCH_WAIT_MS"] = str(args.batch_wait_ms)
+    if args.batch_mode:
+        os.environ["LLM_BATCH_MODE"] = args.batch_mode
+
+    stats, elapsed = run_simulation(
+        games=args.games,
+        workers=args.workers,
+        concurrency=args.concurrency,
+        max_inflight=args.max_inflight,
+        seed=args.seed,
+        verbose=args.verbose,
+        category=args.category,
+        difficulty=args.difficulty,
+        table=table_from_args(args),
+        vote_mode=VoteMode(args.vote_mode) if args.vote_mode else None,
+    )
+    print_report(stats, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+File: word_store.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+词语对仓库：从文件加载词语对，按类别与难度分档索引，O(1)随机抽取
+
+难度由平民词与卧底词的相似度决定（越相似越难分辨）。相似度使用本地字符n-gram模型计算：
+每个词表示为1-2字n-gram的词频向量（词表由仓库中的全部词语精确构建，不做哈希，没有碰撞带来的虚假相似），
+词语对的相似度为两个向量的余弦相似度。
+计算结果缓存为 .npy 文件（内置词语对在设置 WORD_STORE_CACHE_DIR 时缓存），之后以内存映射方式加载。
+"""
+import csv
+import hashlib
+import json
+import os
+import random
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from .words import WORD_PAIRS_BY_CATEGORY
+
+# 相似度算法版本，写入缓存文件名，算法变化后不会误用旧的缓存
+SIMILARITY_VERSION = 2
+# 难度分档：(名称, 相似度下限, 相似度上限)
+DIFFICULTY_BANDS: list[tuple[str, float, float]] = [
+    ("easy", 0.0, 0.2),
+    ("normal", 0.2, 0.5),
+    ("hard", 0.5, 1.01),
+]
+
+
+def _ngrams(word: str) -> list[str]:
+    return list(word) + [word[i:i + 2] for i in range(len(word) - 1)]
+
+
+def _gram_counts(words: list[str], vocabulary: dict[str, int]) -> tuple[np.ndarray, np.ndarray]:
+    """词语的 n-gram 词频（稀疏表示）：返回按 (词语下标, n-gram编号) 排序的唯一键与对应计数
+
+    键为 词语下标 * 词表大小 + n-gram编号，新出现的 n-gram 依次加入词表
+    """
+    rows, cols = [], []
+    for row, word in enumerate(words):
+        for gram in _ngrams(word):
+            rows.append(row)
+            cols.append(vocabulary.setdefault(gram, len(vocabulary)))
+    return np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+
+
+def pair_similarity(normal_words: list[str], undercover_words: list[str]) -> np.ndarray:
+    """逐对计算词语的字符n-gram词频向量余弦相似度，返回长度为词语对数量的数组
+
+    词表由全部词语精确构建；向量保持稀疏，开销只与词语总字数有关，与词表大小无关
+    """
+    count = len(normal_words)
+    vocabulary: dict[str, int] = {}
+    normal_rows, normal_cols = _gram_counts(normal_words, vocabulary)
+    undercover_rows, undercover_cols = _gram_counts(undercover_words, vocabulary)
+    size = max(len(vocabulary), 1)
+    normal_keys, normal_tf = np.unique(normal_rows * size + normal_cols, return_counts=True)
+    undercover_keys, undercover_tf = np.unique(undercover_rows * size + undercover_cols, return_counts=True)
+
+    # 点积只来自两个词共有的 n-gram：同一词语对、同一 n-gram 的键相同
+    _, normal_at, undercover_at = np.intersect1d(normal_keys, undercover_keys, assume_unique=True, return_indices=True)
+    dots = np.bincount(
+        normal_keys[normal_at] // size,
+        weights=(normal_tf[normal_at] * undercover_tf[undercover_at]).astype(np.float64),
+        minlength=count,
+    )
+    normal_norms = np.sqrt(np.bincount(normal_keys // size, weights=normal_tf.astype(np.float64) ** 2, minlength=count))
+    undercover_norms = np.sqrt(
+        np.bincount(undercover_keys // size, weights=undercover_tf.astype(np.float64) ** 2, minlength=count)
+    )
+    return (dots / np.maximum(normal_norms * undercover_norms, 1e-12)).astype(np.float32)
+
+
+class WordPairStore:
+    """词语对仓库"""
+
+    def __init__(self, pairs: list[tuple[str, str]], categories: list[str], cache_path: str | None = None):
+        self.normal_words: list[str] = [normal for normal, _ in pairs]
+        self.undercover_words: list[str] = [undercover for _, undercover in pairs]
+        self.category_names: list[str] = sorted(set(categories))
+        codes = {name: code for code, name in enumerate(self.category_names)}
+        self.category_codes = np.fromiter((codes[name] for name in categories), dtype=np.int16, count=len(pairs))
+        self.cache_path = cache_path
+        self._similarity: np.ndarray | None = None
+        # (类别, 难度) -> 词语对下标数组，None 表示不限
+        self._index: dict[tuple[str | None, str | None], np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.normal_words)
+
+    # ==================== 加载 ====================
+    @staticmethod
+    def _cache_file(cache_root: Path, stem: str, content: bytes) -> str:
+        """相似度缓存文件路径：文件名包含内容摘要与算法版本，任一变化后自动重新计算"""
+        digest = hashlib.sha1(content).hexdigest()[:12]
+        return str(cache_root / f"{stem}.{digest}.v{SIMILARITY_VERSION}.similarity.npy")
+
+    @classmethod
+    def from_builtin(cls, cache_dir: str | None = None) -> "WordPairStore":
+        """使用内置的预设词语对
+
+        :param cache_dir: 相似度缓存目录，为空时不缓存（每次加载时计算）
+        """
+        pairs, categories = [], []
+        for category, category_pairs in WORD_PAIRS_BY_CATEGORY.items():
+            pairs.extend(category_pairs)
+            categories.extend([category] * len(category_pairs))
+        cache_path = None
+        if cache_dir:
+            content = json.dumps([pairs, categories], ensure_ascii=False).encode("utf-8")
+            cache_path = cls._cache_file(Path(cache_dir), "builtin", content)
+        return cls(pairs, categories, cache_path)
+
+    @classmethod
+    def load(cls, path: str, cache_dir: str | None = None) -> "WordPairStore":
+        """从 CSV（表头 normal,undercover,category）或 JSONL 文件加载词语对
+
+        相似度缓存文件名包含源文件内容摘要，源文件变化后自动重新计算
+        """
+        source = Path(path)
+        content = source.read_bytes()
+        text = content.decode("utf-8-sig")
+        if source.suffix == ".jsonl":
+            records = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            records = list(csv.DictReader(text.splitlines()))
+        pairs = [(record["normal"].strip(), record["undercover"].strip()) for record in records]
+        categories = [(record.get("category") or "未分类").strip() for record in records]
+
+        cache_root = Path(cache_dir) if cache_dir else source.parent
+        return cls(pairs, categories, cls._cache_file(cache_root, source.stem, content))
+
+    # ==================== 相似度与难度 ====================
+    @property
+    def similarity(self) -> np.ndarray:
+        """每个词语对的相似度（首次访问时从缓存映射或计算）"""
+        if self._similarity is None:
+            with self._lock:
+                if self._similarity is None:
+                    self._similarity = self._load_similarity()
+        return self._similarity
+
+    def _load_similarity(self) -> np.ndarray:
+        if self.cache_path and os.path.exists(self.cache_path):
+            return np.load(self.cache_path, mmap_mode="r")
+        similarity = pair_similarity(self.normal_words, self.undercover_words)
+        if self.cache_path:
+            np.save(self.cache_path, similarity)
+            return np.load(self.cache_path, mmap_mode="r")
+        return similarity
+
+    def difficulty_of(self, index: int) -> str:
+        """词语对的难度档位"""
+        score = float(self.similarity[index])
+        return next(name for name, low, high in DIFFICULTY_BANDS if low <= score < high)
+
+    # ==================== 抽样 ====================
+    def _indices(self, category: str | None, difficulty: str | None) -> np.ndarray:
+        key = (category, difficulty)
+        indices = self._index.get(key)
+        if indices is None:
+            mask = np.ones(len(self), dtype=bool)
+            if category is not None:
+                if category not in self.category_names:
+                    raise ValueError(f"未知的词语类别：{category}，可选类别：{', '.join(self.category_names)}")
+                mask &= self.category_codes == self.category_names.index(category)
+            if difficulty is not None:
+                band = next((band for band in DIFFICULTY_BANDS if band[0] == difficulty), None)
+                if band is None:
+                    raise ValueError(f"未知的难度：{difficulty}，可选难度：{', '.join(b[0] for b in DIFFICULTY_BANDS)}")
+                mask &= (self.similarity >= band[1]) & (self.similarity < band[2])
+            indices = np.flatnonzero(mask)
+            self._index[key] = indices
+        return indices
+
+    def sample(
+            self,
+            rng: random.Random,
+            category: str | None = None,
+            difficulty: str | None = None,
+    ) -> tuple[str, str]:
+        """随机抽取一个词语对（平民词, 卧底词），可按类别与难度筛选"""
+        indices = self._indices(category, difficulty)
+        if len(indices) == 0:
+            raise ValueError(f"没有符合条件的词语对：类别={category}，难度={difficulty}")
+        index = int(indices[rng.randrange(len(indices))])
+        return self.normal_words[index], self.undercover_words[index]
+
+
+_store: WordPairStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_word_store() -> WordPairStore:
+    """获取词语对仓库，首次调用时加载：设置 WORD_PAIRS_PATH 时从文件加载，否则使用内置词语对"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = os.getenv("WORD_PAIRS_PATH")
+                cache_dir = os.getenv("WORD_STORE_CACHE_DIR")
+                _store = WordPairStore.load(path, cache_dir) if path else WordPairStore.from_builtin(cache_dir)
+    return _store
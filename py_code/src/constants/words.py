@@ -2,62 +2,79 @@
 # （平民玩家词语， 卧底词语）
 # 预设词语对
 # (平民玩家词语, 卧底词语)
-WORD_PAIRS = [
+WORD_PAIRS_BY_CATEGORY: dict[str, list[tuple[str, str]]] = {
     # 🍎 食物类 (12组)
-    ("苹果", "番茄"),
-    ("香蕉", "黄瓜"),
-    ("西瓜", "冬瓜"),
-    ("巧克力", "酱油膏"),
-    ("米饭", "蒸蛋"),
-    ("可乐", "酱油"),
-    ("蜂蜜", "糖浆"),
-    ("蛇", "蚯蚓"),
-    ("奶酪", "豆腐"),
-    ("薯片", "压缩饼干"),
-    ("草莓", "树莓"),
-    ("绿茶", "抹茶"),
+    "食物": [
+        ("苹果", "番茄"),
+        ("香蕉", "黄瓜"),
+        ("西瓜", "冬瓜"),
+        ("巧克力", "酱油膏"),
+        ("米饭", "蒸蛋"),
+        ("可乐", "酱油"),
+        ("蜂蜜", "糖浆"),
+        ("蛇", "蚯蚓"),
+        ("奶酪", "豆腐"),
+        ("薯片", "压缩饼干"),
+        ("草莓", "树莓"),
+        ("绿茶", "抹茶"),
+    ],
     # 🏛️ 场所类 (8组)
-    ("学校", "医院"),
-    ("超市", "菜市场"),
-    ("图书馆", "书店"),
-    ("机场", "火车站"),
-    ("游泳池", "澡堂"),
-    ("电影院", "剧院"),
-    ("银行", "邮局"),
-    ("公园", "植物园"),
+    "场所": [
+        ("学校", "医院"),
+        ("超市", "菜市场"),
+        ("图书馆", "书店"),
+        ("机场", "火车站"),
+        ("游泳池", "澡堂"),
+        ("电影院", "剧院"),
+        ("银行", "邮局"),
+        ("公园", "植物园"),
+    ],
     # 👨‍⚕️ 人物类 (6组)
-    ("医生", "护士"),
-    ("老师", "辅导员"),
-    ("厨师", "面包师"),
-    ("警察", "保安"),
-    ("演员", "主持人"),
-    ("爸爸", "叔叔"),
+    "人物": [
+        ("医生", "护士"),
+        ("老师", "辅导员"),
+        ("厨师", "面包师"),
+        ("警察", "保安"),
+        ("演员", "主持人"),
+        ("爸爸", "叔叔"),
+    ],
     # 🚲 交通工具 (7组)
-    ("自行车", "电动车"),
-    ("出租车", "网约车"),
-    ("公交车", "校车"),
-    ("飞机", "客机"),
-    ("轮船", "游轮"),
-    ("地铁", "轻轨"),
-    ("拖拉机", "挖掘机"),
+    "交通工具": [
+        ("自行车", "电动车"),
+        ("出租车", "网约车"),
+        ("公交车", "校车"),
+        ("飞机", "客机"),
+        ("轮船", "游轮"),
+        ("地铁", "轻轨"),
+        ("拖拉机", "挖掘机"),
+    ],
     # 🌿 自然类 (6组)
-    ("云", "雾"),
-    ("雪", "盐"),
-    ("河流", "运河"),
-    ("松树", "圣诞树"),
-    ("萤火虫", "LED灯"),
-    ("彩虹", "极光"),
+    "自然": [
+        ("云", "雾"),
+        ("雪", "盐"),
+        ("河流", "运河"),
+        ("松树", "圣诞树"),
+        ("萤火虫", "LED灯"),
+        ("彩虹", "极光"),
+    ],
     # 🖥️ 科技产品 (5组)
-    ("手机", "对讲机"),
-    ("平板", "电子书"),
-    ("U盘", "移动硬盘"),
-    ("路由器", "调制解调器"),
-    ("投影仪", "放映机"),
+    "科技产品": [
+        ("手机", "对讲机"),
+        ("平板", "电子书"),
+        ("U盘", "移动硬盘"),
+        ("路由器", "调制解调器"),
+        ("投影仪", "放映机"),
+    ],
     # 🎨 文化概念 (6组)
-    ("李白", "杜甫"),
-    ("西游记", "封神榜"),
-    ("春节", "冬至"),
-    ("油画", "水彩画"),
-    ("京剧", "越剧"),
-    ("咖啡", "茶"),
-]
+    "文化概念": [
+        ("李白", "杜甫"),
+        ("西游记", "封神榜"),
+        ("春节", "冬至"),
+        ("油画", "水彩画"),
+        ("京剧", "越剧"),
+        ("咖啡", "茶"),
+    ],
+}
+
+# 全部词语对
+WORD_PAIRS = [pair for pairs in WORD_PAIRS_BY_CATEGORY.values() for pair in pairs]
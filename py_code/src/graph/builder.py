@@ -4,52 +4,86 @@ Created Time: 2026-01-05
 Author: falcon (liuc47810@gmail.com)
 """
 
-from .types import GameState, PlayerRole, PlayerType
+from .types import GameState
+from .instrumentation import get_tracer
 from .nodes import (
     start_round_node, game_end_node, collect_vote_node,
     check_game_end_node, collect_speech_node, process_elimination_node
 )
+import functools
 from typing import Literal
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.state import CompiledStateGraph
 
+# 单局游戏的最大执行步数（每位玩家发言各占一步，需高于 LangGraph 默认的25）
+# 50人局每回合淘汰一人时约需 1400 步，另为平票重投与无人淘汰的回合留出余量
+GAME_RECURSION_LIMIT = 5000
+
+
 # ==================== 条件边界函数 ====================
 def should_continue_game(state: GameState) -> Literal["continue_round", "end_game"]:
-    """检查游戏是否继续"""
-    alive_players = [player for player in state["players"] if player.is_alive]
-    undercovers = [
-        player
-        for player in alive_players
-        if player.player_role == PlayerRole.UNDERCOVER
-    ]
-
-    # 判定游戏是否继续
-    if len(undercovers) == 0:
-        return "end_game"
-    elif len(alive_players) <= 2:
+    """检查游戏是否继续：check_game_end 已记录胜负时结束"""
+    history = state["game_history"]
+    if history and "winner" in history[-1]:
         return "end_game"
-    else:
-        return "continue_round"
+    return "continue_round"
+
+
+def should_continue_speech(state: GameState) -> Literal["next_speaker", "voting"]:
+    """检查本回合是否还有玩家未发言"""
+    if state["speech_turn"] < state["players"].alive_count():
+        return "next_speaker"
+    return "voting"
+
+
+def should_revote(state: GameState) -> Literal["revote", "resolved"]:
+    """检查本轮投票是否因平票需要在平票玩家之间重投"""
+    if state["revote_candidates"]:
+        return "revote"
+    return "resolved"
+
 
 # ==================== 构建LangGraph ====================
-def build_game_graph() -> CompiledStateGraph:
-    """构建游戏流程"""
+def build_game_graph(checkpointer: BaseCheckpointSaver | None = None) -> CompiledStateGraph:
+    """构建游戏流程
+
+    :param checkpointer: 检查点存储，传入后每个节点完成时保存对局状态，可从中断处恢复
+    """
     gameflow = StateGraph(GameState)
+    # 开启埋点时包装节点以记录耗时，未开启时原样注册
+    tracer = get_tracer()
 
     # 添加节点
-    gameflow.add_node("start_round", start_round_node)
-    gameflow.add_node("collect_speech", collect_speech_node)
-    gameflow.add_node("collect_vote", collect_vote_node)
-    gameflow.add_node("process_elimination", process_elimination_node)
-    gameflow.add_node("check_game_end", check_game_end_node)
-    gameflow.add_node("game_end", game_end_node)
+    gameflow.add_node("start_round", tracer.wrap_node("start_round", start_round_node))
+    gameflow.add_node("collect_speech", tracer.wrap_node("collect_speech", collect_speech_node))
+    gameflow.add_node("collect_vote", tracer.wrap_node("collect_vote", collect_vote_node))
+    gameflow.add_node("process_elimination", tracer.wrap_node("process_elimination", process_elimination_node))
+    gameflow.add_node("check_game_end", tracer.wrap_node("check_game_end", check_game_end_node))
+    gameflow.add_node("game_end", tracer.wrap_node("game_end", game_end_node))
 
     # 添加边
     gameflow.add_edge(START, "start_round")
     gameflow.add_edge("start_round", "collect_speech")
-    gameflow.add_edge("collect_speech", "collect_vote")
+    # 每次发言节点处理一位玩家，全部发言完毕后进入投票
+    gameflow.add_conditional_edges(
+        "collect_speech",
+        should_continue_speech,
+        {
+            "next_speaker": "collect_speech",
+            "voting": "collect_vote"
+        }
+    )
     gameflow.add_edge("collect_vote", "process_elimination")
-    gameflow.add_edge("process_elimination", "check_game_end")
+    # 平票且允许重投时回到投票节点，只在平票玩家之间重投
+    gameflow.add_conditional_edges(
+        "process_elimination",
+        should_revote,
+        {
+            "revote": "collect_vote",
+            "resolved": "check_game_end"
+        }
+    )
 
     # 添加条件边，判断是否继续游戏
     gameflow.add_conditional_edges(
@@ -63,4 +97,10 @@ def build_game_graph() -> CompiledStateGraph:
 
     gameflow.add_edge("game_end", END)
 
-    return gameflow.compile()
\ No newline at end of file
+    return gameflow.compile(checkpointer=checkpointer)
+
+
+@functools.cache
+def get_game_graph() -> CompiledStateGraph:
+    """获取不带检查点的游戏图，进程内只编译一次"""
+    return build_game_graph()
\ No newline at end of file
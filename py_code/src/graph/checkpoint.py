@@ -0,0 +1,165 @@
+"""
+File: checkpoint.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+对局存档：SQLite检查点 + 游戏状态的紧凑二进制序列化
+
+- 枚举按成员序号存为整数
+- 玩家按定长字段数组存储，玩家索引只存玩家数据，存活集合与角色计数在读取时重建
+- 游戏历史按相邻记录的差量存储
+- 计票结果按字段数组存储
+其余对象交由 LangGraph 默认的 JsonPlusSerializer 处理
+"""
+import sqlite3
+from enum import Enum
+from typing import Any
+
+import ormsgpack
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from .types import GameHistory, GameStatus, Player, PlayerRegistry, PlayerRole, PlayerType
+from .votes import VoteResult
+
+# 自定义扩展类型编号
+EXT_ENUM = 1
+EXT_PLAYER = 2
+EXT_REGISTRY = 3
+EXT_HISTORY = 4
+EXT_FALLBACK = 5
+EXT_VOTE_RESULT = 6
+
+_OPTION = (
+    ormsgpack.OPT_NON_STR_KEYS
+    | ormsgpack.OPT_PASSTHROUGH_DATACLASS
+    | ormsgpack.OPT_PASSTHROUGH_DATETIME
+    | ormsgpack.OPT_PASSTHROUGH_ENUM
+    | ormsgpack.OPT_PASSTHROUGH_SUBCLASS
+    | ormsgpack.OPT_PASSTHROUGH_UUID
+)
+
+# 游戏枚举及其成员，按序号编码
+_ENUMS: list[type[Enum]] = [GameStatus, PlayerRole, PlayerType]
+_ENUM_MEMBERS: list[list[Enum]] = [list(enum) for enum in _ENUMS]
+_ENUM_INDEX: dict[Enum, tuple[int, int]] = {
+    member: (code, index)
+    for code, members in enumerate(_ENUM_MEMBERS)
+    for index, member in enumerate(members)
+}
+_PLAYER_TYPES: list[PlayerType] = list(PlayerType)
+_PLAYER_ROLES: list[PlayerRole] = list(PlayerRole)
+
+
+class CompactSerializer(SerializerProtocol):
+    """游戏状态的紧凑序列化器"""
+
+    def __init__(self):
+        self.fallback = JsonPlusSerializer()
+
+    # ==================== 编码 ====================
+    def _pack(self, obj: Any) -> bytes:
+        return ormsgpack.packb(obj, default=self._default, option=_OPTION)
+
+    @staticmethod
+    def _enum_index(member: Enum | None) -> int:
+        return -1 if member is None else _ENUM_INDEX[member][1]
+
+    def _player_row(self, player: Player) -> list:
+        return [
+            player.id,
+            player.name,
+            self._enum_index(player.player_type),
+            self._enum_index(player.player_role),
+            player.word,
+            player.is_alive,
+            player.speech,
+            player.votes_received,
+            player.vote_for,
+        ]
+
+    def _default(self, obj: Any) -> ormsgpack.Ext:
+        if isinstance(obj, Enum) and obj in _ENUM_INDEX:
+            return ormsgpack.Ext(EXT_ENUM, self._pack(list(_ENUM_INDEX[obj])))
+        if isinstance(obj, Player):
+            return ormsgpack.Ext(EXT_PLAYER, self._pack(self._player_row(obj)))
+        if isinstance(obj, PlayerRegistry):
+            return ormsgpack.Ext(EXT_REGISTRY, self._pack([self._player_row(p) for p in obj]))
+        if isinstance(obj, GameHistory):
+            return ormsgpack.Ext(EXT_HISTORY, self._pack(self._history_deltas(obj)))
+        if isinstance(obj, VoteResult):
+            row = [obj.counts, obj.eliminated, obj.tied, obj.abstentions, obj.invalid, obj.revote]
+            return ormsgpack.Ext(EXT_VOTE_RESULT, self._pack(row))
+        type_, data = self.fallback.dumps_typed(obj)
+        return ormsgpack.Ext(EXT_FALLBACK, self._pack([type_, data]))
+
+    @staticmethod
+    def _history_deltas(history: GameHistory) -> list[list]:
+        """每条记录只保存相对上一条新增或变化的字段，以及被移除的字段"""
+        deltas = []
+        previous: dict = {}
+        for entry in history:
+            changed = {key: value for key, value in entry.items() if key not in previous or previous[key] != value}
+            removed = [key for key in previous if key not in entry]
+            deltas.append([changed, removed])
+            previous = entry
+        return deltas
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        return "compact", self._pack(obj)
+
+    # ==================== 解码 ====================
+    def _unpack(self, data: bytes) -> Any:
+        return ormsgpack.unpackb(data, ext_hook=self._ext_hook, option=ormsgpack.OPT_NON_STR_KEYS)
+
+    @staticmethod
+    def _player(row: list) -> Player:
+        player_id, name, type_index, role_index, word, is_alive, speech, votes_received, vote_for = row
+        return Player(
+            id=player_id,
+            name=name,
+            player_type=_PLAYER_TYPES[type_index],
+            player_role=None if role_index < 0 else _PLAYER_ROLES[role_index],
+            word=word,
+            is_alive=is_alive,
+            speech=speech,
+            votes_received=votes_received,
+            vote_for=vote_for,
+        )
+
+    def _ext_hook(self, code: int, data: bytes) -> Any:
+        if code == EXT_ENUM:
+            enum_code, index = self._unpack(data)
+            return _ENUM_MEMBERS[enum_code][index]
+        if code == EXT_PLAYER:
+            return self._player(self._unpack(data))
+        if code == EXT_REGISTRY:
+            return PlayerRegistry([self._player(row) for row in self._unpack(data)])
+        if code == EXT_HISTORY:
+            history = GameHistory()
+            previous: dict = {}
+            for changed, removed in self._unpack(data):
+                entry = {key: value for key, value in previous.items() if key not in removed}
+                entry.update(changed)
+                history.append(entry)
+                previous = entry
+            return history
+        if code == EXT_VOTE_RESULT:
+            counts, eliminated, tied, abstentions, invalid, revote = self._unpack(data)
+            return VoteResult(counts, eliminated, tied, abstentions, invalid, revote)
+        if code == EXT_FALLBACK:
+            type_, payload = self._unpack(data)
+            return self.fallback.loads_typed((type_, payload))
+        raise ValueError(f"未知的扩展类型：{code}")
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_ != "compact":
+            return self.fallback.loads_typed(data)
+        return self._unpack(payload)
+
+
+def create_sqlite_checkpointer(path: str):
+    """创建使用紧凑序列化的SQLite检查点存储"""
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    conn = sqlite3.connect(path, check_same_thread=False)
+    return SqliteSaver(conn, serde=CompactSerializer())
@@ -0,0 +1,384 @@
+"""
+File: events.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+游戏事件总线：节点只发出带类型的事件，由可插拔的输出端决定如何呈现
+
+输出端（GAME_EVENTS，逗号分隔）：
+- console：控制台渲染，输出与交互式游戏一致
+- jsonl：按行写入 GAME_EVENTS_PATH，攒够 GAME_EVENTS_FLUSH 条后批量写出（路径可含 {pid}，多进程时各写一个文件）
+- stream：转发给 LangGraph 的自定义流（stream_mode="custom"），供游戏服务端推送给客户端
+- null：丢弃所有事件，批量模拟时不承担任何输出开销
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, fields
+from typing import ClassVar, Iterable
+
+from .types import PlayerRole
+
+# 事件输出端、JSONL文件路径与批量写出的条数
+GAME_EVENTS = os.getenv("GAME_EVENTS", "console")
+GAME_EVENTS_PATH = os.getenv("GAME_EVENTS_PATH", "events.jsonl")
+GAME_EVENTS_FLUSH = int(os.getenv("GAME_EVENTS_FLUSH", "256"))
+
+# 当前对局的标识（批量模拟、服务端同时运行多局时区分事件所属对局），随上下文传入节点工作线程
+current_game: ContextVar[str | None] = ContextVar("current_game", default=None)
+
+
+# ==================== 事件 ====================
+@dataclass(frozen=True, slots=True)
+class GameEvent:
+    """游戏事件基类，kind 为事件类型名"""
+    kind: ClassVar[str] = ""
+
+    def as_dict(self) -> dict:
+        return {"type": self.kind, **{field.name: getattr(self, field.name) for field in fields(self)}}
+
+
+@dataclass(frozen=True, slots=True)
+class WordAssigned(GameEvent):
+    """人类玩家拿到词语（白板为空字符串）"""
+    kind: ClassVar[str] = "word_assigned"
+    player_id: int
+    word: str
+
+
+@dataclass(frozen=True, slots=True)
+class RoundStarted(GameEvent):
+    kind: ClassVar[str] = "round_started"
+    round: int
+    alive: list[str]  # 存活玩家名称（座位顺序）
+
+
+@dataclass(frozen=True, slots=True)
+class SpeechStarted(GameEvent):
+    kind: ClassVar[str] = "speech_started"
+    round: int
+    turn: int  # 本回合第几位发言（从0开始）
+    player_id: int
+    player_name: str
+    human: bool
+
+
+@dataclass(frozen=True, slots=True)
+class SpeechToken(GameEvent):
+    """AI发言的一个流式分块"""
+    kind: ClassVar[str] = "speech_token"
+    player_id: int
+    text: str
+
+
+@dataclass(frozen=True, slots=True)
+class SpeechRetracted(GameEvent):
+    """AI发言出现了自己的词语，已输出的部分作废（不含词语本身），随后重新生成或按跳过发言处理"""
+    kind: ClassVar[str] = "speech_retracted"
+    round: int
+    player_id: int
+    player_name: str
+    attempt: int  # 第几次生成（从1开始）
+    regenerate: bool  # 是否重新生成
+
+
+@dataclass(frozen=True, slots=True)
+class SpeechDone(GameEvent):
+    kind: ClassVar[str] = "speech_done"
+    round: int
+    player_id: int
+    player_name: str
+    text: str
+    human: bool
+
+
+@dataclass(frozen=True, slots=True)
+class VotingStarted(GameEvent):
+    kind: ClassVar[str] = "voting_started"
+    round: int
+    candidates: list[str]  # 候选人名称
+    revote: bool  # 是否为平票重投
+
+
+@dataclass(frozen=True, slots=True)
+class VoteStarted(GameEvent):
+    """一位玩家开始投票（人类玩家附带可投票的玩家编号）"""
+    kind: ClassVar[str] = "vote_started"
+    player_id: int
+    player_name: str
+    human: bool
+    candidates: list[int]
+
+
+@dataclass(frozen=True, slots=True)
+class VoteCast(GameEvent):
+    kind: ClassVar[str] = "vote_cast"
+    round: int
+    voter_id: int
+    target_id: int | None  # None 表示弃权
+
+
+@dataclass(frozen=True, slots=True)
+class VoteTallied(GameEvent):
+    """公布本轮投票与计票结果"""
+    kind: ClassVar[str] = "vote_tallied"
+    round: int
+    votes: list[tuple[int, str, str | None]]  # (投票者id, 投票者名称, 被投玩家名称)，None 表示弃权
+    counts: list[tuple[int, str, int]]  # (玩家id, 名称, 得票数)，按票数从高到低
+    invalid: list[str]  # 投出无效票的玩家名称
+
+
+@dataclass(frozen=True, slots=True)
+class Revote(GameEvent):
+    kind: ClassVar[str] = "revote"
+    round: int
+    tied: list[str]
+
+
+@dataclass(frozen=True, slots=True)
+class Elimination(GameEvent):
+    """本回合淘汰结果，player_id 为 None 表示无人淘汰"""
+    kind: ClassVar[str] = "elimination"
+    round: int
+    player_id: int | None
+    player_name: str | None
+    role: str | None
+    word: str | None
+    tied: list[str]  # 平票玩家名称（平票随机淘汰或平票无人淘汰时非空）
+
+
+@dataclass(frozen=True, slots=True)
+class GameOver(GameEvent):
+    kind: ClassVar[str] = "game_over"
+    winner: str
+    rounds: int
+    players: list[dict]  # 每位玩家的 id / name / role / word / is_alive
+
+
+# ==================== 输出端 ====================
+_ELIMINATED_ROLE_DISPLAY = {
+    PlayerRole.NORMAL.value: "【普通玩家】", PlayerRole.UNDERCOVER.value: "【卧底】💣", PlayerRole.BLANK.value: "【白板】"
+}
+_FINAL_ROLE_DISPLAY = {
+    PlayerRole.NORMAL.value: "【平民】", PlayerRole.UNDERCOVER.value: "【卧底】💣", PlayerRole.BLANK.value: "【白板】"
+}
+_GAME_END_MESSAGES = {
+    PlayerRole.NORMAL.value: "🎉 游戏结束！普通玩家获胜！卧底已被淘汰。",
+    PlayerRole.UNDERCOVER.value: "🎉 游戏结束！卧底获胜！",
+    PlayerRole.BLANK.value: "🎉 游戏结束！白板获胜！",
+}
+
+
+class ConsoleSink:
+    """控制台渲染"""
+
+    def handle(self, event: GameEvent) -> None:
+        getattr(self, "_" + event.kind)(event)
+
+    def flush(self) -> None:
+        pass
+
+    @staticmethod
+    def _word_assigned(event: WordAssigned) -> None:
+        print(f"你看到的词语是: {event.word}" if event.word else "你是白板，没有拿到词语")
+
+    @staticmethod
+    def _round_started(event: RoundStarted) -> None:
+        print("=" * 60)
+        print(f"第 {event.round} 回合开始！")
+        print("=" * 60)
+        print(f"场上存活玩家有：{','.join(event.alive)}")
+
+    @staticmethod
+    def _speech_started(event: SpeechStarted) -> None:
+        if event.turn == 0:
+            print("\n【玩家发言阶段】")
+        if event.human:
+            print(f"\n{event.player_name}，请用一句话描述你的词语（不能说出词语本身）：")
+        else:
+            print(f"玩家({event.player_id}){event.player_name}】发言：")
+
+    @staticmethod
+    def _speech_token(event: SpeechToken) -> None:
+        print(event.text, end="", flush=True)
+
+    @staticmethod
+    def _speech_retracted(event: SpeechRetracted) -> None:
+        print("（发言中出现了自己的词语，已撤回）")
+        print(f"玩家({event.player_id}){event.player_name}】{'重新发言' if event.regenerate else '发言'}：")
+
+    @staticmethod
+    def _speech_done(event: SpeechDone) -> None:
+        if event.human:
+            print(f"玩家【{event.player_id}】{event.player_name}】发言：{event.text}")
+        else:
+            print()  # 结束换行
+
+    @staticmethod
+    def _voting_started(event: VotingStarted) -> None:
+        if event.revote:
+            print(f"\n【平票重投】只能投给：{','.join(event.candidates)}\n")
+        else:
+            print("\n【玩家投票阶段】\n")
+
+    @staticmethod
+    def _vote_started(event: VoteStarted) -> None:
+        if not event.human:
+            print(f"玩家【{event.player_name}】投票中")
+            return
+        print(f"玩家【{event.player_name}】您想投票给谁？可投票的玩家有：\n")
+        for player_id in event.candidates:
+            print(f"玩家【{player_id}】")
+
+    @staticmethod
+    def _vote_cast(event: VoteCast) -> None:
+        # 投票结果在计票时统一公布
+        pass
+
+    @staticmethod
+    def _vote_tallied(event: VoteTallied) -> None:
+        print("\n【本回合投票结果】\n")
+        for voter_id, voter_name, target_name in event.votes:
+            print(f"玩家({voter_id})【{voter_name}】的投票结果是【{target_name or '弃权'}】")
+        print("\n正在归票...\n")
+        for player_id, name, count in event.counts:
+            print(f"玩家({player_id})【{name}】】获得{count}票")
+        if event.invalid:
+            print(f"无效票：{','.join(event.invalid)}")
+
+    @staticmethod
+    def _revote(event: Revote) -> None:
+        print(f"平票！{','.join(event.tied)} 得票相同，进入重投")
+
+    @staticmethod
+    def _elimination(event: Elimination) -> None:
+        tied_names = ",".join(event.tied)
+        if event.player_id is None:
+            print(f"平票！{tied_names} 得票相同，本回合无人淘汰" if event.tied else "没有有效票，本回合无人淘汰")
+            return
+        if event.tied:
+            print(f"平票！{tied_names} 得票相同，随机淘汰")
+        role_display = _ELIMINATED_ROLE_DISPLAY[event.role]
+        print(f"被淘汰的玩家是【{event.player_name}】，其身份是{role_display}，词语是【{event.word or '无'}】")
+
+    @staticmethod
+    def _game_over(event: GameOver) -> None:
+        print(f"\n{_GAME_END_MESSAGES[event.winner]}")
+        print("=" * 60)
+        print("游戏结束！")
+        print("=" * 60)
+        for player in event.players:
+            role_display = _FINAL_ROLE_DISPLAY[player["role"]]
+            print(f"玩家【{player['id']}】{player['name']}】的身份是{role_display}，词语是【{player['word'] or '无'}】")
+
+
+class JsonlSink:
+    """JSONL文件输出：事件先写入内存缓冲，攒够 flush_every 条或调用 flush 时一次写出"""
+
+    def __init__(self, path: str, flush_every: int = 256):
+        self.path = path.format(pid=os.getpid())
+        self.flush_every = flush_every
+        self._buffer: list[str] = []
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+        atexit.register(self.flush)
+
+    def handle(self, event: GameEvent) -> None:
+        record = {"ts": time.time(), "game": current_game.get(), **event.as_dict()}
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) < self.flush_every:
+                return
+            lines, self._buffer = self._buffer, []
+            self._file.write("\n".join(lines) + "\n")
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._buffer:
+                self._file.write("\n".join(self._buffer) + "\n")
+                self._buffer = []
+            self._file.flush()
+
+
+class StreamSink:
+    """转发给当前图运行的自定义流；不在图运行中（如初始化对局）时丢弃"""
+
+    def handle(self, event: GameEvent) -> None:
+        from langgraph.config import get_stream_writer
+        try:
+            writer = get_stream_writer()
+        except RuntimeError:
+            return
+        writer(event.as_dict())
+
+    def flush(self) -> None:
+        pass
+
+
+# ==================== 事件总线 ====================
+class EventBus:
+    """把事件分发给各输出端；没有输出端时为空操作"""
+
+    def __init__(self, sinks: Iterable = ()):
+        self.sinks = list(sinks)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sinks)
+
+    def emit(self, event: GameEvent) -> None:
+        for sink in self.sinks:
+            sink.handle(event)
+
+    def flush(self) -> None:
+        for sink in self.sinks:
+            sink.flush()
+
+
+def create_event_bus(names: Iterable[str]) -> EventBus:
+    """按输出端名称创建事件总线（console / jsonl / stream / null）"""
+    sinks = []
+    for name in dict.fromkeys(name.strip() for name in names):
+        if name == "console":
+            sinks.append(ConsoleSink())
+        elif name == "jsonl":
+            sinks.append(JsonlSink(GAME_EVENTS_PATH, GAME_EVENTS_FLUSH))
+        elif name == "stream":
+            sinks.append(StreamSink())
+        elif name not in ("null", ""):
+            raise ValueError(f"未知的事件输出端：{name}，可选：console / jsonl / stream / null")
+    return EventBus(sinks)
+
+
+def configured_sinks(console: bool = True) -> list[str]:
+    """GAME_EVENTS 配置的输出端
+
+    :param console: 是否保留控制台输出（批量模拟、服务端未开启 --verbose 时不保留）
+    """
+    names = [name.strip() for name in GAME_EVENTS.split(",")]
+    return [name for name in names if console or name != "console"]
+
+
+_bus: EventBus | None = None
+
+
+def get_event_bus() -> EventBus:
+    """获取当前事件总线，首次调用时按 GAME_EVENTS 创建"""
+    global _bus
+    if _bus is None:
+        _bus = create_event_bus(configured_sinks())
+    return _bus
+
+
+def set_event_bus(bus: EventBus) -> None:
+    """替换当前事件总线"""
+    global _bus
+    _bus = bus
+
+
+def emit(event: GameEvent) -> None:
+    """向当前事件总线发出事件"""
+    get_event_bus().emit(event)
@@ -0,0 +1,91 @@
+"""
+File: history.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+游戏历史：有界的回合记录窗口 + 早期回合摘要
+
+最近 HISTORY_WINDOW 回合保留完整的发言与投票，更早的回合压缩为一行摘要（发言截断到
+HISTORY_SUMMARY_CHARS 个字），摘要最多保留 HISTORY_MAX_SUMMARIES 条。
+这样单局内存与提示词中历史部分的长度都不随回合数增长。
+"""
+import os
+
+# 保留完整发言与投票的最近回合数
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "2"))
+# 最多保留的早期回合摘要条数
+HISTORY_MAX_SUMMARIES = int(os.getenv("HISTORY_MAX_SUMMARIES", "8"))
+# 摘要中每条发言保留的字数
+HISTORY_SUMMARY_CHARS = int(os.getenv("HISTORY_SUMMARY_CHARS", "24"))
+# GameState.messages 最多保留的消息条数
+MESSAGES_WINDOW = int(os.getenv("MESSAGES_WINDOW", "50"))
+
+# 历史记录中的角色值（PlayerRole.value）-> 中文名称
+_ROLE_NAMES = {"normal": "平民", "undercover": "卧底", "blank": "白板"}
+
+
+def _truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def _votes_text(votes: dict[int, int | None]) -> str:
+    return "，".join(f"{voter}→{'弃权' if target is None else target}" for voter, target in votes.items())
+
+
+def _elimination_text(entry: dict) -> str:
+    if entry["eliminated_id"] is None:
+        return "无人淘汰"
+    return f"玩家{entry['eliminated_id']}被淘汰（{_ROLE_NAMES.get(entry['eliminated_role'], '平民')}）"
+
+
+def summarize_round(entry: dict) -> dict:
+    """将一条完整的回合记录压缩为摘要记录"""
+    speeches = "；".join(
+        f"玩家{player_id}：{_truncate(speech, HISTORY_SUMMARY_CHARS)}"
+        for player_id, speech in entry["speeches"].items()
+    )
+    return {
+        "round": entry["round"],
+        "eliminated_id": entry["eliminated_id"],
+        "eliminated_name": entry["eliminated_name"],
+        "eliminated_role": entry["eliminated_role"],
+        "summary": f"{speeches}；投票：{_votes_text(entry['votes'])}",
+    }
+
+
+class GameHistory(list):
+    """游戏历史记录，每回合一条（存档时按相邻记录的差量序列化）
+
+    完整记录包含 votes / speeches，压缩后的记录以 summary 代替；游戏结束记录不参与压缩
+    """
+
+    def record_round(self, entry: dict) -> None:
+        """追加一回合的完整记录，并压缩窗口之外的回合"""
+        self.append(entry)
+        full = [index for index, item in enumerate(self) if "speeches" in item]
+        for index in full[:max(len(full) - HISTORY_WINDOW, 0)]:
+            self[index] = summarize_round(self[index])
+        summaries = [index for index, item in enumerate(self) if "summary" in item]
+        for index in reversed(summaries[:max(len(summaries) - HISTORY_MAX_SUMMARIES, 0)]):
+            del self[index]
+
+    def prompt_context(self) -> str:
+        """渲染为提示词中的【历史回合】内容，没有历史时返回“无”"""
+        lines = []
+        for entry in self:
+            if "round" not in entry:
+                continue
+            eliminated = _elimination_text(entry)
+            if "summary" in entry:
+                lines.append(f"第{entry['round']}轮（摘要）：{entry['summary']}；{eliminated}")
+            else:
+                lines.append(f"第{entry['round']}轮：")
+                lines.extend(f"玩家{player_id}：{speech}" for player_id, speech in entry["speeches"].items())
+                lines.append(f"投票：{_votes_text(entry['votes'])}；{eliminated}")
+        return "\n".join(lines) or "无"
+
+
+def add_messages_window(left: list, right: list) -> list:
+    """add_messages 的有界版本：只保留最近 MESSAGES_WINDOW 条消息"""
+    # 延迟导入：只有对局真正写入消息时才加载 langgraph 的消息模块
+    from langgraph.graph.message import add_messages
+    return add_messages(left, right)[-MESSAGES_WINDOW:]
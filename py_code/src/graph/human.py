@@ -0,0 +1,32 @@
+"""
+File: human.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+人类玩家输入：控制台模式读取标准输入，服务端模式通过 LangGraph interrupt 挂起对局等待输入
+
+通过图配置 configurable.human_input 选择模式（console / interrupt / replay），默认 console。
+interrupt 模式下节点恢复时会从头重新执行，因此请求输入前不应有昂贵的操作（如LLM调用）。
+replay 模式下返回录制日志中该玩家的决定（见 recording.py）。
+"""
+from langchain_core.runnables import RunnableConfig
+from langgraph.types import interrupt
+
+
+def uses_interrupt(config: RunnableConfig | None) -> bool:
+    """当前对局是否通过 interrupt 收集人类输入"""
+    return bool(config) and config.get("configurable", {}).get("human_input") == "interrupt"
+
+
+def ask_human(config: RunnableConfig | None, kind: str, prompt: str, **payload) -> str:
+    """请求人类玩家输入
+
+    :param kind: 输入类型（speech / vote），随 interrupt 一起发给客户端
+    :param prompt: 控制台模式下的输入提示
+    :param payload: 玩家id（player_id）、回合（round）、重投次数（revote）等，随 interrupt 一起发给客户端
+    """
+    if uses_interrupt(config):
+        return str(interrupt({"kind": kind, "prompt": prompt, **payload}))
+    if config and config.get("configurable", {}).get("human_input") == "replay":
+        from .recording import get_replay_session
+        return get_replay_session().human_input(kind, payload)
+    return input(prompt)
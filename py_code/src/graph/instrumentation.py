@@ -0,0 +1,268 @@
+"""
+File: instrumentation.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+节点耗时与token用量埋点：记录写入JSONL追踪文件，游戏结束后输出汇总表
+
+设置环境变量 GAME_TRACE=<文件路径> 开启；未开启时节点不做包装，埋点调用均为空操作。
+记录到达即写入文件，内存中只保留按节点/调用类型累加的汇总，长时间运行时内存占用不随记录数增长。
+批量模拟的各工作进程写各自的分片文件，模拟结束后由主进程合并到 GAME_TRACE。
+"""
+import atexit
+import functools
+import json
+import os
+import shutil
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+
+class Span:
+    """一次LLM调用或人类输入的埋点记录"""
+    __slots__ = ("tracer", "record", "_start", "_request_start", "_first_token", "_chunks", "_discarded")
+
+    def __init__(self, tracer: "Tracer", kind: str, fields: dict):
+        self.tracer = tracer
+        self.record = {"type": "call", "kind": kind, **fields, "retries": 0, "tokens_in": 0, "tokens_out": 0}
+
+    def __enter__(self) -> "Span":
+        self._start = self._request_start = time.perf_counter()
+        self._first_token = None
+        self._chunks = 0
+        self._discarded = False
+        return self
+
+    def prompt_built(self) -> None:
+        """提示词构建完成，随后发出请求"""
+        self._request_start = time.perf_counter()
+        self.record["prompt_ms"] = (self._request_start - self._start) * 1000
+
+    def token(self) -> None:
+        """收到一个流式分块"""
+        if self._first_token is None:
+            self._first_token = time.perf_counter()
+            self.record["ttft_ms"] = (self._first_token - self._request_start) * 1000
+        self._chunks += 1
+
+    def usage(self, message) -> None:
+        """记录响应中的token用量"""
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            self.record["tokens_in"] = usage.get("input_tokens", 0)
+            self.record["tokens_out"] = usage.get("output_tokens", 0)
+
+    def retry(self) -> None:
+        self.record["retries"] += 1
+
+    def set(self, **fields) -> None:
+        self.record.update(fields)
+
+    def discard(self) -> None:
+        """丢弃本次记录（如超过截止时间后被放弃的调用），退出时不写出"""
+        self._discarded = True
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if self._discarded:
+            return False
+        self.record["wall_ms"] = (time.perf_counter() - self._start) * 1000
+        if not self.record["tokens_out"]:
+            # 未返回用量信息时，流式分块数近似为输出token数
+            self.record["tokens_out"] = self._chunks
+        if exc_type is not None:
+            self.record["error"] = exc_type.__name__
+        self.tracer.emit(self.record)
+        return False
+
+
+class _NullSpan:
+    """未开启埋点时使用的空记录"""
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+    def prompt_built(self) -> None:
+        pass
+
+    def token(self) -> None:
+        pass
+
+    def usage(self, message) -> None:
+        pass
+
+    def retry(self) -> None:
+        pass
+
+    def set(self, **fields) -> None:
+        pass
+
+    def discard(self) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+@dataclass
+class CallTotals:
+    """同一类调用的累计值，汇总表中的平均值由此得出"""
+    count: int = 0
+    wall_ms: float = 0.0
+    ttft_ms: float = 0.0
+    ttft_count: int = 0
+    prompt_tokens: int = 0
+    prompt_count: int = 0
+    prefix_ratio: float = 0.0
+    prefix_count: int = 0
+    tokens_in: int = 0
+    tokens_out: int = 0
+    retries: int = 0
+
+    def add(self, record: dict) -> None:
+        self.count += 1
+        self.wall_ms += record["wall_ms"]
+        self.tokens_in += record["tokens_in"]
+        self.tokens_out += record["tokens_out"]
+        self.retries += record["retries"]
+        if "ttft_ms" in record:
+            self.ttft_ms += record["ttft_ms"]
+            self.ttft_count += 1
+        if "prompt_tokens" in record:
+            self.prompt_tokens += record["prompt_tokens"]
+            self.prompt_count += 1
+        if "prefix_ratio" in record:
+            self.prefix_ratio += record["prefix_ratio"]
+            self.prefix_count += 1
+
+
+class Tracer:
+    """埋点收集器：记录节点耗时与每位玩家每回合的调用明细"""
+    enabled = True
+
+    def __init__(self, path: str):
+        self.path = path
+        # 节点名 -> [次数, 总耗时ms]；调用类型 -> 累计值
+        self.nodes: dict[str, list[float]] = defaultdict(lambda: [0, 0.0])
+        self.calls: dict[str, CallTotals] = defaultdict(CallTotals)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+        atexit.register(self.flush)
+
+    def span(self, kind: str, **fields) -> Span:
+        return Span(self, kind, fields)
+
+    def emit(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            if record["type"] == "node":
+                totals = self.nodes[record["node"]]
+                totals[0] += 1
+                totals[1] += record["wall_ms"]
+            else:
+                self.calls[record["kind"]].add(record)
+
+    def wrap_node(self, name: str, node: Callable) -> Callable:
+        """包装图节点，记录节点耗时"""
+        @functools.wraps(node)
+        def wrapper(state, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return node(state, *args, **kwargs)
+            finally:
+                self.emit({
+                    "type": "node",
+                    "node": name,
+                    "round": state["current_round"],
+                    "wall_ms": (time.perf_counter() - start) * 1000,
+                })
+        return wrapper
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+    def print_summary(self) -> None:
+        """输出本局汇总表，并清空已汇总的累计值"""
+        self.flush()
+        with self._lock:
+            nodes, self.nodes = self.nodes, defaultdict(lambda: [0, 0.0])
+            calls, self.calls = self.calls, defaultdict(CallTotals)
+
+        print("=" * 60)
+        print("耗时统计")
+        print("=" * 60)
+        print(f"{'节点':<22}{'次数':>6}{'总耗时ms':>12}{'平均ms':>10}")
+        for name, (count, wall) in nodes.items():
+            print(f"{name:<22}{count:>6}{wall:>12.1f}{wall / count:>10.1f}")
+        print("-" * 60)
+        print(f"{'调用':<12}{'次数':>6}{'平均ms':>10}{'平均TTFT':>10}{'提示tok':>9}{'输入tok':>9}{'输出tok':>9}"
+              f"{'重试':>6}{'前缀占比':>8}")
+        for kind, totals in calls.items():
+            mean_ttft = f"{totals.ttft_ms / totals.ttft_count:.1f}" if totals.ttft_count else "-"
+            mean_ratio = f"{totals.prefix_ratio / totals.prefix_count:.0%}" if totals.prefix_count else "-"
+            # 编译器计算的平均每个提示词token数
+            mean_prompt = f"{totals.prompt_tokens / totals.prompt_count:.0f}" if totals.prompt_count else "-"
+            print(
+                f"{kind:<12}{totals.count:>6}{totals.wall_ms / totals.count:>10.1f}{mean_ttft:>10}{mean_prompt:>9}"
+                f"{totals.tokens_in:>9}{totals.tokens_out:>9}{totals.retries:>6}{mean_ratio:>8}"
+            )
+        print(f"追踪明细已写入：{self.path}")
+
+
+class NullTracer:
+    """未开启埋点时使用的空收集器"""
+    enabled = False
+
+    def span(self, kind: str, **fields) -> _NullSpan:
+        return _NULL_SPAN
+
+    def emit(self, record: dict) -> None:
+        pass
+
+    def wrap_node(self, name: str, node: Callable) -> Callable:
+        return node
+
+    def flush(self) -> None:
+        pass
+
+    def print_summary(self) -> None:
+        pass
+
+
+_tracer: Tracer | NullTracer | None = None
+
+
+def get_tracer() -> Tracer | NullTracer:
+    """获取当前埋点收集器，首次调用时按 GAME_TRACE 创建"""
+    global _tracer
+    if _tracer is None:
+        path = os.getenv("GAME_TRACE")
+        _tracer = Tracer(path) if path else NullTracer()
+    return _tracer
+
+
+def set_tracer(tracer: Tracer | NullTracer) -> None:
+    """替换当前埋点收集器（需在构建游戏图之前调用）"""
+    global _tracer
+    _tracer = tracer
+
+
+def worker_trace_path(path: str) -> str:
+    """工作进程的追踪分片文件：<路径>.<进程号>.part，模拟结束后由 merge_trace_files 合并"""
+    return f"{path}.{os.getpid()}.part"
+
+
+def merge_trace_files(path: str, parts: Iterable[str]) -> None:
+    """把各工作进程的追踪分片依次追加到 path，并删除分片文件"""
+    with open(path, "a", encoding="utf-8") as merged:
+        for part in sorted(set(parts)):
+            with open(part, encoding="utf-8") as source:
+                shutil.copyfileobj(source, merged)
+            os.remove(part)
@@ -0,0 +1,169 @@
+"""
+File: leaks.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+发言泄词检测：词语仓库中的所有词语编译为一个 Aho-Corasick 自动机（进程内只构建一次），
+流式发言逐块送入扫描器，出现发言者自己的词语时立即中止请求并重新生成
+
+- 扫描按字符推进自动机，每条发言的检测开销只与发言长度有关，与词表大小无关
+- 扫描器暂缓输出可能是词语开头的末尾几个字，确认不构成词语后再输出，泄露的词语不会出现在输出中
+"""
+import functools
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Iterable
+
+from .types import Player
+
+# 是否检测AI发言泄露自己的词语，以及检测到后最多重新生成的次数（用尽后按跳过发言处理）
+SPEECH_LEAK_CHECK = os.getenv("SPEECH_LEAK_CHECK", "1") == "1"
+SPEECH_LEAK_RETRIES = int(os.getenv("SPEECH_LEAK_RETRIES", "2"))
+
+
+# ==================== 统计 ====================
+@dataclass
+class LeakStats:
+    """发言泄词统计"""
+    leaks: int = 0  # 检测到泄词并中止的生成次数
+    regenerations: int = 0  # 重新生成的次数
+    fallbacks: int = 0  # 重新生成次数用尽后按跳过发言处理的次数
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+_stats = LeakStats()
+_stats_lock = threading.Lock()
+
+
+def get_leak_stats() -> LeakStats:
+    """获取当前进程的泄词统计"""
+    return _stats
+
+
+def reset_leak_stats() -> None:
+    global _stats
+    _stats = LeakStats()
+
+
+def count(field: str, n: int = 1) -> None:
+    """累加泄词统计计数（线程安全）"""
+    with _stats_lock:
+        setattr(_stats, field, getattr(_stats, field) + n)
+
+
+# ==================== 自动机 ====================
+class WordAutomaton:
+    """多模式匹配自动机：goto 为各状态的字符转移，fail 为失配时回退的状态，
+    output 为到达该状态时结尾的所有词语（已合并回退链上的词语），depth 为状态对应前缀的长度
+    """
+
+    def __init__(self, words: Iterable[str]):
+        self.goto: list[dict[str, int]] = [{}]
+        self.fail: list[int] = [0]
+        self.depth: list[int] = [0]
+        self.output: list[tuple[str, ...]] = [()]
+        self.words: frozenset[str] = frozenset(word for word in words if word)
+        for word in self.words:
+            state = 0
+            for char in word:
+                following = self.goto[state].get(char)
+                if following is None:
+                    following = self.goto[state][char] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.depth.append(self.depth[state] + 1)
+                    self.output.append(())
+                state = following
+            self.output[state] += (word,)
+
+        # 按层次（广度优先）计算失配回退，子状态继承回退状态的输出
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self.goto[state].items():
+                queue.append(following)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[following] = self.goto[fallback].get(char, 0)
+                self.output[following] += self.output[self.fail[following]]
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.words
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+
+class LeakScanner:
+    """单条发言的增量扫描器：逐块送入流式输出，返回可以安全输出的文本"""
+
+    def __init__(self, automaton: WordAutomaton, forbidden: frozenset[str]):
+        self.automaton = automaton
+        self.forbidden = forbidden
+        self.leak: str | None = None  # 检测到的禁用词
+        self.text = ""  # 已送入的全部文本
+        self._state = 0
+        self._released = 0  # 已输出的字数
+
+    def feed(self, text: str) -> str:
+        """送入一个分块；出现禁用词时记录到 leak 并返回空字符串，否则返回新确认可以输出的文本"""
+        goto, fail, output = self.automaton.goto, self.automaton.fail, self.automaton.output
+        state = self._state
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state] and not self.forbidden.isdisjoint(output[state]):
+                self.leak = next(word for word in output[state] if word in self.forbidden)
+                return ""
+        self._state = state
+        self.text += text
+        # 末尾 depth 个字可能是某个词语的开头，暂不输出
+        safe = len(self.text) - self.automaton.depth[state]
+        visible = self.text[self._released:safe]
+        self._released = max(self._released, safe)
+        return visible
+
+    def flush(self) -> str:
+        """发言结束，输出暂缓的文本"""
+        visible = self.text[self._released:]
+        self._released = len(self.text)
+        return visible
+
+
+@functools.cache
+def get_automaton() -> WordAutomaton:
+    """词语仓库（内置词语对或 WORD_PAIRS_PATH 加载的词语对）中所有词语的自动机，进程内只构建一次"""
+    from src.constants.word_store import get_word_store
+    store = get_word_store()
+    return WordAutomaton([*store.normal_words, *store.undercover_words])
+
+
+@functools.lru_cache(maxsize=256)
+def _automaton_for(words: frozenset[str]) -> WordAutomaton:
+    return WordAutomaton(words)
+
+
+def forbidden_words(player: Player) -> frozenset[str]:
+    """发言中禁止出现的词语：玩家自己的词语（白板没有词语，不检测）"""
+    return frozenset([player.word]) if player.word else frozenset()
+
+
+def scanner(forbidden: frozenset[str]) -> LeakScanner:
+    """创建扫描器；禁用词都在词语仓库中时共用仓库的自动机，否则单独构建（按词语缓存）"""
+    automaton = get_automaton()
+    if not forbidden <= automaton.words:
+        automaton = _automaton_for(forbidden)
+    return LeakScanner(automaton, forbidden)
+
+
+def retry_note(word: str, attempt: int) -> str:
+    """重新生成时附在发言提示词末尾的提醒"""
+    return (
+        f"\n---\n【注意】你上一次的发言直接说出了词语「{word}」，这是违规的。"
+        f"请换一种描述方式重新发言（第{attempt}次重新发言），发言中不能出现「{word}」"
+    )
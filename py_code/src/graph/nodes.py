@@ -4,6 +4,15 @@ Created Time: 2026-01-05
 Author: falcon (liuc47810@gmail.com)
 LangGraph 节点函数
 """
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from langchain_core.runnables import RunnableConfig
+
 from .types import (
     GameState,
     GameStatus,
@@ -12,7 +21,49 @@ from .types import (
     PlayerType,
     Player,
 )
-from src.agents.llm import llm
+from . import leaks, recording, suspicion, votes
+from .events import (
+    emit,
+    Elimination,
+    GameOver,
+    Revote,
+    RoundStarted,
+    SpeechDone,
+    SpeechRetracted,
+    SpeechStarted,
+    SpeechToken,
+    VoteCast,
+    VoteStarted,
+    VoteTallied,
+    VotingStarted,
+)
+from .human import ask_human, uses_interrupt
+from .instrumentation import get_tracer
+from src.agents.llm import abandoned, evict_cached, get_llm, warm_prefix
+
+# AI投票并发上限与单次投票超时时间（秒）
+VOTE_MAX_CONCURRENCY = int(os.getenv("VOTE_MAX_CONCURRENCY", "8"))
+VOTE_TIMEOUT = float(os.getenv("VOTE_TIMEOUT", "60"))
+# AI投票输出不合法或请求失败时的最大重试次数与退避基数（秒）
+VOTE_MAX_RETRIES = int(os.getenv("VOTE_MAX_RETRIES", "2"))
+VOTE_RETRY_BACKOFF = float(os.getenv("VOTE_RETRY_BACKOFF", "0.5"))
+# 最高票平票时的处理策略（revote / none / random）与每回合最多重投次数，重投后仍平票则无人淘汰
+VOTE_TIE_POLICY = votes.TiePolicy(os.getenv("VOTE_TIE_POLICY", "revote"))
+VOTE_MAX_REVOTES = int(os.getenv("VOTE_MAX_REVOTES", "1"))
+# 一局中允许无人淘汰的回合数上限，达到后无人淘汰的回合改为强制淘汰一人，保证对局在有限回合内结束
+VOTE_MAX_IDLE_ROUNDS = int(os.getenv("VOTE_MAX_IDLE_ROUNDS", "2"))
+# AI投票方式：llm（只由LLM投票）/ hint（本地可疑度排序注入投票提示词）/ local（按本地可疑度投票，不调用模型）
+VOTE_MODE = suspicion.VoteMode(os.getenv("VOTE_MODE", "llm"))
+# 胜方 -> 历史记录中的胜负描述
+_GAME_END_TEXT = {
+    PlayerRole.NORMAL: "普通玩家获胜",
+    PlayerRole.UNDERCOVER: "卧底玩家获胜",
+    PlayerRole.BLANK: "白板玩家获胜",
+}
+# AI发言请求失败且没有任何输出时使用的发言（与人类玩家跳过发言一致）
+SPEECH_FALLBACK = "水一波，过~"
+# 发言流水线：AI玩家发言时预热下一位AI玩家的提示词前缀
+SPEECH_PREFETCH = os.getenv("SPEECH_PREFETCH", "0") == "1"
 
 
 def start_round_node(state: GameState) -> GameState:
@@ -21,178 +72,514 @@ def start_round_node(state: GameState) -> GameState:
     state["game_status"] = GameStatus.ROUND_SPEECH
     state["round_speech"] = {}
     state["round_votes"] = {}
-    all_players = state["players"]
-    alive_players = [player for player in all_players if player.is_alive]
+    state["revote_candidates"] = []
+    state["revotes"] = 0
+    state["speech_turn"] = 0
+    alive_players = state["players"].alive_players()
     # 重置每个存活玩家的数据
     for player in alive_players:
         player.reset_round()
 
-    print("=" * 60)
-    print(f"第 {state['current_round']} 回合开始！")
-    print("=" * 60)
-    print(f"场上存活玩家有：{','.join(p.name for p in alive_players)}")
+    if state["current_round"] == 1:
+        # 开局时录制种子、词语对与身份（GAME_RECORD）
+        recording.get_recorder().game(state)
+    emit(RoundStarted(state["current_round"], [p.name for p in alive_players]))
 
     return state
 
 
-def collect_speech_node(state: GameState) -> GameState:
-    """收集场上玩家发言"""
-    manager = UnderCoverGameManager()
-    print("\n【玩家发言阶段】")
+# 预热请求使用的共享线程池
+_prefetcher = ThreadPoolExecutor(max_workers=2)
 
-    player_speeches: dict[int, str] = {}
-    for player in state["players"]:
-        if not player.is_alive:
-            continue
 
-        if player.player_type == PlayerType.HUMAN:
-            print(f"\n{player.name}，请用一句话描述你的词语（不能说出词语本身）：")
-            human_speech = input("> ").strip()
-            if not human_speech:
-                human_speech = "水一波，过~"
-            player_speeches[player.id] = human_speech
-            print(f"玩家【{player.id}】{player.name}】发言：{human_speech}")
-        else:
-            # AI生成玩家描述
-            # 已发言玩家
-            other_speeches = "\n".join([f"玩家{player_id}】发言：{speech}" for player_id, speech in player_speeches.items()])
-            prompt = manager.get_player_speech_prompt(player, other_speeches, state["current_round"])
-            # response = llm.invoke(prompt)
-            speech: str = ""
-            print(f"玩家({player.id}){player.name}】发言：")
-            for chunk in llm.stream(prompt):
-                speech += chunk.text
-                print(chunk.text, end="", flush=True)
-            print()  # 结束换行
-            player_speeches[player.id] = speech
+def _prefetch_next_speaker(
+        manager: UnderCoverGameManager,
+        next_player: Player,
+        game_round: int,
+        history: str,
+        sent_prefixes: set[str],
+) -> None:
+    """预热下一位AI玩家的提示词前缀，本回合已发出过的前缀不再重复预热"""
+    if next_player.player_type != PlayerType.AI:
+        return
+    prefix = manager.get_player_speech_prefix(next_player, game_round, history)
+    if prefix in sent_prefixes:
+        return
+    _prefetcher.submit(contextvars.copy_context().run, warm_prefix, prefix)
+
+
+def _stream_speech(
+        prompt: str,
+        player: Player,
+        span,
+        scanner: leaks.LeakScanner | None,
+) -> tuple[list[str], Exception | None]:
+    """流式生成一次发言，返回输出分块与请求异常
+
+    传入扫描器时逐块检测泄词：只输出确认不构成词语的部分，出现词语时立即关闭流、中止请求
+    """
+    chunks: list[str] = []
+    error = None
+    stream = get_llm().stream(prompt)
+    try:
+        for chunk in stream:
+            span.token()
+            span.usage(chunk)
+            chunks.append(chunk.text)
+            visible = scanner.feed(chunk.text) if scanner else chunk.text
+            if scanner and scanner.leak:
+                break
+            if visible:
+                emit(SpeechToken(player.id, visible))
+    except Exception as e:
+        # 重试耗尽、超时或熔断时保留已生成的部分
+        span.set(error=type(e).__name__)
+        error = e
+    finally:
+        stream.close()
+    if scanner and not scanner.leak:
+        rest = scanner.flush()
+        if rest:
+            emit(SpeechToken(player.id, rest))
+    return chunks, error
+
+
+def collect_speech_node(state: GameState, config: RunnableConfig) -> GameState:
+    """收集场上玩家发言
+
+    每次执行只处理一位玩家（state["speech_turn"]），由条件边循环直到所有存活玩家发言完毕，
+    这样每位玩家发言后都会保存检查点，人类玩家挂起等待输入时也不会重复生成已有的AI发言
+    """
+    manager = UnderCoverGameManager()
+    turn = state["speech_turn"]
+    tracer = get_tracer()
+    game_round = state["current_round"]
+    speakers: list[Player] = state["players"].alive_players()
+    player = speakers[turn]
+    player_speeches: dict[int, str] = state["round_speech"]
+    history = state["game_history"].prompt_context()
+
+    human = player.player_type == PlayerType.HUMAN
+    started = SpeechStarted(game_round, turn, player.id, player.name, human)
+    if human:
+        # interrupt 模式下节点恢复时从头重新执行，开始事件在拿到输入后才发出（输入提示已随 interrupt 发给客户端）；
+        # 控制台模式照常先输出提示再读取输入
+        deferred = uses_interrupt(config)
+        if not deferred:
+            emit(started)
+        with tracer.span("human_speech", round=game_round, player_id=player.id):
+            human_speech = ask_human(
+                config, "speech", "> ", player_id=player.id, round=game_round, revote=0
+            ).strip()
+        if deferred:
+            emit(started)
+        recording.get_recorder().human(state, "speech", player.id, human_speech)
+        if not human_speech:
+            human_speech = SPEECH_FALLBACK
+        player_speeches[player.id] = human_speech
+    else:
+        emit(started)
+        # 只在AI玩家发言时预热：人类玩家发言前的预热在 interrupt 恢复、节点重新执行时会重复提交
+        if SPEECH_PREFETCH and turn + 1 < len(speakers):
+            # 本回合已发出过的提示词前缀：此前各位AI玩家的正式请求及预热请求
+            sent_prefixes = {
+                manager.get_player_speech_prefix(speaker, game_round, history)
+                for speaker in speakers[:turn + 1]
+                if speaker.player_type == PlayerType.AI
+            }
+            _prefetch_next_speaker(manager, speakers[turn + 1], game_round, history, sent_prefixes)
+        forbidden = leaks.forbidden_words(player) if leaks.SPEECH_LEAK_CHECK else frozenset()
+        with (
+            tracer.span("speech", round=game_round, player_id=player.id) as span,
+            recording.site("speech", game_round, 0, player.id),
+        ):
+            note = ""
+            for attempt in range(1, leaks.SPEECH_LEAK_RETRIES + 2):
+                # AI生成玩家描述，提示词中包含已发言玩家的发言；泄词后重新生成时附上提醒
+                prompt = manager.compile_speech_prompt(player, player_speeches, game_round, history, note)
+                if attempt == 1:
+                    span.prompt_built()
+                    # 记录提示词token数与可复用前缀的占比
+                    span.set(
+                        prompt_tokens=prompt.tokens,
+                        prefix_tokens=prompt.prefix_tokens,
+                        prefix_ratio=prompt.prefix_ratio,
+                        truncated=prompt.truncated,
+                    )
+                scanner = leaks.scanner(forbidden) if forbidden else None
+                chunks, error = _stream_speech(prompt.text, player, span, scanner)
+                recording.get_recorder().llm(recording.game_id(state), prompt.text, chunks, error)
+                if scanner is None or scanner.leak is None:
+                    break
+                leaks.count("leaks")
+                regenerate = attempt <= leaks.SPEECH_LEAK_RETRIES
+                span.set(leaks=attempt)
+                emit(SpeechRetracted(game_round, player.id, player.name, attempt, regenerate))
+                if not regenerate:
+                    # 重新生成次数用尽，按跳过发言处理
+                    leaks.count("fallbacks")
+                    chunks = []
+                    break
+                leaks.count("regenerations")
+                note = leaks.retry_note(scanner.leak, attempt)
+            # 没有任何输出则按跳过发言处理，不中断对局
+            speech = "".join(chunks)
+            if not speech:
+                speech = SPEECH_FALLBACK
+                emit(SpeechToken(player.id, speech))
+        player_speeches[player.id] = speech
+    emit(SpeechDone(game_round, player.id, player.name, player_speeches[player.id], human))
     state["round_speech"] = player_speeches
+    state["speech_turn"] = turn + 1
     return state
 
 
-def collect_vote_node(state: GameState) -> GameState:
+def _ai_vote(
+        manager: UnderCoverGameManager,
+        player: Player,
+        round_speech: dict[int, str],
+        ballot: list[int],
+        game_round: int,
+        revote: int,
+        history: str,
+        game_id: str,
+        collector: votes.VoteCollector,
+        hint: str = "",
+) -> int | None:
+    """AI玩家投票（在线程池中执行），结果登记到 collector
+
+    输出无法解析、编号不合法或请求异常时按指数退避重试，重试耗尽后确定性兜底。
+    collector 截止后不再请求模型，迟到的结果直接丢弃（不计数、不录制、不写埋点与缓存），返回 None
+
+    :param ballot: 本次投票的候选人（平票重投时只有平票玩家）
+    :param revote: 本回合已进行的重投次数
+    :param game_id: 录制日志中的对局编号
+    :param collector: 本次投票的结果收集器
+    :param hint: 附在投票提示词中的本地可疑度提示
+    """
+    candidates = {player_id for player_id in ballot if player_id != player.id}
+    recorder = recording.get_recorder()
+    # 截止后各LLM包装层不再重试、不写缓存（本函数在复制的上下文中执行，设置不影响其他投票）
+    abandoned.set(collector.closed)
+    with (
+        get_tracer().span("vote", round=game_round, player_id=player.id) as span,
+        recording.site("vote", game_round, revote, player.id),
+    ):
+        prompt = manager.compile_vote_prompt(player, round_speech, ballot, history, hint)
+        span.prompt_built()
+        span.set(
+            prompt_tokens=prompt.tokens,
+            prefix_tokens=prompt.prefix_tokens,
+            prefix_ratio=prompt.prefix_ratio,
+            truncated=prompt.truncated,
+        )
+        for attempt in range(VOTE_MAX_RETRIES + 1):
+            # 退避等待在截止时提前结束；回放时输出取自录制日志，不等待
+            if attempt and recording.get_replay_session() is None:
+                collector.closed.wait(VOTE_RETRY_BACKOFF * 2 ** (attempt - 1))
+            if collector.closed.is_set():
+                span.discard()
+                return None
+            if attempt:
+                span.retry()
+                votes.count("retries")
+            votes.count("requests")
+            response, error = None, None
+            try:
+                response = get_llm().invoke(prompt.text)
+            except Exception as e:
+                error = e
+            with collector.commit() as accepted:
+                if not accepted:
+                    span.discard()
+                    return None
+                if error is not None:
+                    votes.count("errors")
+                    recorder.llm(game_id, prompt.text, [], error)
+                    continue
+                recorder.llm(game_id, prompt.text, [str(response.content)])
+                span.usage(response)
+                vote_for_id = votes.parse_vote(str(response.content), candidates)
+                if vote_for_id is not None:
+                    collector.votes[player.id] = vote_for_id
+                    return vote_for_id
+                votes.count("invalid")
+                # 无效回答不留在缓存中，否则重试会回放同一个回答
+                evict_cached(prompt.text)
+        with collector.commit() as accepted:
+            if not accepted:
+                span.discard()
+                return None
+            votes.count("fallbacks")
+            vote_for_id = collector.votes[player.id] = votes.fallback_vote(player.id, candidates, game_round)
+    return vote_for_id
+
+
+def _collect_human_votes(
+        state: GameState,
+        voters: list[Player],
+        ballot: list[int],
+        config: RunnableConfig,
+) -> dict[int, int | None]:
+    """收集人类玩家投票，编号无效时重新输入，直接回车表示弃权
+
+    interrupt 模式下不发出投票开始事件，由调用方在收齐投票后补发（节点恢复重新执行时不会重复）
+    """
+    deferred = uses_interrupt(config)
+    human_votes: dict[int, int | None] = {}
+    for player in voters:
+        if player.player_type != PlayerType.HUMAN:
+            continue
+        candidates = [player_id for player_id in ballot if player_id != player.id]
+        if not deferred:
+            emit(VoteStarted(player.id, player.name, True, candidates))
+        with get_tracer().span("human_vote", round=state["current_round"], player_id=player.id):
+            prompt = "请输入玩家编号（直接回车弃权） > "
+            while True:
+                answer = ask_human(
+                    config, "vote", prompt, player_id=player.id, candidates=candidates,
+                    round=state["current_round"], revote=state["revotes"],
+                )
+                if not answer.strip():
+                    vote_for_id = None
+                    break
+                vote_for_id = votes.parse_vote(answer, set(candidates))
+                if vote_for_id is not None:
+                    break
+                prompt = "编号无效，请重新输入玩家编号（直接回车弃权） > "
+        recording.get_recorder().human(state, "vote", player.id, "" if vote_for_id is None else str(vote_for_id))
+        human_votes[player.id] = vote_for_id
+    return human_votes
+
+
+class _AIVoteBatch:
+    """一次投票中并发请求模型的AI投票：共用一个结果收集器和一个截止时间（提交后 VOTE_TIMEOUT 秒）"""
+
+    def __init__(self, max_workers: int):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.collector = votes.VoteCollector()
+        self.futures: dict[int, Future[int]] = {}
+        self.deadline = time.monotonic() + VOTE_TIMEOUT
+
+    def result(self) -> dict[int, int]:
+        """等待到截止时间，返回截止前登记的投票，截止后迟到的结果一律丢弃"""
+        wait(self.futures.values(), timeout=max(0.0, self.deadline - time.monotonic()))
+        ai_votes = self.collector.close()
+        for future in self.futures.values():
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+        return ai_votes
+
+    def close(self) -> None:
+        self.collector.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# interrupt 模式下已提交、等待人类投票期间进行中的AI投票 {(thread_id, 种子, 回合, 重投次数): 投票批次}
+_pending_ai_votes: dict[tuple, _AIVoteBatch] = {}
+_pending_lock = threading.Lock()
+# 未取回的批次上限（对局在等待输入时被放弃则批次不会被取回），超出时关闭最早的批次
+_PENDING_AI_VOTES_MAX = 256
+
+
+def _keep_pending(key: tuple, batch: _AIVoteBatch) -> None:
+    with _pending_lock:
+        _pending_ai_votes[key] = batch
+        while len(_pending_ai_votes) > _PENDING_AI_VOTES_MAX:
+            _pending_ai_votes.pop(next(iter(_pending_ai_votes))).close()
+
+
+def _submit_ai_votes(
+        state: GameState,
+        manager: UnderCoverGameManager,
+        ai_voters: list[Player],
+        ballot: list[int],
+        history: str,
+        scores: dict,
+) -> _AIVoteBatch:
+    """AI玩家的投票只依赖本回合已结束的发言，统一并发提交"""
+    batch = _AIVoteBatch(max(1, min(VOTE_MAX_CONCURRENCY, len(ai_voters))))
+    for player in ai_voters:
+        candidates = {pid for pid in ballot if pid != player.id}
+        hint = suspicion.format_hint(scores, candidates) if scores else ""
+        # 复制上下文，使线程内的LLM调用仍能识别所属对局
+        batch.futures[player.id] = batch.executor.submit(
+            contextvars.copy_context().run,
+            _ai_vote, manager, player, state["round_speech"], ballot,
+            state["current_round"], state["revotes"], history, recording.game_id(state), batch.collector, hint,
+        )
+    return batch
+
+
+def collect_vote_node(state: GameState, config: RunnableConfig) -> GameState:
     """玩家投票节点"""
     state["game_status"] = GameStatus.ROUND_VOTING
-    all_players = state["players"]
     manager = UnderCoverGameManager()
-    print("\n【玩家投票阶段】\n")
     # 玩家投票收集器
-    player_votes: dict[int, int] = {}
-    # 场上存活玩家id
-    alive_players: list[int] = [player.id for player in all_players if player.is_alive]
+    player_votes: dict[int, int | None] = {}
+    # 场上存活玩家（座位顺序）
+    voters: list[Player] = state["players"].alive_players()
+    # 候选人：平票重投时只有平票玩家
+    ballot: list[int] = state["revote_candidates"] or [player.id for player in voters]
+    revote = bool(state["revote_candidates"])
+    ai_voters: list[Player] = [player for player in voters if player.player_type == PlayerType.AI]
+    history = state["game_history"].prompt_context()
+    # 本回合所有发言的可疑度一次算出，各AI玩家共用
+    scores = suspicion.score_speeches(state["round_speech"]) if VOTE_MODE != suspicion.VoteMode.LLM else {}
+    local = VOTE_MODE == suspicion.VoteMode.LOCAL
 
-    # 投票
-    for player in all_players:
-        if player.id not in alive_players:
-            continue
-        print(f"玩家【{player.name}】投票中")
-        # 人类玩家投票
-        if player.player_type == PlayerType.HUMAN:
-            print(f"玩家【{player.name}】您想投票给谁？目前场上仍存活的玩家有：\n")
-            for player_id in alive_players:
-                print(f"玩家【{player_id}】")
-            vote_for_id = int(input("请输入玩家编号 > "))
-        else:
-            # AI玩家投票
-            prompt = manager.get_player_vote_prompt(
-                player, state["round_speech"], alive_players
-            )
-            response = llm.invoke(prompt)
-            vote_for_id = int(str(response.content))
-            # print(f"{player.name} 的投票结果是 {vote_for_id}")
-        player_votes[player.id] = vote_for_id
+    model_voters = [] if local else ai_voters
+    if uses_interrupt(config):
+        # 挂起式输入恢复时节点会从头重新执行：AI投票在首次执行、请求人类输入之前提交，与人类作答同时进行，
+        # 恢复时取回同一批投票，不重复提交，投票事件在收齐人类投票后才发出
+        key = (config["configurable"].get("thread_id"), state["seed"], state["current_round"], state["revotes"])
+        with _pending_lock:
+            batch = _pending_ai_votes.get(key)
+        if batch is None:
+            batch = _submit_ai_votes(state, manager, model_voters, ballot, history, scores)
+            _keep_pending(key, batch)
+        human_votes = _collect_human_votes(state, voters, ballot, config)
+        with _pending_lock:
+            _pending_ai_votes.pop(key, None)
+        emit(VotingStarted(state["current_round"], [state["players"].get(pid).name for pid in ballot], revote))
+        for player in voters:
+            if player.player_type == PlayerType.HUMAN:
+                emit(VoteStarted(player.id, player.name, True, [pid for pid in ballot if pid != player.id]))
+        for player in ai_voters:
+            emit(VoteStarted(player.id, player.name, False, [pid for pid in ballot if pid != player.id]))
+    else:
+        emit(VotingStarted(state["current_round"], [state["players"].get(pid).name for pid in ballot], revote))
+        for player in ai_voters:
+            emit(VoteStarted(player.id, player.name, False, [pid for pid in ballot if pid != player.id]))
+        batch = _submit_ai_votes(state, manager, model_voters, ballot, history, scores)
+        # AI投票进行的同时收集人类玩家投票
+        try:
+            human_votes = _collect_human_votes(state, voters, ballot, config)
+        except BaseException:
+            batch.close()
+            raise
+
+    try:
+        ai_votes = batch.result()
+        # 按玩家座位顺序合并投票结果，保证后续计票与展示顺序确定；本地投票不调用模型，直接得出
+        for player in voters:
+            if player.player_type == PlayerType.HUMAN:
+                player_votes[player.id] = human_votes[player.id]
+                continue
+            candidates = {player_id for player_id in ballot if player_id != player.id}
+            if local:
+                votes.count("local")
+                player_votes[player.id] = suspicion.local_vote(scores, candidates)
+                continue
+            if player.id not in ai_votes:
+                # 投票超时按兜底规则投票，不中断对局
+                votes.count("errors")
+                votes.count("fallbacks")
+                ai_votes[player.id] = votes.fallback_vote(player.id, candidates, state["current_round"])
+            player_votes[player.id] = ai_votes[player.id]
+    finally:
+        batch.close()
 
+    for voter_id, target_id in player_votes.items():
+        emit(VoteCast(state["current_round"], voter_id, target_id))
     # 更新状态
     state["round_votes"] = player_votes
     return state
 
 def process_elimination_node(state: GameState) -> GameState:
-    """处理淘汰结果"""
-    all_players = state["players"]
-    votes = state["round_votes"]
-    print("\n【本回合投票结果】\n")
-
-    for player_id, vote_for_id in votes.items():
-        player = next(player for player in all_players if player.id == player_id)
-        vote_for_player = next(player for player in all_players if player.id == vote_for_id)
-        print(f"玩家({player_id})【{player.name}】的投票结果是【{vote_for_player.name}】")
-
-    # 统计票数 {user_id: vote_count}
-    vote_count: dict[int, int] = {}
-    for vote_for_id in votes.values():
-        vote_count[vote_for_id] = vote_count.get(vote_for_id, 0) + 1
-
-    print("\n正在归票...\n")
-    # 展示投票结果
-    # TODO 考虑平票的case
-    for player_id, count in vote_count.items():
-        name = next(player.name for player in all_players if player.id == player_id)
-        print(f"玩家({player_id})【{name}】】获得{count}票")
-
-    # 找出得票最高的玩家
-    eliminated_id = max(vote_count, key=vote_count.get)
-    eliminated_player = next(player for player in all_players if player.id == eliminated_id)
-
-    # 淘汰玩家
-    eliminated_player.is_alive = False
-    state["eliminated_players"].append(eliminated_id)
-
-    # 显示被淘汰玩家的信息
-    role_display = "【卧底】💣" if eliminated_player.player_role == PlayerRole.UNDERCOVER else "【普通玩家】"
-    print(f"被淘汰的玩家是【{eliminated_player.name}】，其身份是{role_display}，词语是【{eliminated_player.word}】")
+    """处理淘汰结果：计票，平票时按 VOTE_TIE_POLICY 重投、无人淘汰或随机淘汰
+
+    无人淘汰的回合数达到 VOTE_MAX_IDLE_ROUNDS 后，本应无人淘汰的回合按对局种子强制淘汰一人
+    """
+    registry = state["players"]
+    round_votes = state["round_votes"]
+    game_round = state["current_round"]
+    ballot = state["revote_candidates"] or list(registry.alive_ids)
+    # 随机平票策略的随机源由对局种子、回合与重投次数派生，同一局可复现
+    rng = None
+    if VOTE_TIE_POLICY == votes.TiePolicy.RANDOM:
+        rng = random.Random(f"{state['seed']}:{state['current_round']}:{state['revotes']}")
+    result = votes.tally(
+        round_votes, ballot, VOTE_TIE_POLICY, rng, allow_revote=state["revotes"] < VOTE_MAX_REVOTES
+    )
+    # 此前无人淘汰的回合数（每回合至多淘汰一人）
+    idle_rounds = game_round - 1 - len(state["eliminated_players"])
+    if result.eliminated is None and not result.revote and idle_rounds >= VOTE_MAX_IDLE_ROUNDS:
+        result = votes.force_elimination(result, ballot, random.Random(f"{state['seed']}:{game_round}:forced"))
+    state["vote_result"] = result
+    # 公布投票与计票结果
+    emit(VoteTallied(
+        game_round,
+        [
+            (voter_id, registry.get(voter_id).name, None if target_id is None else registry.get(target_id).name)
+            for voter_id, target_id in round_votes.items()
+        ],
+        [(player_id, registry.get(player_id).name, count) for player_id, count in result.counts.items()],
+        [registry.get(player_id).name for player_id in result.invalid],
+    ))
+
+    tied_names = [registry.get(player_id).name for player_id in result.tied]
+    if result.revote:
+        # 只在平票玩家中重投，由条件边回到投票节点
+        emit(Revote(game_round, tied_names))
+        state["revote_candidates"] = result.tied
+        state["revotes"] += 1
+        return state
+    state["revote_candidates"] = []
+
+    eliminated_player = None
+    if result.eliminated is not None:
+        # 淘汰玩家
+        eliminated_player = registry.eliminate(result.eliminated)
+        state["eliminated_players"].append(result.eliminated)
+    emit(Elimination(
+        game_round,
+        result.eliminated,
+        eliminated_player.name if eliminated_player else None,
+        eliminated_player.player_role.value if eliminated_player else None,
+        eliminated_player.word if eliminated_player else None,
+        tied_names,
+    ))
 
     # 记录到历史
-    state["game_history"].append({
+    state["game_history"].record_round({
         "round": state["current_round"],
-        "eliminated_id": eliminated_id,
-        "eliminated_name": eliminated_player.name,
-        "eliminated_role": eliminated_player.player_role.value,
-        "votes": state["round_votes"].copy(),
+        "eliminated_id": result.eliminated,
+        "eliminated_name": eliminated_player.name if eliminated_player else None,
+        "eliminated_role": eliminated_player.player_role.value if eliminated_player else None,
+        "votes": round_votes.copy(),
         "speeches": state["round_speech"].copy(),
     })
     return state
 
 
 def check_game_end_node(state: GameState):
-    """检查游戏是否结束"""
-    # 卧底淘汰，平民获胜
-    # 卧底和平民数量一致，卧底获胜
-    # 否则，游戏继续
-    alive_players: list[Player] = [p for p in state["players"] if p.is_alive]
-    alive_undercover: list[Player] = [p for p in alive_players if p.player_role == PlayerRole.UNDERCOVER]
-
-    # 判定游戏结束条件
-    # 1. 卧底淘汰，平民获胜
-    if len(alive_undercover) == 0:
-        print("\n🎉 游戏结束！普通玩家获胜！卧底已被淘汰。")
-        state["game_history"].append({
-            "game_end": "普通玩家获胜",
-            "rounds": state["current_round"],
-        })
-    elif len(alive_players) <= 2:
-        # 场上还有2个，且卧底存活，卧底胜利
-        print("\n🎉 游戏结束！卧底获胜！")
-        state["game_history"].append({
-            "game_end": "卧底玩家获胜",
-            "rounds": state["current_round"],
-        })
-    else:
+    """检查游戏是否结束：由存活角色计数判定胜负（PlayerRegistry.winner）"""
+    winner = state["players"].winner()
+    if winner is None:
         # 游戏继续
         state["current_round"] += 1
         state["game_status"] = GameStatus.ROUND_RESULT
         return state
 
+    state["game_history"].append({
+        "game_end": _GAME_END_TEXT[winner],
+        "winner": winner.value,
+        "rounds": state["current_round"],
+    })
     return state
 
 
 def game_end_node(state: GameState) -> GameState:
     """游戏结束节点"""
-    print("=" * 60)
-    print("游戏结束！")
-    print("=" * 60)
-
-    for player in state["players"]:
-        # 角色翻译
-        role_display = "【卧底】💣" if player.player_role == PlayerRole.UNDERCOVER else "【平民】"
-        print(f"玩家【{player.id}】{player.name}】的身份是{role_display}，词语是【{player.word}】")
+    emit(GameOver(
+        state["game_history"][-1]["winner"],
+        state["current_round"],
+        [
+            {"id": p.id, "name": p.name, "role": p.player_role.value, "word": p.word, "is_alive": p.is_alive}
+            for p in state["players"]
+        ],
+    ))
+    recording.get_recorder().end(state)
     state["game_status"] = GameStatus.GAME_END
     return state
\ No newline at end of file
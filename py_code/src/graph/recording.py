@@ -0,0 +1,301 @@
+"""
+File: recording.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+对局录制与回放：把开局信息、每次LLM调用的输出与人类玩家的决定写入只追加的日志，回放时不调用模型，按日志重新执行游戏图
+
+设置环境变量 GAME_RECORD=<文件路径> 开启录制（路径可含 {pid}，多进程时各写一个文件）。日志为JSONL，每行一条记录：
+- {"t": "g", "g": 对局, "seed": 种子, "pair": [平民词, 卧底词], "players": [[id, 名称, 类型, 身份, 词语], ...]}
+- {"t": "l", "g": 对局, "s": 调用位置, "h": 提示词摘要, "c": [输出分块, ...], "e": 错误类型（可选）}
+- {"t": "h", "g": 对局, "s": 调用位置, "v": 人类玩家的输入}
+- {"t": "e", "g": 对局, "w": 胜方, "r": 回合数}
+调用位置为 [类型, 回合, 重投次数, 玩家id]。回放按调用位置取输出（同一位置多次调用按顺序），
+规则改变导致历史不同时仍可继续回放，提示词摘要不一致的次数记为偏离；日志中没有的调用按请求失败处理。
+"""
+import contextlib
+import hashlib
+import json
+import os
+import threading
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from .events import current_game
+from .types import GameState, Player, PlayerRole, PlayerType, UnderCoverGameManager
+
+# 录制日志路径（留空则不录制）
+GAME_RECORD = os.getenv("GAME_RECORD", "")
+
+# 当前LLM调用所在的位置（类型, 回合, 重投次数, 玩家id），由节点在调用前设置，回放时据此查找录制的输出
+call_site: ContextVar[tuple | None] = ContextVar("call_site", default=None)
+
+
+@contextlib.contextmanager
+def site(kind: str, game_round: int, revote: int, player_id: int):
+    """在上下文中标记LLM调用位置"""
+    token = call_site.set((kind, game_round, revote, player_id))
+    try:
+        yield
+    finally:
+        call_site.reset(token)
+
+
+def prompt_digest(prompt: str) -> str:
+    return hashlib.blake2b(prompt.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def game_id(state: GameState) -> str:
+    """录制日志中的对局编号：当前对局标识，未设置时使用种子"""
+    return current_game.get() or str(state["seed"])
+
+
+# ==================== 录制 ====================
+class Recorder:
+    """对局录制器：记录按行追加写入日志，每局结束时刷新到磁盘"""
+    enabled = True
+
+    def __init__(self, path: str):
+        self.path = path.format(pid=os.getpid())
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _write(self, record: dict, flush: bool = False) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            if flush:
+                self._file.flush()
+
+    def game(self, state: GameState) -> None:
+        """记录开局信息：种子、词语对与每位玩家的身份"""
+        players = list(state["players"])
+        words = {p.player_role: p.word for p in players}
+        self._write({
+            "t": "g",
+            "g": game_id(state),
+            "seed": state["seed"],
+            "pair": [words.get(PlayerRole.NORMAL, ""), words.get(PlayerRole.UNDERCOVER, "")],
+            "players": [[p.id, p.name, p.player_type.value, p.player_role.value, p.word] for p in players],
+        })
+
+    def llm(self, game: str, prompt: str, chunks: list[str], error: Exception | None = None) -> None:
+        """记录当前调用位置（call_site）上一次LLM调用的输出分块，调用失败时记录错误类型"""
+        record = {"t": "l", "g": game, "s": call_site.get(), "h": prompt_digest(prompt), "c": chunks}
+        if error is not None:
+            record["e"] = type(error).__name__
+        self._write(record)
+
+    def human(self, state: GameState, kind: str, player_id: int, value: str) -> None:
+        """记录人类玩家的决定（发言内容，或投票的玩家编号，弃权为空字符串）"""
+        record_site = (kind, state["current_round"], state["revotes"], player_id)
+        self._write({"t": "h", "g": game_id(state), "s": record_site, "v": value})
+
+    def end(self, state: GameState) -> None:
+        result = state["game_history"][-1]
+        self._write({"t": "e", "g": game_id(state), "w": result["winner"], "r": state["current_round"]}, flush=True)
+
+
+class NullRecorder:
+    """未开启录制时使用的空录制器"""
+    enabled = False
+
+    def game(self, state: GameState) -> None:
+        pass
+
+    def llm(self, game: str, prompt: str, chunks: list[str], error: Exception | None = None) -> None:
+        pass
+
+    def human(self, state: GameState, kind: str, player_id: int, value: str) -> None:
+        pass
+
+    def end(self, state: GameState) -> None:
+        pass
+
+
+_recorder: Recorder | NullRecorder | None = None
+
+
+def get_recorder() -> Recorder | NullRecorder:
+    """获取当前录制器，首次调用时按 GAME_RECORD 创建"""
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder(GAME_RECORD) if GAME_RECORD else NullRecorder()
+    return _recorder
+
+
+def set_recorder(recorder: Recorder | NullRecorder) -> None:
+    global _recorder
+    _recorder = recorder
+
+
+# ==================== 回放 ====================
+@dataclass
+class RecordedGame:
+    """日志中的一局"""
+    game_id: str
+    seed: int
+    pair: tuple[str, str]
+    players: list[list]
+    # 调用位置 -> [(提示词摘要, 输出分块, 错误类型), ...]
+    calls: dict[tuple, list[tuple[str, list[str], str | None]]] = field(default_factory=dict)
+    # 调用位置 -> 人类玩家的决定
+    human: dict[tuple, str] = field(default_factory=dict)
+    winner: str | None = None
+    rounds: int | None = None
+
+    def initial_state(self) -> GameState:
+        players = [
+            Player(id=pid, name=name, player_type=PlayerType(type_), player_role=PlayerRole(role), word=word)
+            for pid, name, type_, role, word in self.players
+        ]
+        return UnderCoverGameManager.new_game_state(players, self.seed)
+
+
+def load_games(path: str) -> dict[str, RecordedGame]:
+    """读取录制日志；同一对局编号出现多次开局记录时以最后一次为准，未结束的对局保留已录制的部分"""
+    games: dict[str, RecordedGame] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            kind, game_id = record["t"], record["g"]
+            if kind == "g":
+                games[game_id] = RecordedGame(game_id, record["seed"], tuple(record["pair"]), record["players"])
+                continue
+            game = games.get(game_id)
+            if game is None:
+                continue
+            if kind == "l":
+                game.calls.setdefault(tuple(record["s"]), []).append((record["h"], record["c"], record.get("e")))
+            elif kind == "h":
+                # 挂起式输入恢复时节点会重新执行，同一位置可能记录多次，取最后一次
+                game.human[tuple(record["s"])] = record["v"]
+            elif kind == "e":
+                game.winner, game.rounds = record["w"], record["r"]
+    return games
+
+
+class ReplayError(RuntimeError):
+    """回放时重现录制中的调用失败，或日志中没有该次调用"""
+
+
+@dataclass
+class ReplayStats:
+    """一局回放的统计"""
+    calls: int = 0  # 回放的LLM调用数
+    misses: int = 0  # 日志中没有的调用
+    diverged: int = 0  # 提示词与录制时不一致的调用
+
+
+class ReplaySession:
+    """回放会话：代替LLM客户端按调用位置返回录制的输出，并提供人类玩家的决定；按 current_game 区分对局"""
+
+    def __init__(self, games: dict[str, RecordedGame]):
+        self.games = games
+        self.stats: dict[str, ReplayStats] = {game_id: ReplayStats() for game_id in games}
+        self._cursors: dict[tuple, int] = {}
+        self._answered: set[tuple] = set()
+        self._lock = threading.Lock()
+
+    def _next(self, prompt) -> tuple[list[str], str | None]:
+        game_id = current_game.get()
+        call = call_site.get()
+        if call is None:
+            # 不在录制位置上的调用（如预热前缀）不回放
+            raise ReplayError("回放时忽略录制位置以外的调用")
+        stats = self.stats[game_id]
+        with self._lock:
+            stats.calls += 1
+            index = self._cursors.get((game_id, call), 0)
+            self._cursors[(game_id, call)] = index + 1
+            recorded = self.games[game_id].calls.get(call, [])
+            if index >= len(recorded):
+                stats.misses += 1
+                raise ReplayError(f"日志中没有该次调用：{call}")
+            digest, chunks, error = recorded[index]
+            stats.diverged += digest != prompt_digest(str(prompt))
+        return chunks, error
+
+    def invoke(self, prompt, **kwargs):
+        chunks, error = self._next(prompt)
+        if error is not None:
+            raise ReplayError(f"录制时调用失败：{error}")
+        return AIMessage(content="".join(chunks))
+
+    def stream(self, prompt, **kwargs):
+        # 录制时流式输出中途失败的，先回放已输出的分块再抛出
+        chunks, error = self._next(prompt)
+        for text in chunks:
+            yield AIMessageChunk(content=text)
+        if error is not None:
+            raise ReplayError(f"录制时调用失败：{error}")
+
+    def human_input(self, kind: str, payload: dict) -> str:
+        """人类玩家的录制决定；同一位置再次询问（如规则改变后原投票无效）时返回空输入"""
+        game_id = current_game.get()
+        key = (game_id, kind, payload["round"], payload["revote"], payload["player_id"])
+        with self._lock:
+            if key in self._answered:
+                return ""
+            self._answered.add(key)
+        return self.games[game_id].human.get(key[1:], "")
+
+
+_session: ReplaySession | None = None
+
+
+def get_replay_session() -> ReplaySession | None:
+    return _session
+
+
+@dataclass
+class ReplayResult:
+    game_id: str
+    winner: str
+    rounds: int
+    recorded_winner: str | None
+    recorded_rounds: int | None
+    stats: ReplayStats
+
+    @property
+    def matched(self) -> bool:
+        """胜方与回合数是否与录制时一致"""
+        return (self.winner, self.rounds) == (self.recorded_winner, self.recorded_rounds)
+
+
+def replay_games(games: dict[str, RecordedGame]) -> list[ReplayResult]:
+    """依次回放各局，期间不调用模型，也不录制"""
+    global _session
+    from src.agents.llm import override_llm
+    from .builder import get_game_graph, GAME_RECURSION_LIMIT
+
+    game_graph = get_game_graph()
+    session = ReplaySession(games)
+    previous_recorder = get_recorder()
+    _session = session
+    set_recorder(NullRecorder())
+    config = {"configurable": {"human_input": "replay"}, "recursion_limit": GAME_RECURSION_LIMIT}
+    results = []
+    try:
+        with override_llm(session):
+            for game in games.values():
+                token = current_game.set(game.game_id)
+                try:
+                    final_state = game_graph.invoke(game.initial_state(), config)
+                finally:
+                    current_game.reset(token)
+                results.append(ReplayResult(
+                    game.game_id,
+                    final_state["game_history"][-1]["winner"],
+                    final_state["current_round"],
+                    game.winner,
+                    game.rounds,
+                    session.stats[game.game_id],
+                ))
+    finally:
+        _session = None
+        set_recorder(previous_recorder)
+    return results
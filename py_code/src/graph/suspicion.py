@@ -0,0 +1,83 @@
+"""
+File: suspicion.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+本地可疑度评分：用字符 n-gram TF-IDF 向量表示本回合每位玩家的发言，按与其他发言的平均余弦相似度找出离群的发言者
+
+卧底拿到的词语与平民不同，发言用字往往与多数人偏离。一回合内所有玩家的分数在一次矩阵运算中得到，
+可作为投票提示（hint）注入投票提示词，或在廉价的模拟中直接代替LLM投票（local）
+"""
+import re
+from collections import defaultdict
+from enum import Enum
+
+# 计算 n-gram 前去掉的标点与空白
+_IGNORED = re.compile(r"[\s\W_]+")
+# 字符 n-gram 的长度范围
+NGRAM_RANGE = (1, 2)
+
+
+class VoteMode(Enum):
+    """AI投票方式"""
+    LLM = "llm"  # 只由LLM投票
+    HINT = "hint"  # 本地可疑度排序注入投票提示词，由LLM投票
+    LOCAL = "local"  # 按本地可疑度直接投票，不调用模型
+
+
+def _ngrams(text: str, ngram_range: tuple[int, int]) -> list[str]:
+    text = _IGNORED.sub("", text)
+    low, high = ngram_range
+    return [text[i:i + n] for n in range(low, high + 1) for i in range(len(text) - n + 1)]
+
+
+def score_speeches(speeches: dict[int, str], ngram_range: tuple[int, int] = NGRAM_RANGE) -> dict[int, float]:
+    """计算每位发言者的可疑度：1 - 与其他发言的平均余弦相似度，越大越离群
+
+    :param speeches: 本回合的 {玩家id: 发言}
+    :return: {玩家id: 可疑度}，取值 0~1；少于两条发言时均为 0
+    """
+    if len(speeches) < 2:
+        return dict.fromkeys(speeches, 0.0)
+    # 延迟导入，入口模块导入本模块时不加载 numpy
+    import numpy as np
+
+    # 词表：首次出现的 n-gram 依次编号（缺省值工厂为词表当前大小）
+    vocabulary: defaultdict[str, int] = defaultdict()
+    vocabulary.default_factory = vocabulary.__len__
+    lengths: list[int] = []
+    columns: list[int] = []
+    for text in speeches.values():
+        grams = _ngrams(text, ngram_range)
+        columns.extend(map(vocabulary.__getitem__, grams))
+        lengths.append(len(grams))
+
+    # 词频矩阵 [发言数, 词表大小]，由 (行, 列) 展平后的下标计数得到
+    count, size = len(speeches), max(len(vocabulary), 1)
+    flat = np.repeat(np.arange(count, dtype=np.int64) * size, lengths) + np.array(columns, dtype=np.int64)
+    tf = np.bincount(flat, minlength=count * size).reshape(count, size).astype(np.float64)
+    # 平滑的逆文档频率：多数发言共有的字权重低
+    df = np.count_nonzero(tf, axis=0)
+    weights = tf * (np.log((1 + count) / (1 + df)) + 1)
+    norms = np.sqrt(np.einsum("ij,ij->i", weights, weights))
+    vectors = weights / np.maximum(norms, 1e-12)[:, None]
+
+    similarity = vectors @ vectors.T
+    np.fill_diagonal(similarity, 0.0)
+    scores = 1.0 - similarity.sum(axis=1) / (count - 1)
+    return dict(zip(speeches, scores.tolist()))
+
+
+def rank(scores: dict[int, float], candidates: set[int]) -> list[int]:
+    """候选人按可疑度从高到低排列，同分按编号"""
+    return sorted(candidates, key=lambda player_id: (-scores.get(player_id, 0.0), player_id))
+
+
+def local_vote(scores: dict[int, float], candidates: set[int]) -> int:
+    """按本地可疑度投票：投给最可疑的候选人"""
+    return rank(scores, candidates)[0]
+
+
+def format_hint(scores: dict[int, float], candidates: set[int]) -> str:
+    """投票提示词中的可疑度提示"""
+    ranking = "、".join(f"玩家{player_id}({scores.get(player_id, 0.0):.2f})" for player_id in rank(scores, candidates))
+    return f"\n---\n【发言差异参考】按发言用字与其他玩家的差异从大到小：{ranking}（仅供参考）"
@@ -4,17 +4,22 @@ Created Time: 2026-01-05
 Author: falcon (liuc47810@gmail.com)
 """
 
-from typing import TypedDict, Annotated
+from typing import TypedDict, Annotated, Iterator
 from enum import Enum
+from collections import Counter
 from dataclasses import dataclass
-from langgraph.graph.message import add_messages
-from src.agents.llm import llm
-from src.constants.words import WORD_PAIRS
-from src.prompts.prompt import GAME_CONTEXT
-from textwrap import dedent
+from src.agents.llm import get_llm
+from .history import GameHistory, add_messages_window
+from .votes import VoteResult
+from src.prompts.compiler import CompiledPrompt, SPEECH_TEMPLATE, VOTE_TEMPLATE
 
+import os
 import random
 
+# 牌桌人数范围
+MIN_PLAYERS = 4
+MAX_PLAYERS = 50
+
 
 class GameStatus(Enum):
     """游戏状态"""
@@ -29,6 +34,15 @@ class PlayerRole(Enum):
     """玩家角色"""
     NORMAL = "normal"  # 普通玩家
     UNDERCOVER = "undercover"  # 卧底
+    BLANK = "blank"  # 白板（没有词语）
+
+
+# 角色的中文名称
+ROLE_NAMES: dict[PlayerRole, str] = {
+    PlayerRole.NORMAL: "平民",
+    PlayerRole.UNDERCOVER: "卧底",
+    PlayerRole.BLANK: "白板",
+}
 
 
 class PlayerType(Enum):
@@ -37,7 +51,7 @@ class PlayerType(Enum):
     AI = "ai"  # AI玩家
 
 
-@dataclass
+@dataclass(slots=True)
 class Player:
     """玩家信息"""
     id: int
@@ -57,127 +71,268 @@ class Player:
         self.vote_for = -1
 
 
+class PlayerRegistry:
+    """玩家索引
+
+    按座位顺序保存玩家，支持按id O(1)查找；存活玩家集合与各角色存活人数在淘汰时增量维护，
+    淘汰玩家必须通过 eliminate 完成
+    """
+    __slots__ = ("players", "by_id", "alive_ids", "alive_roles")
+
+    def __init__(self, players: list[Player]):
+        self.players = players
+        self.by_id: dict[int, Player] = {player.id: player for player in players}
+        self.alive_ids: set[int] = {player.id for player in players if player.is_alive}
+        self.alive_roles: Counter[PlayerRole] = Counter(player.player_role for player in players if player.is_alive)
+
+    def __iter__(self) -> Iterator[Player]:
+        return iter(self.players)
+
+    def __len__(self) -> int:
+        return len(self.players)
+
+    def get(self, player_id: int) -> Player:
+        """按id查找玩家"""
+        return self.by_id[player_id]
+
+    def is_alive(self, player_id: int) -> bool:
+        return player_id in self.alive_ids
+
+    def alive_players(self) -> list[Player]:
+        """按座位顺序返回存活玩家"""
+        return [player for player in self.players if player.id in self.alive_ids]
+
+    def alive_count(self, role: PlayerRole | None = None) -> int:
+        """存活玩家数，指定角色时返回该角色的存活人数"""
+        return len(self.alive_ids) if role is None else self.alive_roles[role]
+
+    def eliminate(self, player_id: int) -> Player:
+        """淘汰玩家并更新存活集合与角色计数"""
+        player = self.by_id[player_id]
+        if player.is_alive:
+            player.is_alive = False
+            self.alive_ids.discard(player_id)
+            self.alive_roles[player.player_role] -= 1
+        return player
+
+    def winner(self) -> PlayerRole | None:
+        """根据存活角色计数判定胜负，游戏未结束时返回 None
+
+        - 卧底与白板全部淘汰：平民获胜
+        - 存活平民不多于卧底与白板之和：卧底获胜，卧底已全部淘汰时白板获胜
+        """
+        undercovers = self.alive_roles[PlayerRole.UNDERCOVER]
+        hidden = undercovers + self.alive_roles[PlayerRole.BLANK]
+        if hidden == 0:
+            return PlayerRole.NORMAL
+        if self.alive_roles[PlayerRole.NORMAL] <= hidden:
+            return PlayerRole.UNDERCOVER if undercovers else PlayerRole.BLANK
+        return None
+
+
+@dataclass(frozen=True)
+class TableConfig:
+    """牌桌配置：玩家数、卧底数与白板数（白板没有词语，与卧底同一阵营）"""
+    num_players: int = 4
+    num_undercovers: int = 1
+    num_blanks: int = 0
+
+    def __post_init__(self):
+        if not MIN_PLAYERS <= self.num_players <= MAX_PLAYERS:
+            raise ValueError(f"玩家数需在 {MIN_PLAYERS}~{MAX_PLAYERS} 之间：{self.num_players}")
+        if self.num_undercovers < 1 or self.num_blanks < 0:
+            raise ValueError(f"至少需要1名卧底，白板数不能为负：卧底={self.num_undercovers}，白板={self.num_blanks}")
+        hidden = self.num_undercovers + self.num_blanks
+        if self.num_players - hidden <= hidden:
+            raise ValueError(
+                f"平民人数需多于卧底与白板之和：玩家={self.num_players}，卧底={self.num_undercovers}，白板={self.num_blanks}"
+            )
+
+    @classmethod
+    def from_env(cls) -> "TableConfig":
+        """从环境变量读取配置"""
+        return cls(
+            num_players=int(os.getenv("GAME_NUM_PLAYERS", "4")),
+            num_undercovers=int(os.getenv("GAME_NUM_UNDERCOVERS", "1")),
+            num_blanks=int(os.getenv("GAME_NUM_BLANKS", "0")),
+        )
+
+    def describe(self) -> str:
+        """牌桌配置的中文描述，如“6名玩家，其中1名卧底、1名白板”"""
+        blanks = f"、{self.num_blanks}名白板" if self.num_blanks else ""
+        return f"{self.num_players}名玩家，其中{self.num_undercovers}名是卧底{blanks}"
+
+
 class GameState(TypedDict):
     """游戏状态"""
+    seed: int  # 对局随机种子，平票随机淘汰等随机源由其派生
     game_status: GameStatus
-    players: list[Player]
+    players: PlayerRegistry  # 玩家索引，可按座位顺序遍历
     current_round: int
+    speech_turn: int  # 本回合下一位发言玩家在存活玩家中的序号
     round_speech: dict[int, str]  # 玩家发言 {player_id: speech}
-    round_votes: dict[int, int]  # 玩家投票记录 {player_id: vote_for_id}
-    game_history: list[dict]  # 游戏历史记录
+    round_votes: dict[int, int | None]  # 玩家投票记录 {player_id: vote_for_id}，None 表示弃权
+    revote_candidates: list[int]  # 平票重投的候选人，为空表示正常投票
+    revotes: int  # 本回合已进行的重投次数
+    vote_result: VoteResult | None  # 最近一次计票结果
+    game_history: GameHistory  # 游戏历史记录（最近回合完整保留，更早回合为摘要）
     eliminated_players: list[int]  # 淘汰的玩家id列表
-    messages: Annotated[list, add_messages]
+    messages: Annotated[list, add_messages_window]
 
 
 class UnderCoverGameManager:
     """谁是卧底游戏管理器"""
 
-    def __init__(self):
-        """初始化方法"""
-        # 初始化实例时，将传入的llm参数赋值给实例的llm属性
-        self.llm = llm
+    @property
+    def llm(self):
+        """游戏使用的LLM客户端（首次访问时才创建）"""
+        return get_llm()
+
+    def initialize_game(
+            self,
+            num_humans: int = 1,
+            seed: int | None = None,
+            category: str | None = None,
+            difficulty: str | None = None,
+            table: TableConfig | None = None,
+    ) -> GameState:
+        """初始化游戏
+
+        :param num_humans: 人类玩家数量，批量模拟时为0（全部为AI玩家）
+        :param seed: 随机种子，指定后座位、卧底与词语的分配可复现；为空时随机生成并记录在状态中
+        :param category: 词语类别，为空时不限
+        :param difficulty: 词语难度（easy / normal / hard），为空时不限
+        :param table: 牌桌配置，为空时读取环境变量 GAME_NUM_PLAYERS / GAME_NUM_UNDERCOVERS / GAME_NUM_BLANKS
+        """
+        table = table or TableConfig.from_env()
+        num_players = table.num_players
+        if not 0 <= num_humans <= num_players:
+            raise ValueError(f"人类玩家数需在 0~{num_players} 之间：{num_humans}")
+        # 词语对仓库依赖 numpy，首次开局时才加载
+        from src.constants.word_store import get_word_store
 
-    def initialize_game(self) -> GameState:
-        """初始化游戏"""
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        rng = random.Random(seed)
         # 创建玩家
         players: list[Player] = [
-            Player(id=0, name="人类", player_type=PlayerType.HUMAN),
-            Player(id=1, name="AI1", player_type=PlayerType.AI),
-            Player(id=2, name="AI2", player_type=PlayerType.AI),
-            Player(id=3, name="AI3", player_type=PlayerType.AI),
+            Player(id=i, name="人类" if i == 0 else f"人类{i + 1}", player_type=PlayerType.HUMAN)
+            for i in range(num_humans)
+        ]
+        players += [
+            Player(id=i, name=f"AI{i - num_humans + 1}", player_type=PlayerType.AI)
+            for i in range(num_humans, num_players)
         ]
 
         # 随机打乱玩家顺序
-        random.shuffle(players)
+        rng.shuffle(players)
         # 重新分配ID
         for i, player in enumerate(players):
             player.id = i
 
-        # 随机选择一个卧底
-        undercover_id = random.randint(0, 3)
-        normal_word, undercover_word = random.choice(WORD_PAIRS)
+        # 随机选择卧底与白板
+        hidden_ids = rng.sample(range(num_players), table.num_undercovers + table.num_blanks)
+        roles = dict.fromkeys(hidden_ids[:table.num_undercovers], PlayerRole.UNDERCOVER)
+        roles.update(dict.fromkeys(hidden_ids[table.num_undercovers:], PlayerRole.BLANK))
+        normal_word, undercover_word = get_word_store().sample(rng, category, difficulty)
+        words = {PlayerRole.NORMAL: normal_word, PlayerRole.UNDERCOVER: undercover_word, PlayerRole.BLANK: ""}
 
         # 分配角色和词语
         for player in players:
-            if player.id == undercover_id:
-                player.player_role = PlayerRole.UNDERCOVER
-                player.word = undercover_word
-            else:
-                player.player_role = PlayerRole.NORMAL
-                player.word = normal_word
+            player.player_role = roles.get(player.id, PlayerRole.NORMAL)
+            player.word = words[player.player_role]
 
         # 人类玩家
-        player = next(player for player in players if player.player_type == PlayerType.HUMAN)
-        print(f"你看到的词语是: {player.word}")
+        from .events import emit, WordAssigned
+        for player in players:
+            if player.player_type == PlayerType.HUMAN:
+                emit(WordAssigned(player.id, player.word))
+
+        return self.new_game_state(players, seed)
 
-        # 返回初始游戏状态
+    @staticmethod
+    def new_game_state(players: list[Player], seed: int) -> GameState:
+        """由已分配好身份与词语的玩家创建初始游戏状态（开局及回放录制的对局时使用）"""
         return GameState(
+            seed=seed,
             game_status=GameStatus.INIT,
-            players=players,
+            players=PlayerRegistry(players),
             current_round=1,
+            speech_turn=0,
             round_speech={},
             round_votes={},
-            game_history=[],
+            revote_candidates=[],
+            revotes=0,
+            vote_result=None,
+            game_history=GameHistory(),
             eliminated_players=[],
             messages=[],
         )
 
-    def get_player_speech_prompt(self, player: Player, other_speeches: str, game_round: int) -> str:
+    @staticmethod
+    def _speech_word(player: Player) -> str:
+        return player.word or "（你是白板，没有拿到词语，请根据其他玩家的发言推测他们的词语并据此发言）"
+
+    def get_player_speech_prefix(self, player: Player, game_round: int, history: str = "无") -> str:
+        """获取AI玩家发言提示词的前缀
+
+        静态规则在最前，本回合内不变的轮数、历史回合与词语随后，同一回合同一词语的玩家前缀完全一致，
+        便于模型提供方复用提示词前缀缓存
+
+        :param history: 历史回合内容（GameHistory.prompt_context()）
+        """
+        return SPEECH_TEMPLATE.prefix(history, game_round=game_round, word=self._speech_word(player))
+
+    def compile_speech_prompt(
+            self,
+            player: Player,
+            other_speeches: dict[int, str],
+            game_round: int,
+            history: str = "无",
+            note: str = "",
+    ) -> CompiledPrompt:
+        """编译AI玩家发言的提示词（含token数），随发言顺序变化的【其他玩家的发言】放在最后
+
+        :param note: 附在发言之后的提醒（如泄词后重新生成的 leaks.retry_note）
+        """
+        return SPEECH_TEMPLATE.compile(
+            history, other_speeches, note=note, game_round=game_round, word=self._speech_word(player)
+        )
+
+    def get_player_speech_prompt(
+            self,
+            player: Player,
+            other_speeches: dict[int, str],
+            game_round: int,
+            history: str = "无",
+    ) -> str:
         """获取AI玩家发言的提示词"""
-        # 获取玩家身份
-        role = "平民" if player.player_role == PlayerRole.NORMAL else "卧底"
-        # 给AI玩家生成发言
-        return dedent(f"""
-        你正在玩"谁是卧底"游戏，结合游戏规则、你拿到的【词语】和【其他玩家的发言】进行发言。
-        你并不知道你的身份，根据自己的【词语】和【其他玩家的发言】来猜测自己的身份。
-        
-        ---
-        【要求】
-        - 禁止在发言中直接表明你的身份，如"我是卧底..."
-        - 禁止在发言中直接说出词语本身或提到相关字眼，如词语是"棉花糖"，发言中不能出现"棉花糖"字眼
-        - 如果你是【平民】，在描述自己的词语时，避免过于直接，防止被【卧底】直接猜出平民词语；
-        - 如果你是【卧底】，*想办法存活下来*，如通过其他平民玩家的发言猜出他们的词语，根据所猜想的词语进行发言，以此来干扰场上信息，避免被其他玩家把自己投出去
-        ---
-        【现在的游戏轮数】
-        现在游戏进行到第{game_round}轮！
-        ---
-        【游戏技巧】
-        限制：只表达词语的一两个方面，字数在10个左右。
-        示例：你拿到的词语是：公路
-        第1-2轮可以这样描述："我的词语和交通有关"
-        第3轮及以后可以这样描述：常见于城镇之间的长距离路段，路面平整、车道明确，两侧常有护栏和交通标志，沿线会有服务区或收费站，主要供机动车长途行驶和货物运输
-        ---
-        【词语】
-        {player.word}
-        ---
-        【其他玩家的发言】
-        {other_speeches}
-        ---
-        你的发言：
-        """)
-
-    def get_player_vote_prompt(self, player: Player, other_speeches: dict[int, str], alive_players: list[int]):
+        return self.compile_speech_prompt(player, other_speeches, game_round, history).text
+
+    def compile_vote_prompt(
+            self,
+            player: Player,
+            other_speeches: dict[int, str],
+            alive_players: list[int],
+            history: str = "无",
+            hint: str = "",
+    ) -> CompiledPrompt:
+        """编译AI玩家投票的提示词（含token数）
+
+        :param hint: 附在发言之后的投票提示（如本地可疑度排序 suspicion.format_hint）
+        """
+        speeches = {player_id: other_speeches[player_id] for player_id in alive_players if player_id != player.id}
+        return VOTE_TEMPLATE.compile(
+            history, speeches, note=hint, role=ROLE_NAMES[player.player_role], word=player.word or "无"
+        )
+
+    def get_player_vote_prompt(
+            self,
+            player: Player,
+            other_speeches: dict[int, str],
+            alive_players: list[int],
+            history: str = "无",
+            hint: str = "",
+    ) -> str:
         """获取AI玩家投票的提示词"""
-        # 获取玩家身份
-        role = "平民" if player.player_role == PlayerRole.NORMAL else "卧底"
-
-        # 其他玩家发言
-        speeches = "\n".join([f"玩家{player_id}的发言：{other_speeches[player_id]}" for player_id in alive_players if
-                              player_id != player.id])
-
-        return dedent(f"""
-        结合"谁是卧底"的游戏规则、你自己的【身份词】、你拿到的【词语】及【其他存活玩家的发言】对你认为身份可疑的玩家进行投票（玩家编号）。
-        - 你是卧底，投票给其他存活玩家
-        - 你是平民，投票给身份可疑的玩家
-        ---
-        【身份词】
-        {role}
-        ---
-        【你的词语】
-        {player.word}
-        ---
-        【其他存活玩家的发言】
-        {speeches}
-        ---
-        请直接输出你要投票的玩家编号，不要输出其他多余内容：
-        """)
\ No newline at end of file
+        return self.compile_vote_prompt(player, other_speeches, alive_players, history, hint).text
@@ -0,0 +1,180 @@
+"""
+File: votes.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+投票解析与计票：容错提取模型输出中的玩家编号，重试耗尽时确定性兜底；按平票策略归票
+"""
+import contextlib
+import json
+import random
+import re
+import threading
+from dataclasses import dataclass, asdict, field, replace
+from enum import Enum
+from typing import Iterable
+
+_JSON_OBJECT = re.compile(r"\{.*?\}", re.S)
+_NUMBER = re.compile(r"\d+")
+
+
+@dataclass
+class VoteStats:
+    """AI投票统计"""
+    requests: int = 0  # LLM投票请求次数
+    invalid: int = 0  # 输出无法解析或编号不合法的次数
+    errors: int = 0  # 请求异常或超时次数
+    retries: int = 0  # 重试次数
+    fallbacks: int = 0  # 重试耗尽后使用兜底投票的次数
+    local: int = 0  # 按本地可疑度投票（VOTE_MODE=local，不调用模型）的次数
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+_stats = VoteStats()
+_stats_lock = threading.Lock()
+
+
+def get_vote_stats() -> VoteStats:
+    """获取当前进程的投票统计"""
+    return _stats
+
+
+def reset_vote_stats() -> None:
+    global _stats
+    _stats = VoteStats()
+
+
+def count(field: str, n: int = 1) -> None:
+    """累加投票统计计数（线程安全）"""
+    with _stats_lock:
+        setattr(_stats, field, getattr(_stats, field) + n)
+
+
+class VoteCollector:
+    """一次投票中AI玩家结果的收集：所有AI玩家共用一个截止时间
+
+    截止（close）后仍在进行的投票不再请求模型，迟到的结果被丢弃。每次尝试的结果在 commit 中生效（计数、录制、登记投票），
+    commit 与截止互斥，因此每个结果要么在截止前完整生效，要么完全没有副作用
+    """
+
+    def __init__(self):
+        self.closed = threading.Event()
+        self.votes: dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def close(self) -> dict[int, int]:
+        """截止，返回截止前登记的投票 {投票者id: 被投玩家id}"""
+        with self._lock:
+            self.closed.set()
+            return dict(self.votes)
+
+    @contextlib.contextmanager
+    def commit(self):
+        """生效一次尝试的结果；已截止时得到 False，调用方应直接丢弃结果"""
+        with self._lock:
+            yield not self.closed.is_set()
+
+
+def parse_vote(text: str, candidates: set[int]) -> int | None:
+    """从模型输出中解析投票
+
+    优先解析 JSON（如 {"vote": 2}），否则取文本中第一个属于候选人的编号；均不合法时返回 None
+    """
+    match = _JSON_OBJECT.search(text)
+    if match:
+        try:
+            data = json.loads(match.group())
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            for key in ("vote", "player_id", "id"):
+                value = data.get(key)
+                if isinstance(value, (int, str)) and str(value).strip().isdigit() and int(value) in candidates:
+                    return int(value)
+    for number in _NUMBER.findall(text):
+        if int(number) in candidates:
+            return int(number)
+    return None
+
+
+def fallback_vote(voter_id: int, candidates: set[int], game_round: int) -> int:
+    """确定性兜底投票：按投票者编号与回合数在候选人中轮转选择"""
+    ordered = sorted(candidates)
+    return ordered[(voter_id + game_round) % len(ordered)]
+
+
+# ==================== 计票 ====================
+class TiePolicy(Enum):
+    """最高票平票时的处理策略"""
+    REVOTE = "revote"  # 只在平票玩家中重新投票
+    NONE = "none"  # 本回合无人淘汰
+    RANDOM = "random"  # 按对局种子在平票玩家中随机淘汰
+
+
+@dataclass(frozen=True)
+class VoteResult:
+    """一次计票的结果"""
+    counts: dict[int, int]  # 有效票数 {玩家id: 票数}，按票数从高到低
+    eliminated: int | None  # 被淘汰的玩家，无人淘汰或需要重投时为 None
+    tied: list[int] = field(default_factory=list)  # 最高票平票的玩家（无平票时为空）
+    abstentions: list[int] = field(default_factory=list)  # 弃权的投票者
+    invalid: list[int] = field(default_factory=list)  # 投票无效的投票者（投给非候选人或自己）
+    revote: bool = False  # 是否需要在平票玩家中重投
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def tally(
+        ballots: dict[int, int | None],
+        candidates: Iterable[int],
+        policy: TiePolicy = TiePolicy.REVOTE,
+        rng: random.Random | None = None,
+        allow_revote: bool = True,
+) -> VoteResult:
+    """计票：按玩家id用 bincount 统计有效票，得票最高者淘汰，平票时按策略处理
+
+    :param ballots: {投票者id: 被投玩家id}，None 表示弃权
+    :param candidates: 本次投票的候选人
+    :param rng: RANDOM 策略使用的随机源
+    :param allow_revote: 为 False 时（重投次数已用尽）REVOTE 策略按无人淘汰处理
+    """
+    # 延迟导入，入口模块导入本模块时不加载 numpy
+    import numpy as np
+
+    voters = np.array(list(ballots), dtype=np.int64)
+    targets = np.array([-1 if t is None else t for t in ballots.values()], dtype=np.int64)
+    candidate_ids = np.array(list(candidates), dtype=np.int64)
+    # 候选人掩码，下标为玩家id（多留一位用于越界的目标）
+    size = int(max(candidate_ids.max(initial=-1), targets.max(initial=-1))) + 2
+    is_candidate = np.zeros(size, dtype=bool)
+    is_candidate[candidate_ids] = True
+    abstained = targets < 0
+    valid = is_candidate[targets] & (targets != voters)
+
+    counts = np.bincount(targets[valid], minlength=size)
+    received = counts.nonzero()[0]
+    # 按票数从高到低、同票按编号排列（稳定排序保留编号顺序）
+    order = received[(-counts[received]).argsort(kind="stable")]
+    result = {
+        "counts": dict(zip(order.tolist(), counts[order].tolist())),
+        "abstentions": voters[abstained].tolist(),
+        "invalid": voters[~abstained & ~valid].tolist(),
+    }
+    if len(order) == 0:
+        return VoteResult(eliminated=None, **result)
+    top = (counts == counts[order[0]]).nonzero()[0].tolist()
+    if len(top) == 1:
+        return VoteResult(eliminated=top[0], **result)
+    if policy == TiePolicy.RANDOM:
+        return VoteResult(eliminated=(rng or random.Random()).choice(top), tied=top, **result)
+    if policy == TiePolicy.REVOTE and allow_revote:
+        return VoteResult(eliminated=None, tied=top, revote=True, **result)
+    return VoteResult(eliminated=None, tied=top, **result)
+
+
+def force_elimination(result: VoteResult, candidates: Iterable[int], rng: random.Random) -> VoteResult:
+    """强制淘汰：在最高票平票的玩家中（没有有效票时在全部候选人中）随机淘汰一人"""
+    pool = result.tied or sorted(candidates)
+    return replace(result, eliminated=rng.choice(pool), revote=False)
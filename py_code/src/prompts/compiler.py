@@ -0,0 +1,264 @@
+"""
+File: compiler.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+提示词编译器：静态模板段只构建一次，用本地分词器计算token数，超出预算时按固定顺序裁剪
+
+- 静态内容（游戏规则 GAME_CONTEXT、发言/投票要求）在最前，同一回合同一词语的内容（轮数、历史回合、词语）
+  随后，随发言顺序变化的【其他玩家的发言】放在最后，便于模型提供方复用提示词前缀缓存
+- 超出 PROMPT_MAX_TOKENS 时先逐级截短每条发言（只影响末尾，不破坏前缀缓存），仍超出再从最早的历史记录开始删减
+- 分词器优先使用 tiktoken，本地没有词表且无法下载时退化为按字符估算
+"""
+import functools
+import math
+import os
+import threading
+from dataclasses import dataclass, asdict
+from string import Formatter
+from textwrap import dedent
+from typing import Callable
+
+from .prompt import GAME_CONTEXT
+
+# 单个提示词的token预算
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "3000"))
+# 分词器：auto（优先 tiktoken，不可用时估算）/ tiktoken / heuristic，以及 tiktoken 的编码名
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "auto")
+PROMPT_TOKENIZER_ENCODING = os.getenv("PROMPT_TOKENIZER_ENCODING", "o200k_base")
+# 是否在提示词最前面加入完整游戏规则（GAME_CONTEXT）
+PROMPT_GAME_CONTEXT = os.getenv("PROMPT_GAME_CONTEXT", "1") == "1"
+
+# 超出预算时每条发言依次截短到的字数
+_SPEECH_CAPS = (60, 30, 15, 6)
+_HISTORY_OMITTED = "（更早的回合已省略）"
+
+
+# ==================== 分词器 ====================
+def estimate_tokens(text: str) -> int:
+    """按字符估算token数：中文等 UTF-8 三字节字符各计1个，其余字符每4个计1个"""
+    # 三字节字符比单字节字符多占2个字节，由编码长度差得到其个数
+    wide = (len(text.encode("utf-8")) - len(text)) // 2
+    return wide + math.ceil((len(text) - wide) / 4)
+
+
+@functools.cache
+def get_tokenizer() -> Callable[[str], int]:
+    """获取token计数函数（进程内只初始化一次）"""
+    if PROMPT_TOKENIZER != "heuristic":
+        try:
+            import tiktoken
+            encoding = tiktoken.get_encoding(PROMPT_TOKENIZER_ENCODING)
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception:
+            # 未安装 tiktoken，或本地没有词表且无法下载
+            if PROMPT_TOKENIZER == "tiktoken":
+                raise
+    return estimate_tokens
+
+
+@functools.lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """计算文本token数；同一回合内历史回合与已有发言会在多个提示词中重复出现，结果按文本缓存"""
+    return get_tokenizer()(text)
+
+
+# ==================== 统计 ====================
+@dataclass
+class PromptStats:
+    """提示词统计"""
+    prompts: int = 0  # 编译的提示词数
+    tokens: int = 0  # 提示词token总数
+    prefix_tokens: int = 0  # 其中可复用前缀的token数
+    truncated: int = 0  # 超出预算被裁剪的提示词数
+    over_budget: int = 0  # 裁剪后仍超出预算的提示词数
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+_stats = PromptStats()
+_stats_lock = threading.Lock()
+
+
+def get_prompt_stats() -> PromptStats:
+    """获取当前进程的提示词统计"""
+    return _stats
+
+
+def reset_prompt_stats() -> None:
+    global _stats
+    _stats = PromptStats()
+
+
+def _record(prompt: "CompiledPrompt", budget: int) -> None:
+    with _stats_lock:
+        _stats.prompts += 1
+        _stats.tokens += prompt.tokens
+        _stats.prefix_tokens += prompt.prefix_tokens
+        _stats.truncated += prompt.truncated
+        _stats.over_budget += prompt.tokens > budget
+
+
+# ==================== 模板 ====================
+@dataclass(slots=True)
+class CompiledPrompt:
+    """编译后的提示词"""
+    text: str
+    prefix: str  # 不随发言顺序变化、可被提供方缓存的前缀
+    tokens: int
+    prefix_tokens: int
+    truncated: bool = False  # 是否因超出预算被裁剪
+
+    @property
+    def prefix_ratio(self) -> float:
+        return self.prefix_tokens / max(self.tokens, 1)
+
+
+def _truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class PromptTemplate:
+    """预编译的提示词模板
+
+    提示词 = 静态段 + 前缀段（含历史回合）+ 发言段；静态段在创建时构建，token数在首次使用时计算一次
+    """
+
+    def __init__(self, static: str, prefix_format: str, speech_format: str, suffix: str):
+        self.static = (GAME_CONTEXT.strip() + "\n---\n" if PROMPT_GAME_CONTEXT else "") + static
+        self.prefix_format = prefix_format
+        self.speech_format = speech_format
+        self.suffix = suffix
+        # 前缀段中各字段的名称，字段值为空时的模板即前缀段的固定部分
+        self._fields = [name for _, name, _, _ in Formatter().parse(prefix_format) if name]
+
+    @functools.cached_property
+    def static_tokens(self) -> int:
+        return count_tokens(self.static)
+
+    @functools.cached_property
+    def _prefix_fixed_tokens(self) -> int:
+        return count_tokens(self.prefix_format.format(**dict.fromkeys(self._fields, "")))
+
+    @functools.cached_property
+    def _suffix_tokens(self) -> int:
+        return count_tokens(self.suffix)
+
+    def _prefix_tokens(self, fields: dict) -> int:
+        """前缀段token数：固定部分 + 各字段值（分段计数，各段结果可在多个提示词间复用）"""
+        return self.static_tokens + self._prefix_fixed_tokens + sum(count_tokens(str(v)) for v in fields.values())
+
+    def prefix(self, history: str, **fields) -> str:
+        return self.static + self.prefix_format.format(history=history, **fields)
+
+    def _body(self, speeches: dict[int, str], cap: int | None, note: str = "") -> tuple[str, int]:
+        """发言段及其token数"""
+        lines = [
+            self.speech_format.format(player_id=player_id, speech=speech if cap is None else _truncate(speech, cap))
+            for player_id, speech in speeches.items()
+        ] or ["无"]
+        tokens = sum(map(count_tokens, lines)) + self._suffix_tokens + (count_tokens(note) if note else 0)
+        return "\n".join(lines) + note + self.suffix, tokens
+
+    def compile(
+            self,
+            history: str,
+            speeches: dict[int, str],
+            budget: int | None = None,
+            note: str = "",
+            **fields,
+    ) -> CompiledPrompt:
+        """编译提示词，超出预算时先截短发言，再从最早的历史记录开始删减
+
+        :param history: 历史回合内容（GameHistory.prompt_context()）
+        :param speeches: 按展示顺序排列的 {玩家id: 发言}
+        :param budget: token预算，为空时使用 PROMPT_MAX_TOKENS
+        :param note: 附在发言段之后的补充内容（如投票提示），不参与裁剪
+        """
+        budget = PROMPT_MAX_TOKENS if budget is None else budget
+        fields["history"] = history
+        prefix_tokens = self._prefix_tokens(fields)
+        body, body_tokens = self._body(speeches, None, note)
+        tokens = prefix_tokens + body_tokens
+        truncated = tokens > budget
+
+        if truncated:
+            for cap in _SPEECH_CAPS:
+                body, body_tokens = self._body(speeches, cap, note)
+                tokens = prefix_tokens + body_tokens
+                if tokens <= budget:
+                    break
+        if tokens > budget and history != "无":
+            # 按行估算需要删减的最早历史记录，删减后重新计数，直到满足预算或历史删空
+            lines = history.splitlines()
+            while lines and tokens > budget:
+                excess = tokens - budget
+                while lines and excess > 0:
+                    excess -= count_tokens(lines.pop(0)) + 1
+                history = fields["history"] = "\n".join([_HISTORY_OMITTED, *lines])
+                prefix_tokens = self._prefix_tokens(fields)
+                tokens = prefix_tokens + body_tokens
+
+        prefix = self.static + self.prefix_format.format(**fields)
+        prompt = CompiledPrompt(prefix + body, prefix, tokens, prefix_tokens, truncated)
+        _record(prompt, budget)
+        return prompt
+
+
+SPEECH_TEMPLATE = PromptTemplate(
+    static=dedent("""\
+        你正在玩"谁是卧底"游戏，结合游戏规则、你拿到的【词语】和【其他玩家的发言】进行发言。
+        你并不知道你的身份，根据自己的【词语】和【其他玩家的发言】来猜测自己的身份。
+
+        ---
+        【要求】
+        - 禁止在发言中直接表明你的身份，如"我是卧底..."
+        - 禁止在发言中直接说出词语本身或提到相关字眼，如词语是"棉花糖"，发言中不能出现"棉花糖"字眼
+        - 如果你是【平民】，在描述自己的词语时，避免过于直接，防止被【卧底】直接猜出平民词语；
+        - 如果你是【卧底】，*想办法存活下来*，如通过其他平民玩家的发言猜出他们的词语，根据所猜想的词语进行发言，以此来干扰场上信息，避免被其他玩家把自己投出去
+        ---
+        【游戏技巧】
+        限制：只表达词语的一两个方面，字数在10个左右。
+        示例：你拿到的词语是：公路
+        第1-2轮可以这样描述："我的词语和交通有关"
+        第3轮及以后可以这样描述：常见于城镇之间的长距离路段，路面平整、车道明确，两侧常有护栏和交通标志，沿线会有服务区或收费站，主要供机动车长途行驶和货物运输
+        ---
+        """),
+    prefix_format=dedent("""\
+        【现在的游戏轮数】
+        现在游戏进行到第{game_round}轮！
+        ---
+        【历史回合】
+        {history}
+        ---
+        【词语】
+        {word}
+        ---
+        【其他玩家的发言】
+        """),
+    speech_format="玩家{player_id}发言：{speech}",
+    suffix="\n---\n你的发言：\n",
+)
+
+VOTE_TEMPLATE = PromptTemplate(
+    static=dedent("""\
+        结合"谁是卧底"的游戏规则、你自己的【身份词】、你拿到的【词语】及【其他存活玩家的发言】对你认为身份可疑的玩家进行投票（玩家编号）。
+        - 你是卧底，投票给其他存活玩家
+        - 你是平民，投票给身份可疑的玩家
+        ---
+        """),
+    prefix_format=dedent("""\
+        【身份词】
+        {role}
+        ---
+        【你的词语】
+        {word}
+        ---
+        【历史回合】
+        {history}
+        ---
+        【其他存活玩家的发言】
+        """),
+    speech_format="玩家{player_id}的发言：{speech}",
+    suffix="\n---\n请直接输出你要投票的玩家编号，不要输出其他多余内容：\n",
+)
@@ -7,7 +7,8 @@ GAME_CONTEXT = """
 
 #### 1. **角色分配**
 - 大多数玩家是“平民”，拿到**相同**的词语（如“苹果”）。
-- 1名玩家是“卧底”，拿到一个**相似但不同**的词语（如“香蕉”）。
+- 少数玩家是“卧底”（通常1名，人数较多时可有2–3名），拿到一个**相似但不同**的词语（如“香蕉”）。
+- 可选：少数玩家是“白板”，没有拿到词语，需要根据别人的描述混入，与卧底同一阵营。
 
 #### 2. **游戏流程**
 1. **发词**：主持人（可以是玩家轮流担任或专门一人）秘密给每位玩家分配词语。
@@ -17,8 +18,8 @@ GAME_CONTEXT = """
 3. **投票淘汰**：每轮描述结束后，所有人投票选出**最可疑的玩家**（得票最多者被淘汰）。被淘汰者需亮明身份。
 4. **继续游戏**：若未找出卧底，则继续下一轮描述和投票。
 5. **胜负判定**：
-   - **平民胜利**：成功投出所有卧底（通常只有1个）。
-   - **卧底胜利**：当卧底人数 ≥ 平民人数（即最后剩下2人且其中1人是卧底），或卧底撑到最后未被发现。
+   - **平民胜利**：成功投出所有卧底（和白板）。
+   - **卧底胜利**：当卧底与白板人数之和 ≥ 平民人数（如4人局最后剩下2人且其中1人是卧底），或卧底撑到最后未被发现；卧底全部出局而白板撑到最后时白板胜利。
 
 ---
 
@@ -0,0 +1,71 @@
+"""
+File: test_batching.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+跨对局合批测试：并发请求合并为一批、结果按序分发、单条错误只影响对应请求，以及批处理文件格式往返
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from src.agents.batching import BatchFileSubmitter, BatchItemError, BatchingLLM
+from src.agents.fake import FakeChatModel
+
+
+class EchoBatcher:
+    """记录每批提示词，按提示词原样回答；提示词为 fail 时该条返回错误"""
+
+    def __init__(self):
+        self.batches: list[list[str]] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, prompts: list[str]) -> list:
+        with self._lock:
+            self.batches.append(prompts)
+        return [
+            BatchItemError("失败", status_code=500) if prompt == "fail" else AIMessage(content=f"re:{prompt}")
+            for prompt in prompts
+        ]
+
+
+def test_concurrent_requests_are_batched_in_order():
+    submit = EchoBatcher()
+    llm = BatchingLLM(client=None, max_batch_size=8, max_wait=0.5, submit=submit)
+    prompts = [f"p{i}" for i in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda prompt: llm.invoke(prompt).content, prompts))
+    assert results == [f"re:{prompt}" for prompt in prompts]
+    # 攒满一批后立即提交，不等到超时
+    assert len(submit.batches) == 1
+    assert llm.stats.full_batches == 1
+    assert llm.stats.requests == 8
+
+
+def test_partial_batch_flushes_after_wait_and_errors_stay_per_item():
+    submit = EchoBatcher()
+    llm = BatchingLLM(client=None, max_batch_size=32, max_wait=0.02, submit=submit)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        ok = pool.submit(llm.invoke, "ok")
+        failed = pool.submit(llm.invoke, "fail")
+        assert ok.result(timeout=5).content == "re:ok"
+        with pytest.raises(BatchItemError) as error:
+            failed.result(timeout=5)
+    assert error.value.status_code == 500
+    assert llm.stats.full_batches == 0
+
+
+def test_stream_yields_whole_response_as_one_chunk():
+    llm = BatchingLLM(client=None, max_batch_size=1, submit=EchoBatcher())
+    assert [chunk.content for chunk in llm.stream("hi")] == ["re:hi"]
+
+
+def test_file_submitter_round_trip(tmp_path):
+    client = FakeChatModel(seed=0, ttft_ms=0, tokens_per_sec=0)
+    submit = BatchFileSubmitter(client, str(tmp_path))
+    results = submit(["你好", "请投票"])
+    assert len(results) == 2
+    assert all(isinstance(result, AIMessage) and result.content for result in results)
+    assert len(list(tmp_path.glob("*-input.jsonl"))) == 1
+    assert len(list(tmp_path.glob("*-output.jsonl"))) == 1
@@ -0,0 +1,121 @@
+"""
+File: test_cache.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+响应缓存测试：内存/磁盘两层命中、只缓存完整读取的流，以及投票重试时不回放缓存中的无效回答
+"""
+import threading
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from src.agents.cache import CachedLLM, LRUCache, SQLiteCache
+from src.agents.llm import abandoned, override_llm
+from src.graph import nodes, votes
+from src.graph.types import UnderCoverGameManager
+
+
+class CountingLLM:
+    """依次返回给定回答的客户端，记录实际调用次数"""
+
+    def __init__(self, *answers: str):
+        self.answers = list(answers)
+        self.calls = 0
+
+    def _next(self) -> str:
+        self.calls += 1
+        return self.answers.pop(0) if len(self.answers) > 1 else self.answers[0]
+
+    def invoke(self, prompt, **kwargs):
+        return AIMessage(content=self._next())
+
+    def stream(self, prompt, **kwargs):
+        for text in self._next().split(" "):
+            yield AIMessageChunk(content=text)
+
+
+def test_memory_and_disk_hits(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    client = CountingLLM("hello")
+    cached = CachedLLM(client, LRUCache(), SQLiteCache(path))
+    assert cached.invoke("p").content == "hello"
+    assert cached.invoke("p").content == "hello"
+    assert cached.stats.memory_hits == 1
+
+    # 新进程（新的内存层）从磁盘层命中
+    restarted = CachedLLM(client, LRUCache(), SQLiteCache(path))
+    assert restarted.invoke("p").content == "hello"
+    assert restarted.stats.disk_hits == 1
+    assert client.calls == 1
+
+
+def test_lru_evicts_oldest():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", ["1"])
+    cache.set("b", ["2"])
+    cache.get("a")
+    cache.set("c", ["3"])
+    assert cache.get("b") is None
+    assert cache.get("a") == ["1"]
+
+
+def test_stream_replays_chunks_and_skips_partial_reads():
+    client = CountingLLM("a b c")
+    cached = CachedLLM(client, LRUCache())
+    stream = cached.stream("p")
+    next(stream)
+    stream.close()
+    # 未读完的流不缓存
+    assert [chunk.content for chunk in cached.stream("p")] == ["a", "b", "c"]
+    assert [chunk.content for chunk in cached.stream("p")] == ["a", "b", "c"]
+    assert client.calls == 2
+
+
+def test_evict_removes_both_layers(tmp_path):
+    client = CountingLLM("x", "y")
+    cached = CachedLLM(client, LRUCache(), SQLiteCache(str(tmp_path / "cache.sqlite")))
+    cached.invoke("p")
+    cached.evict("p")
+    assert cached.invoke("p").content == "y"
+    assert client.calls == 2
+
+
+@pytest.fixture
+def vote_setup(monkeypatch):
+    monkeypatch.setattr(nodes, "VOTE_RETRY_BACKOFF", 0)
+    manager = UnderCoverGameManager()
+    state = manager.initialize_game(num_humans=0, seed=7)
+    players = list(state["players"])
+    speeches = {player.id: f"玩家{player.id}的发言" for player in players}
+    return manager, players[0], speeches
+
+
+def test_vote_retry_bypasses_cached_invalid_answer(vote_setup):
+    manager, player, speeches = vote_setup
+    ballot = list(speeches)
+    target = next(player_id for player_id in ballot if player_id != player.id)
+    client = CountingLLM("我不确定", str(target))
+    cached = CachedLLM(client, LRUCache())
+    fallbacks = votes.get_vote_stats().fallbacks
+    with override_llm(cached):
+        vote = nodes._ai_vote(manager, player, speeches, ballot, 1, 0, "无", "test", votes.VoteCollector())
+    assert vote == target
+    assert client.calls == 2
+    assert votes.get_vote_stats().fallbacks == fallbacks
+    # 有效回答留在缓存中，相同提示词再次投票直接命中
+    with override_llm(cached):
+        assert nodes._ai_vote(manager, player, speeches, ballot, 1, 0, "无", "test", votes.VoteCollector()) == target
+    assert client.calls == 2
+
+
+def test_abandoned_request_not_stored():
+    client = CountingLLM("late", "fresh")
+    cached = CachedLLM(client, LRUCache())
+    cancelled = threading.Event()
+    cancelled.set()
+    token = abandoned.set(cancelled)
+    try:
+        assert cached.invoke("p").content == "late"
+    finally:
+        abandoned.reset(token)
+    assert cached.invoke("p").content == "fresh"
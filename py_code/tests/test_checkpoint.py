@@ -0,0 +1,156 @@
+"""
+File: test_checkpoint.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+对局存档测试：紧凑序列化的往返一致性；SQLite存档中断后恢复（main --resume）与不中断的对局结果一致
+"""
+import pytest
+
+from src.agents.fake import FakeChatModel
+from src.agents.llm import override_llm
+from src.app import main
+from src.graph.builder import GAME_RECURSION_LIMIT, build_game_graph
+from src.graph.checkpoint import CompactSerializer, create_sqlite_checkpointer
+from src.graph.history import GameHistory
+from src.graph.types import (
+    GameStatus,
+    Player,
+    PlayerRegistry,
+    PlayerRole,
+    PlayerType,
+    TableConfig,
+    UnderCoverGameManager,
+)
+from src.graph.votes import VoteResult
+
+SEED = 5
+
+
+def round_trip(obj):
+    serde = CompactSerializer()
+    return serde.loads_typed(serde.dumps_typed(obj))
+
+
+def player_rows(registry: PlayerRegistry) -> list[tuple]:
+    return [
+        (p.id, p.name, p.player_type, p.player_role, p.word, p.is_alive, p.speech, p.votes_received, p.vote_for)
+        for p in registry
+    ]
+
+
+# ==================== 紧凑序列化 ====================
+def test_enums_round_trip():
+    for member in [*GameStatus, *PlayerRole, *PlayerType]:
+        assert round_trip(member) is member
+    assert round_trip({"status": GameStatus.ROUND_VOTING, "roles": [PlayerRole.BLANK, None]}) == {
+        "status": GameStatus.ROUND_VOTING, "roles": [PlayerRole.BLANK, None],
+    }
+
+
+def test_player_round_trip():
+    player = Player(id=3, name="AI3", player_type=PlayerType.AI, player_role=PlayerRole.UNDERCOVER, word="梨")
+    player.speech = "一种水果"
+    player.vote_for = 1
+    assert round_trip(player) == player
+    blank = Player(id=0, name="人类", player_type=PlayerType.HUMAN)
+    assert round_trip(blank) == blank
+
+
+def test_registry_round_trip_rebuilds_alive_index():
+    state = UnderCoverGameManager().initialize_game(num_humans=1, seed=SEED, table=TableConfig(7, 2, 1))
+    registry = state["players"]
+    registry.eliminate(next(p.id for p in registry if p.player_role == PlayerRole.UNDERCOVER))
+    restored = round_trip(registry)
+    assert isinstance(restored, PlayerRegistry)
+    assert player_rows(restored) == player_rows(registry)
+    assert restored.alive_ids == registry.alive_ids
+    assert restored.alive_roles == registry.alive_roles
+    assert restored.winner() == registry.winner()
+
+
+def test_history_round_trip():
+    history = GameHistory([
+        {"round": 0, "words": ["苹果", "梨"]},
+        {"round": 1, "eliminated_id": 2, "speeches": {1: "甜的", 2: "圆的"}, "votes": {1: 2, 2: None}},
+        {"round": 2, "eliminated_id": None, "summary": "都在说颜色"},
+        {"round": 3, "winner": PlayerRole.NORMAL.value},
+    ])
+    restored = round_trip(history)
+    assert isinstance(restored, GameHistory)
+    assert list(restored) == list(history)
+
+
+def test_vote_result_and_state_round_trip():
+    state = UnderCoverGameManager().initialize_game(num_humans=0, seed=SEED)
+    state["vote_result"] = VoteResult({2: 3, 1: 1}, 2, [], [4], [5], False)
+    state["round_votes"] = {0: 2, 1: None}
+    restored = round_trip(state)
+    assert restored["vote_result"] == state["vote_result"]
+    assert restored["round_votes"] == state["round_votes"]
+    assert restored["game_status"] is state["game_status"]
+    assert player_rows(restored["players"]) == player_rows(state["players"])
+    assert list(restored["game_history"]) == list(state["game_history"])
+
+
+# ==================== 中断与恢复 ====================
+class InterruptingLLM:
+    """第 n 次发言请求时模拟 Ctrl+C 的客户端包装"""
+
+    def __init__(self, client, n: int):
+        self.client = client
+        self.n = n
+        self.streams = 0
+
+    def invoke(self, prompt, **kwargs):
+        return self.client.invoke(prompt, **kwargs)
+
+    def stream(self, prompt, **kwargs):
+        self.streams += 1
+        if self.streams == self.n:
+            raise KeyboardInterrupt
+        return self.client.stream(prompt, **kwargs)
+
+
+def final_state(path: str, thread_id: str) -> dict:
+    checkpointer = create_sqlite_checkpointer(path)
+    try:
+        snapshot = build_game_graph(checkpointer).get_state({"configurable": {"thread_id": thread_id}})
+    finally:
+        checkpointer.conn.close()
+    assert not snapshot.next
+    return snapshot.values
+
+
+def play(path: str, thread_id: str, client) -> None:
+    checkpointer = create_sqlite_checkpointer(path)
+    config = {"configurable": {"thread_id": thread_id}, "recursion_limit": GAME_RECURSION_LIMIT}
+    state = UnderCoverGameManager().initialize_game(num_humans=0, seed=SEED, table=TableConfig(6, 1, 0))
+    try:
+        with override_llm(client):
+            build_game_graph(checkpointer).invoke(state, config)
+    finally:
+        checkpointer.conn.close()
+
+
+def test_resumed_game_matches_uninterrupted(tmp_path, capsys):
+    fake = FakeChatModel(seed=SEED, ttft_ms=0, tokens_per_sec=0)
+    baseline = str(tmp_path / "baseline.db")
+    play(baseline, "game", fake)
+    expected = final_state(baseline, "game")
+
+    # 第二回合发言时中断，存档停在最后完成的节点
+    path = str(tmp_path / "resume.db")
+    client = InterruptingLLM(fake, n=8)
+    with pytest.raises(KeyboardInterrupt):
+        play(path, "game", client)
+    assert client.streams == 8
+    with override_llm(fake):
+        main.play_game(path, resume_id="game")
+    assert "继续对局【game】" in capsys.readouterr().out
+    resumed = final_state(path, "game")
+
+    assert resumed["current_round"] == expected["current_round"]
+    assert resumed["eliminated_players"] == expected["eliminated_players"]
+    assert player_rows(resumed["players"]) == player_rows(expected["players"])
+    assert list(resumed["game_history"]) == list(expected["game_history"])
+    assert resumed["vote_result"] == expected["vote_result"]
@@ -0,0 +1,93 @@
+"""
+File: test_compiler.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+提示词编译测试：编译结果不超出token预算；同一回合各玩家的静态前缀逐字节一致；发言过长时截短、仍超出时删减最早的历史
+"""
+import pytest
+
+from src.graph.types import PlayerRole, TableConfig, UnderCoverGameManager
+from src.prompts.compiler import SPEECH_TEMPLATE, VOTE_TEMPLATE, count_tokens
+
+LONG_SPEECH = "这个东西在生活中很常见，形状有点圆，颜色多种多样，" * 20
+HISTORY = "\n".join(f"第{r}轮（摘要）：玩家1：{'很常见的东西' * 4}；无人淘汰" for r in range(1, 16))
+
+
+def speeches(players: int, speech: str = LONG_SPEECH) -> dict[int, str]:
+    return {player_id: f"{player_id}号：{speech}" for player_id in range(players)}
+
+
+def assert_within_budget(prompt, budget: int) -> None:
+    assert prompt.tokens <= budget
+    # 分段计数不含段间换行，按整段文本重新计数时每行最多多出1个token
+    assert count_tokens(prompt.text) <= budget + prompt.text.count("\n")
+
+
+@pytest.mark.parametrize("margin", [250, 500, 1000, 2000])
+@pytest.mark.parametrize("template", [SPEECH_TEMPLATE, VOTE_TEMPLATE], ids=["speech", "vote"])
+def test_compiled_prompt_stays_within_budget(template, margin):
+    # 预算需容纳静态段（游戏规则与要求），超出部分才能通过裁剪满足
+    budget = template.static_tokens + margin
+    fields = {"game_round": 3, "word": "苹果"} if template is SPEECH_TEMPLATE else {"role": "平民", "word": "苹果"}
+    prompt = template.compile(HISTORY, speeches(8), budget=budget, **fields)
+    assert prompt.truncated
+    assert_within_budget(prompt, budget)
+    assert prompt.text.startswith(prompt.prefix)
+
+
+def test_under_budget_prompt_is_untouched():
+    prompt = SPEECH_TEMPLATE.compile("无", {1: "圆的", 2: "甜的"}, budget=3000, game_round=1, word="苹果")
+    assert not prompt.truncated
+    assert "玩家1发言：圆的\n玩家2发言：甜的" in prompt.text
+
+
+def test_static_prefix_identical_across_players():
+    manager = UnderCoverGameManager()
+    state = manager.initialize_game(num_humans=0, seed=3, table=TableConfig(8, 2, 1))
+    players = list(state["players"])
+    round_speech = speeches(len(players), "一种常见的东西")
+    history = "第1轮（摘要）：玩家0：一种常见的东西；无人淘汰"
+
+    speech_prompts = {
+        player.id: manager.compile_speech_prompt(
+            player, {pid: s for pid, s in round_speech.items() if pid < player.id}, 2, history,
+        )
+        for player in players
+    }
+    # 所有玩家共用同一静态段；同一词语的玩家整个前缀逐字节一致，只有发言段不同
+    for player in players:
+        prompt = speech_prompts[player.id]
+        assert prompt.text.encode().startswith(SPEECH_TEMPLATE.static.encode())
+        assert prompt.text.startswith(prompt.prefix)
+    for role in PlayerRole:
+        prefixes = {speech_prompts[p.id].prefix.encode() for p in players if p.player_role == role}
+        assert len(prefixes) == 1
+        assert next(iter(prefixes)) == manager.get_player_speech_prefix(
+            next(p for p in players if p.player_role == role), 2, history,
+        ).encode()
+
+    ballot = [player.id for player in players]
+    vote_prompts = [manager.compile_vote_prompt(player, round_speech, ballot, history) for player in players]
+    assert all(prompt.text.encode().startswith(VOTE_TEMPLATE.static.encode()) for prompt in vote_prompts)
+
+
+def test_long_speeches_truncated_before_history():
+    full = SPEECH_TEMPLATE.compile(HISTORY, speeches(6), budget=10 ** 6, game_round=3, word="苹果")
+    budget = full.prefix_tokens + 300
+    assert full.tokens > budget
+
+    prompt = SPEECH_TEMPLATE.compile(HISTORY, speeches(6), budget=budget, game_round=3, word="苹果")
+    assert prompt.truncated
+    assert_within_budget(prompt, budget)
+    # 只截短发言（末尾），前缀与历史保持不变，前缀缓存不受影响
+    assert prompt.prefix == full.prefix
+    assert "…" in prompt.text
+    assert LONG_SPEECH not in prompt.text
+
+
+def test_history_dropped_from_oldest_when_speeches_are_not_enough():
+    budget = SPEECH_TEMPLATE.static_tokens + 300
+    prompt = SPEECH_TEMPLATE.compile(HISTORY, speeches(8), budget=budget, game_round=16, word="苹果")
+    assert_within_budget(prompt, budget)
+    assert "（更早的回合已省略）" in prompt.prefix
+    assert "第1轮" not in prompt.prefix
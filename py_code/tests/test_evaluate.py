@@ -0,0 +1,49 @@
+"""
+File: test_evaluate.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+自博弈评估测试：座位偏差统计覆盖每局全部卧底与白板座位；没有对局记录时返回空报告
+"""
+import numpy as np
+
+from src.app.evaluate import evaluate, print_report
+from src.app.records import BLANK, NORMAL, UNDERCOVER, GameRecords
+
+
+def make_records(roles: list[list[int]], winners: list[int]) -> GameRecords:
+    count, players = len(roles), len(roles[0])
+    return GameRecords(
+        pairs=[("苹果", "梨")],
+        seed=np.arange(count, dtype=np.int64),
+        pair=np.zeros(count, dtype=np.int32),
+        num_players=np.full(count, players, dtype=np.int16),
+        roles=np.array(roles, dtype=np.int8),
+        winner=np.array(winners, dtype=np.int8),
+        rounds=np.ones(count, dtype=np.int16),
+        eliminated=np.full((count, 1), -1, dtype=np.int16),
+        votes=np.full((count, 1, players), -1, dtype=np.int16),
+    )
+
+
+def test_seat_bias_counts_every_undercover_and_blank_seat():
+    records = make_records(
+        [
+            [NORMAL, UNDERCOVER, NORMAL, UNDERCOVER, NORMAL, BLANK],
+            [UNDERCOVER, NORMAL, BLANK, NORMAL, NORMAL, NORMAL],
+            [NORMAL, NORMAL, NORMAL, UNDERCOVER, NORMAL, NORMAL],
+        ],
+        [UNDERCOVER, NORMAL, BLANK],
+    )
+    seats = evaluate(records)["seat_bias"]["seats"]
+    assert [seat["undercover_games"] for seat in seats] == [1, 1, 1, 2, 0, 1]
+    # 白板获胜计入卧底方
+    assert [seat["undercover_win_rate"] for seat in seats] == [0.0, 1.0, 0.0, 1.0, None, 1.0]
+
+
+def test_empty_records_report(capsys):
+    result = evaluate(GameRecords.empty())
+    assert result["games"] == 0
+    assert result["seat_bias"]["seats"] == []
+    assert result["pair_difficulty"] == []
+    print_report(result)
+    assert "没有对局记录" in capsys.readouterr().out
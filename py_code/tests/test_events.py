@@ -0,0 +1,117 @@
+"""
+File: test_events.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+游戏事件测试：一局全AI对局的事件类型与顺序；JSONL输出端写出的每行都可解析，且与内存中的事件一致
+"""
+import json
+import os
+import re
+
+import pytest
+
+from src.agents.fake import FakeChatModel
+from src.agents.llm import override_llm
+from src.graph import events
+from src.graph.builder import GAME_RECURSION_LIMIT, get_game_graph
+from src.graph.types import TableConfig, UnderCoverGameManager
+
+# 一局的事件序列（连续的发言分块合并为一个 speech_token）
+_ROUND = (
+    r"round_started (?:speech_started (?:speech_token )?speech_done )+"
+    r"(?:voting_started (?:vote_started )+(?:vote_cast )+vote_tallied (?:revote )?)+elimination "
+)
+GAME_PATTERN = re.compile(rf"(?:{_ROUND})+game_over ")
+
+
+class ListSink:
+    def __init__(self):
+        self.events: list[events.GameEvent] = []
+
+    def handle(self, event: events.GameEvent) -> None:
+        self.events.append(event)
+
+    def flush(self) -> None:
+        pass
+
+
+@pytest.fixture
+def bus_with():
+    """以给定输出端替换事件总线，结束后恢复"""
+    previous = events.get_event_bus()
+
+    def install(*sinks) -> events.EventBus:
+        bus = events.EventBus(sinks)
+        events.set_event_bus(bus)
+        return bus
+
+    yield install
+    events.set_event_bus(previous)
+
+
+def play(seed: int, game_id: str | None = None) -> dict:
+    state = UnderCoverGameManager().initialize_game(num_humans=0, seed=seed, table=TableConfig(6, 1, 0))
+    token = events.current_game.set(game_id)
+    try:
+        with override_llm(FakeChatModel(seed=seed, ttft_ms=0, tokens_per_sec=0)):
+            return get_game_graph().invoke(state, {"recursion_limit": GAME_RECURSION_LIMIT})
+    finally:
+        events.current_game.reset(token)
+
+
+def kinds(game_events: list) -> str:
+    names = [event.kind if isinstance(event, events.GameEvent) else event["type"] for event in game_events]
+    collapsed = [name for i, name in enumerate(names) if not (name == "speech_token" and names[i - 1] == name)]
+    return "".join(f"{name} " for name in collapsed)
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_game_event_order(bus_with, seed):
+    sink = ListSink()
+    bus_with(sink)
+    final = play(seed)
+
+    assert GAME_PATTERN.fullmatch(kinds(sink.events)), kinds(sink.events)
+    rounds = [e for e in sink.events if isinstance(e, events.RoundStarted)]
+    assert [e.round for e in rounds] == list(range(1, len(rounds) + 1))
+    assert sink.events[-1].rounds == final["current_round"] == len(rounds)
+
+    # 每回合每位存活玩家发言一次；每次投票（含重投）每位存活玩家投一票
+    for started in rounds:
+        segment_start = sink.events.index(started)
+        following = sink.events[segment_start + 1:]
+        end = next((i for i, e in enumerate(following) if isinstance(e, events.Elimination)), len(following))
+        segment = following[:end]
+        speakers = [e.player_name for e in segment if isinstance(e, events.SpeechStarted)]
+        assert speakers == started.alive
+        votings = sum(isinstance(e, events.VotingStarted) for e in segment)
+        assert sum(isinstance(e, events.VoteCast) for e in segment) == votings * len(started.alive)
+        # 发言分块属于正在发言的玩家
+        speaker = None
+        for event in segment:
+            if isinstance(event, events.SpeechStarted):
+                speaker = event.player_id
+            elif isinstance(event, (events.SpeechToken, events.SpeechDone)):
+                assert event.player_id == speaker
+
+
+def test_jsonl_sink_output_parses(bus_with, tmp_path):
+    memory = ListSink()
+    jsonl = events.JsonlSink(str(tmp_path / "events-{pid}.jsonl"), flush_every=7)
+    bus = bus_with(memory, jsonl)
+    play(4, game_id="game-4")
+    bus.flush()
+
+    path = tmp_path / f"events-{os.getpid()}.jsonl"
+    assert jsonl.path == str(path)
+    lines = path.read_text(encoding="utf-8").splitlines()
+    records = [json.loads(line) for line in lines]
+    assert len(records) == len(memory.events)
+    assert kinds(records) == kinds(memory.events)
+    for record, event in zip(records, memory.events):
+        assert record["game"] == "game-4"
+        assert isinstance(record["ts"], float)
+        expected = json.loads(json.dumps(event.as_dict(), ensure_ascii=False))
+        assert {key: value for key, value in record.items() if key not in ("ts", "game")} == expected
+    # 时间戳按写入顺序不减
+    assert all(a["ts"] <= b["ts"] for a, b in zip(records, records[1:]))
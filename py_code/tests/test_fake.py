@@ -0,0 +1,57 @@
+"""
+File: test_fake.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+模拟模型测试：模拟429由种子、提示词与请求次数决定，可复现，且重试不会一直得到同样的结果
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.agents.fake import FakeChatModel, FakeRateLimitError
+
+PROMPTS = [f"玩家{i}的发言：一种常见的东西" for i in range(20)]
+
+
+def outcomes(model: FakeChatModel, prompt: str, attempts: int = 8) -> list[bool]:
+    """同一提示词连续请求，返回每次是否被限流"""
+    results = []
+    for _ in range(attempts):
+        try:
+            model.invoke(prompt)
+            results.append(False)
+        except FakeRateLimitError:
+            results.append(True)
+    return results
+
+
+def make(seed: int = 1, rate_limit: float = 0.5) -> FakeChatModel:
+    return FakeChatModel(seed=seed, ttft_ms=0, tokens_per_sec=0, rate_limit=rate_limit)
+
+
+def test_rate_limit_reproducible_for_same_seed():
+    first, second = make(), make()
+    assert [outcomes(first, p) for p in PROMPTS] == [outcomes(second, p) for p in PROMPTS]
+    assert [outcomes(make(seed=1), p) for p in PROMPTS] != [outcomes(make(seed=2), p) for p in PROMPTS]
+
+
+def test_retries_get_different_outcomes():
+    model = make()
+    sequences = [outcomes(model, p) for p in PROMPTS]
+    # 限流的请求重试后可以成功，而不是每次都得到同样的结果
+    assert any(True in seq and False in seq for seq in sequences)
+    assert 0.3 < sum(map(sum, sequences)) / sum(map(len, sequences)) < 0.7
+
+
+def test_rate_limit_independent_of_call_order():
+    sequential = {p: outcomes(make(), p) for p in PROMPTS}
+    model = make()
+    order = PROMPTS[::-1]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        concurrent = dict(zip(order, pool.map(lambda p: outcomes(model, p), order)))
+    assert concurrent == sequential
+
+
+@pytest.mark.parametrize("rate_limit", [0.0, 1.0])
+def test_rate_limit_bounds(rate_limit):
+    assert set(outcomes(make(rate_limit=rate_limit), PROMPTS[0])) == {rate_limit == 1.0}
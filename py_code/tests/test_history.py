@@ -0,0 +1,67 @@
+"""
+File: test_history.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+游戏历史测试：窗口外的回合压缩为摘要、摘要条数有上限，提示词中的历史长度不随回合数增长
+"""
+from src.graph import history
+from src.graph.history import GameHistory
+
+
+def round_entry(game_round: int, players: int = 6) -> dict:
+    return {
+        "round": game_round,
+        "eliminated_id": None,
+        "eliminated_name": None,
+        "eliminated_role": None,
+        "speeches": {player_id: f"第{game_round}轮玩家{player_id}的发言，" * 5 for player_id in range(players)},
+        "votes": {player_id: (player_id + 1) % players for player_id in range(players)},
+    }
+
+
+def test_only_rounds_past_window_are_summarized(monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_WINDOW", 2)
+    monkeypatch.setattr(history, "HISTORY_MAX_SUMMARIES", 100)
+    game_history = GameHistory([{"words": ["苹果", "梨"]}])
+    for game_round in range(1, 6):
+        game_history.record_round(round_entry(game_round))
+
+    rounds = [entry for entry in game_history if "round" in entry]
+    assert [entry["round"] for entry in rounds] == [1, 2, 3, 4, 5]
+    # 最近2回合保留完整发言与投票，更早的回合只有摘要
+    assert all("summary" in entry and "speeches" not in entry for entry in rounds[:3])
+    assert all("speeches" in entry and "summary" not in entry for entry in rounds[3:])
+    assert rounds[-1] == round_entry(5)
+    # 不在回合窗口中的记录（开局信息）保持不变
+    assert game_history[0] == {"words": ["苹果", "梨"]}
+    # 摘要中的发言按字数截断
+    assert "…" in rounds[0]["summary"]
+
+
+def test_summaries_are_capped(monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_WINDOW", 1)
+    monkeypatch.setattr(history, "HISTORY_MAX_SUMMARIES", 3)
+    game_history = GameHistory()
+    for game_round in range(1, 11):
+        game_history.record_round(round_entry(game_round))
+    # 只保留最近的3条摘要与1个完整回合
+    assert [entry["round"] for entry in game_history] == [7, 8, 9, 10]
+    assert ["summary" in entry for entry in game_history] == [True, True, True, False]
+
+
+def test_prompt_context_size_is_bounded(monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_WINDOW", 2)
+    monkeypatch.setattr(history, "HISTORY_MAX_SUMMARIES", 4)
+    game_history = GameHistory()
+    assert game_history.prompt_context() == "无"
+    sizes = []
+    for game_round in range(1, 31):
+        game_history.record_round(round_entry(game_round))
+        sizes.append(len(game_history.prompt_context()))
+    # 窗口与摘要都填满之后，历史长度不再增长
+    full = 2 + 4
+    assert max(sizes[full:]) <= max(sizes[:full]) * 1.1
+    assert len(game_history) == full
+    assert "第30轮：" in game_history.prompt_context()
+    assert "第25轮（摘要）" in game_history.prompt_context()
+    assert "第24轮" not in game_history.prompt_context()
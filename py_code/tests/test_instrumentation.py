@@ -0,0 +1,57 @@
+"""
+File: test_instrumentation.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+埋点测试：记录写入文件、内存中只保留汇总，批量模拟的分片追踪文件在结束时合并
+"""
+import json
+
+from src.app.simulate import run_simulation
+from src.graph.instrumentation import Tracer, merge_trace_files
+
+
+def test_tracer_streams_records_and_keeps_totals(tmp_path, capsys):
+    tracer = Tracer(str(tmp_path / "trace.jsonl"))
+    for _ in range(100):
+        with tracer.span("vote", round=1, player_id=0) as span:
+            span.set(prompt_tokens=10)
+            span.retry()
+    tracer.emit({"type": "node", "node": "collect_vote", "round": 1, "wall_ms": 2.0})
+    tracer.flush()
+
+    lines = (tmp_path / "trace.jsonl").read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 101
+    assert tracer.calls["vote"].count == 100
+    assert tracer.calls["vote"].retries == 100
+    assert tracer.nodes["collect_vote"] == [1, 2.0]
+
+    tracer.print_summary()
+    assert "collect_vote" in capsys.readouterr().out
+    # 汇总后清空累计值
+    assert not tracer.calls and not tracer.nodes
+
+
+def test_merge_trace_files(tmp_path):
+    parts = []
+    for index in range(3):
+        part = tmp_path / f"trace.jsonl.{index}.part"
+        part.write_text(json.dumps({"part": index}) + "\n", encoding="utf-8")
+        parts.append(str(part))
+    merged = tmp_path / "trace.jsonl"
+    merge_trace_files(str(merged), parts + parts[:1])
+    assert [json.loads(line)["part"] for line in merged.read_text(encoding="utf-8").splitlines()] == [0, 1, 2]
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_simulation_workers_write_separate_traces(tmp_path, monkeypatch):
+    path = tmp_path / "trace.jsonl"
+    monkeypatch.setenv("GAME_TRACE", str(path))
+    monkeypatch.setenv("LLM_BACKEND", "fake")
+    monkeypatch.setenv("FAKE_LLM_TTFT_MS", "0")
+    monkeypatch.setenv("FAKE_LLM_TOKENS_PER_SEC", "0")
+    stats, _ = run_simulation(games=4, workers=2, concurrency=2)
+    assert stats.games == 4
+    assert 1 <= len(stats.trace_files) <= 2
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert any(record["type"] == "node" for record in records)
+    assert not list(tmp_path.glob("*.part"))
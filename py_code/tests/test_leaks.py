@@ -0,0 +1,54 @@
+"""
+File: test_leaks.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+发言泄词检测测试：自动机多模式匹配、跨分块检测，以及泄露的词语不会出现在输出中
+"""
+from src.graph.leaks import LeakScanner, WordAutomaton, forbidden_words, scanner
+from src.graph.types import Player, PlayerRole, PlayerType
+
+
+def feed_all(scan: LeakScanner, chunks: list[str]) -> str:
+    visible = ""
+    for chunk in chunks:
+        visible += scan.feed(chunk)
+        if scan.leak is not None:
+            return visible
+    return visible + scan.flush()
+
+
+def test_clean_speech_passes_through_unchanged():
+    scan = LeakScanner(WordAutomaton(["西瓜", "冬瓜", "苹果"]), frozenset(["西瓜"]))
+    chunks = ["这是一种", "夏天常吃的", "水果，西", "边的瓜摊"]
+    assert feed_all(scan, chunks) == "".join(chunks)
+    assert scan.leak is None
+
+
+def test_leak_split_across_chunks_is_caught_before_output():
+    scan = LeakScanner(WordAutomaton(["西瓜", "冬瓜"]), frozenset(["西瓜"]))
+    visible = feed_all(scan, ["我觉得是西", "瓜，很甜"])
+    assert scan.leak == "西瓜"
+    assert "西" not in visible
+    assert visible == "我觉得是"
+
+
+def test_other_players_words_are_allowed():
+    scan = LeakScanner(WordAutomaton(["西瓜", "冬瓜"]), frozenset(["西瓜"]))
+    assert feed_all(scan, ["不是冬瓜"]) == "不是冬瓜"
+    assert scan.leak is None
+
+
+def test_overlapping_patterns_use_fail_links():
+    automaton = WordAutomaton(["he", "she", "hers"])
+    scan = LeakScanner(automaton, frozenset(["he"]))
+    feed_all(scan, ["ushe"])
+    # she 的回退链上结尾的 he 也能被识别
+    assert scan.leak == "he"
+
+
+def test_scanner_for_words_outside_store_and_blank_player():
+    scan = scanner(frozenset(["不在词库里的词"]))
+    feed_all(scan, ["这句话包含不在词库里的词"])
+    assert scan.leak == "不在词库里的词"
+    blank = Player(id=0, name="AI1", player_type=PlayerType.AI, player_role=PlayerRole.BLANK, word="")
+    assert forbidden_words(blank) == frozenset()
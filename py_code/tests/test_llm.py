@@ -0,0 +1,65 @@
+"""
+File: test_llm.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+前缀预热测试：推理模型用 max_completion_tokens 限制输出，其他模型用 max_tokens；预热失败时记录日志而不抛出
+"""
+import logging
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from src.agents.cache import CachedLLM, LRUCache
+from src.agents.llm import override_llm, warm_prefix
+from src.agents.resilience import ResilientLLM
+
+
+class RecordingLLM:
+    """记录每次调用的请求参数，可指定模型名与要抛出的异常"""
+
+    def __init__(self, model_name: str | None = None, error: Exception | None = None):
+        if model_name is not None:
+            self.model_name = model_name
+        self.error = error
+        self.calls: list[dict] = []
+
+    def invoke(self, prompt, **kwargs):
+        self.calls.append(kwargs)
+        if self.error is not None:
+            raise self.error
+        return AIMessage(content="好")
+
+
+@pytest.mark.parametrize(
+    "model_name, key",
+    [
+        ("gpt-5-mini", "max_completion_tokens"),
+        ("o3-mini", "max_completion_tokens"),
+        ("openai/o4-mini", "max_completion_tokens"),
+        ("gpt-4o-mini", "max_tokens"),
+        ("deepseek-chat", "max_tokens"),
+        (None, "max_tokens"),
+    ],
+)
+def test_warm_prefix_output_limit(model_name, key):
+    client = RecordingLLM(model_name)
+    with override_llm(client):
+        warm_prefix("前缀")
+    assert client.calls == [{key: 1}]
+
+
+def test_warm_prefix_reads_model_through_wrappers():
+    client = RecordingLLM("gpt-5-mini")
+    wrapped = CachedLLM(ResilientLLM(client, max_retries=0), LRUCache())
+    with override_llm(wrapped):
+        warm_prefix("前缀")
+    assert client.calls == [{"max_completion_tokens": 1}]
+
+
+def test_warm_prefix_logs_failures(caplog):
+    client = RecordingLLM("gpt-5-mini", error=RuntimeError("参数不受支持"))
+    with override_llm(client), caplog.at_level(logging.WARNING, logger="src.agents.llm"):
+        warm_prefix("前缀")
+    assert len(client.calls) == 1
+    assert "提示词前缀预热失败" in caplog.text
+    assert "参数不受支持" in caplog.text
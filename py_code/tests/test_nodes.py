@@ -0,0 +1,182 @@
+"""
+File: test_nodes.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+游戏节点测试：interrupt 模式恢复时请求输入前的操作不能重复；AI投票共用截止时间，迟到的结果没有副作用
+"""
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.types import Command
+
+from src.agents.fake import FakeChatModel
+from src.agents.llm import override_llm
+from src.graph import events, instrumentation, nodes, votes
+from src.graph.builder import GAME_RECURSION_LIMIT, build_game_graph
+from src.graph.checkpoint import CompactSerializer
+from src.graph.instrumentation import Tracer
+from src.graph.suspicion import VoteMode
+from src.graph.types import PlayerType, UnderCoverGameManager
+
+
+class CaptureSink:
+    def __init__(self):
+        self.events: list[events.GameEvent] = []
+
+    def handle(self, event: events.GameEvent) -> None:
+        self.events.append(event)
+
+    def flush(self) -> None:
+        pass
+
+
+@pytest.fixture
+def sink():
+    capture = CaptureSink()
+    previous = events.get_event_bus()
+    events.set_event_bus(events.EventBus([capture]))
+    yield capture
+    events.set_event_bus(previous)
+
+
+def play_interrupt_game(seed: int = 3, client=None, on_interrupt=None) -> dict:
+    """以 interrupt 模式运行一局（1位人类玩家），人类发言固定、投票给第一个候选人，返回终局状态
+
+    :param on_interrupt: 每次作答前以挂起内容为参数调用
+    """
+    state = UnderCoverGameManager().initialize_game(num_humans=1, seed=seed)
+    graph = build_game_graph(InMemorySaver(serde=CompactSerializer()))
+    config = {
+        "configurable": {"thread_id": f"test-{seed}", "human_input": "interrupt"},
+        "recursion_limit": GAME_RECURSION_LIMIT,
+    }
+    payload = state
+    with override_llm(client or FakeChatModel(seed=seed, ttft_ms=0, tokens_per_sec=0)):
+        while True:
+            pending = None
+            for chunk in graph.stream(payload, config, stream_mode="updates"):
+                if "__interrupt__" in chunk:
+                    pending = chunk["__interrupt__"][0].value
+            if pending is None:
+                return graph.get_state(config).values
+            if on_interrupt is not None:
+                on_interrupt(pending)
+            answer = "一种常见的东西" if pending["kind"] == "speech" else str(pending["candidates"][0])
+            payload = Command(resume=answer)
+
+
+def test_prefetch_not_repeated_on_resume(monkeypatch):
+    prefetched = []
+    monkeypatch.setattr(nodes, "SPEECH_PREFETCH", True)
+    monkeypatch.setattr(
+        nodes, "_prefetch_next_speaker",
+        lambda manager, player, game_round, history, sent: prefetched.append((game_round, player.id)),
+    )
+    play_interrupt_game()
+    assert prefetched
+    assert len(prefetched) == len(set(prefetched))
+
+
+def test_human_events_emitted_once_per_input(sink):
+    final = play_interrupt_game()
+    human = next(player for player in final["players"] if player.player_type == PlayerType.HUMAN)
+
+    speech_started = [(e.round, e.turn) for e in sink.events if isinstance(e, events.SpeechStarted)]
+    assert len(speech_started) == len(set(speech_started))
+    human_speeches = [e for e in sink.events if isinstance(e, events.SpeechStarted) and e.player_id == human.id]
+    assert human_speeches
+
+    # 每次投票（含重投）从投票开始事件起：至少有一张投出的票，人类玩家的投票开始事件至多一次
+    segments: list[list[events.GameEvent]] = []
+    for event in sink.events:
+        if isinstance(event, events.VotingStarted):
+            segments.append([])
+        elif segments:
+            segments[-1].append(event)
+    assert segments
+    for segment in segments:
+        assert any(isinstance(e, events.VoteCast) for e in segment)
+        assert sum(isinstance(e, events.VoteStarted) and e.player_id == human.id for e in segment) <= 1
+
+
+class CountingLLM:
+    """统计投票请求（invoke）次数的客户端包装"""
+
+    def __init__(self, client):
+        self.client = client
+        self.invokes = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt, **kwargs):
+        with self._lock:
+            self.invokes += 1
+        return self.client.invoke(prompt, **kwargs)
+
+    def stream(self, prompt, **kwargs):
+        return self.client.stream(prompt, **kwargs)
+
+
+def test_interrupt_ai_votes_run_while_waiting_for_human(monkeypatch, sink):
+    monkeypatch.setattr(nodes, "VOTE_MODE", VoteMode.LLM)
+    monkeypatch.setattr(nodes, "VOTE_MAX_RETRIES", 0)
+    client = CountingLLM(FakeChatModel(seed=3, ttft_ms=0, tokens_per_sec=0))
+    waiting_votes = []
+
+    def on_interrupt(pending):
+        if pending["kind"] != "vote":
+            return
+        # 人类玩家尚未作答时，AI投票已经提交并完成
+        deadline = time.monotonic() + 2
+        while client.invokes == sum(waiting_votes) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        waiting_votes.append(client.invokes - sum(waiting_votes))
+
+    play_interrupt_game(client=client, on_interrupt=on_interrupt)
+    assert waiting_votes and all(waiting_votes)
+    # 恢复执行时取回同一批投票，每位AI玩家每次投票只请求一次
+    ai_vote_started = sum(isinstance(e, events.VoteStarted) and not e.human for e in sink.events)
+    assert client.invokes == ai_vote_started
+    assert not nodes._pending_ai_votes
+
+
+class SlowVoteLLM:
+    """每次调用耗时 delay 秒、投给1号玩家的客户端，记录已发出的调用数"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.started = 0
+
+    def invoke(self, prompt, **kwargs):
+        self.started += 1
+        time.sleep(self.delay)
+        return AIMessage(content='{"vote": 1}')
+
+
+def test_votes_share_one_deadline_and_drop_late_results(monkeypatch, sink, tmp_path):
+    monkeypatch.setattr(nodes, "VOTE_TIMEOUT", 0.2)
+    monkeypatch.setattr(nodes, "VOTE_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(nodes, "VOTE_MODE", VoteMode.LLM)
+    tracer = Tracer(str(tmp_path / "trace.jsonl"))
+    monkeypatch.setattr(instrumentation, "_tracer", tracer)
+    state = UnderCoverGameManager().initialize_game(num_humans=0, seed=5)
+    state["round_speech"] = {player.id: f"玩家{player.id}的发言" for player in state["players"]}
+    client = SlowVoteLLM(0.15)
+
+    with override_llm(client):
+        start = time.perf_counter()
+        result = nodes.collect_vote_node(state, {})
+        elapsed = time.perf_counter() - start
+        started, stats, traced = client.started, votes.get_vote_stats().as_dict(), tracer.calls["vote"].count
+        # 等待截止时仍在进行的调用返回
+        time.sleep(0.4)
+
+    # 逐个座位等待时最坏为 座位数 × VOTE_TIMEOUT；共用截止时间只等待一次
+    assert elapsed < 0.4
+    assert len(result["round_votes"]) == len(state["players"])
+    # 迟到的结果没有任何副作用，截止后也不再发出新的调用
+    assert client.started == started
+    assert votes.get_vote_stats().as_dict() == stats
+    assert tracer.calls["vote"].count == traced
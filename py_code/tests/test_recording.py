@@ -0,0 +1,100 @@
+"""
+File: test_recording.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+录制与回放测试：录制的对局（含人类玩家）回放时不调用模型、结果一致；日志缺失调用时按请求失败继续回放；回放时投票重试不退避等待
+"""
+import builtins
+import itertools
+import json
+import time
+
+import pytest
+
+from src.agents.fake import FakeChatModel
+from src.agents.llm import override_llm
+from src.graph import events, nodes, recording
+from src.graph.builder import GAME_RECURSION_LIMIT, get_game_graph
+from src.graph.recording import Recorder, load_games, replay_games
+from src.graph.suspicion import VoteMode
+from src.graph.types import UnderCoverGameManager
+
+
+@pytest.fixture
+def record_log(tmp_path, monkeypatch):
+    """录制三局（其中一局有人类玩家），返回日志路径"""
+    path = tmp_path / "games.jsonl"
+    answers = itertools.cycle(["是一种常见的东西", "1", "很多人都有", ""])
+    monkeypatch.setattr(builtins, "input", lambda prompt="": next(answers))
+    previous_bus = events.get_event_bus()
+    events.set_event_bus(events.EventBus())
+    recording.set_recorder(Recorder(str(path)))
+    try:
+        with override_llm(FakeChatModel(seed=2, ttft_ms=0, tokens_per_sec=0)):
+            for seed, humans in [(1, 0), (2, 1), (3, 0)]:
+                state = UnderCoverGameManager().initialize_game(num_humans=humans, seed=seed)
+                token = events.current_game.set(str(seed))
+                try:
+                    get_game_graph().invoke(state, {"recursion_limit": GAME_RECURSION_LIMIT})
+                finally:
+                    events.current_game.reset(token)
+    finally:
+        recording.set_recorder(recording.NullRecorder())
+        events.set_event_bus(previous_bus)
+    monkeypatch.setattr(builtins, "input", lambda prompt="": pytest.fail("回放时不应读取输入"))
+    return path
+
+
+def test_replay_matches_recording_without_model(record_log):
+    games = load_games(str(record_log))
+    assert len(games) == 3
+    results = replay_games(games)
+    assert all(result.matched for result in results)
+    assert all(result.stats.misses == 0 and result.stats.diverged == 0 for result in results)
+    assert sum(result.stats.calls for result in results) > 0
+
+
+def test_missing_calls_count_as_failures(record_log):
+    lines = record_log.read_text(encoding="utf-8").splitlines()
+    # 删掉第一局的第一条LLM记录：该调用按请求失败处理，回放照常结束
+    first_llm = next(index for index, line in enumerate(lines) if json.loads(line)["t"] == "l")
+    record_log.write_text("\n".join(lines[:first_llm] + lines[first_llm + 1:]) + "\n", encoding="utf-8")
+    results = replay_games(load_games(str(record_log)))
+    assert len(results) == 3
+    assert sum(result.stats.misses for result in results) >= 1
+
+
+def test_replay_skips_vote_retry_backoff(tmp_path, monkeypatch):
+    """录制时投票回答全部无法解析（每票都重试后兜底），回放时不按退避时间等待"""
+    path = tmp_path / "retries.jsonl"
+    monkeypatch.setattr(nodes, "VOTE_MODE", VoteMode.LLM)
+    monkeypatch.setattr(nodes, "VOTE_RETRY_BACKOFF", 0)
+
+    class UnsureLLM(FakeChatModel):
+        def invoke(self, prompt, **kwargs):
+            message = super().invoke(prompt, **kwargs)
+            message.content = "我还没想好"
+            return message
+
+    previous_bus = events.get_event_bus()
+    events.set_event_bus(events.EventBus())
+    recording.set_recorder(Recorder(str(path)))
+    try:
+        with override_llm(UnsureLLM(seed=2, ttft_ms=0, tokens_per_sec=0)):
+            state = UnderCoverGameManager().initialize_game(num_humans=0, seed=5)
+            token = events.current_game.set("5")
+            try:
+                get_game_graph().invoke(state, {"recursion_limit": GAME_RECURSION_LIMIT})
+            finally:
+                events.current_game.reset(token)
+    finally:
+        recording.set_recorder(recording.NullRecorder())
+        events.set_event_bus(previous_bus)
+
+    monkeypatch.setattr(nodes, "VOTE_RETRY_BACKOFF", 5)
+    monkeypatch.setattr(nodes, "VOTE_TIMEOUT", 60)
+    start = time.perf_counter()
+    results = replay_games(load_games(str(path)))
+    assert time.perf_counter() - start < 3
+    assert [result.matched for result in results] == [True]
+    assert results[0].stats.misses == 0
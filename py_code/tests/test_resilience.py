@@ -0,0 +1,211 @@
+"""
+File: test_resilience.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+弹性中间层测试：熔断器状态机（含半开试探的各种结束方式）、自适应并发与令牌桶
+"""
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from src.agents.llm import abandoned
+from src.agents.resilience import (
+    AdaptiveLimiter,
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    ResilientLLM,
+    TokenBucket,
+)
+
+RESET = 0.05
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class ScriptedLLM:
+    """按脚本依次返回结果的客户端：异常实例则抛出，字符串则作为响应"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    def invoke(self, prompt, **kwargs):
+        return AIMessage(content=self._next())
+
+    def stream(self, prompt, **kwargs):
+        outcome = self._next()
+        for text in outcome.split(" "):
+            yield AIMessageChunk(content=text)
+
+
+def make_llm(client, **kwargs) -> ResilientLLM:
+    options = dict(max_retries=0, backoff=0.001, breaker_threshold=2, breaker_reset=RESET, timeout=5)
+    options.update(kwargs)
+    return ResilientLLM(client, **options)
+
+
+def open_breaker(llm: ResilientLLM) -> None:
+    """两次5xx打开熔断器，再等到冷却结束（下一次调用为半开试探）"""
+    for _ in range(2):
+        with pytest.raises(StatusError):
+            llm.invoke("hi")
+    assert llm.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        llm.invoke("hi")
+    time.sleep(RESET * 1.5)
+
+
+def assert_recovers(llm: ResilientLLM) -> None:
+    """熔断器没有卡在半开：冷却后的试探成功即关闭"""
+    time.sleep(RESET * 1.5)
+    assert llm.invoke("hi").content == "ok"
+    assert llm.breaker.state == CircuitBreaker.CLOSED
+
+
+# ==================== 熔断器 ====================
+def test_breaker_opens_and_probe_success_closes():
+    llm = make_llm(ScriptedLLM(StatusError(500), StatusError(500)))
+    open_breaker(llm)
+    assert llm.invoke("hi").content == "ok"
+    assert llm.breaker.state == CircuitBreaker.CLOSED
+    assert llm.metrics.breaker_trips == 1
+
+
+def test_probe_transient_error_reopens():
+    llm = make_llm(ScriptedLLM(StatusError(500), StatusError(500), StatusError(503)))
+    open_breaker(llm)
+    with pytest.raises(StatusError):
+        llm.invoke("hi")
+    assert llm.breaker.state == CircuitBreaker.OPEN
+    assert_recovers(llm)
+
+
+def test_probe_rate_limited_reopens():
+    llm = make_llm(ScriptedLLM(StatusError(500), StatusError(500), StatusError(429)))
+    open_breaker(llm)
+    with pytest.raises(StatusError):
+        llm.invoke("hi")
+    assert llm.breaker.state == CircuitBreaker.OPEN
+    assert_recovers(llm)
+
+
+def test_probe_non_transient_error_reopens():
+    llm = make_llm(ScriptedLLM(StatusError(500), StatusError(500), ValueError("bad request")))
+    open_breaker(llm)
+    with pytest.raises(ValueError):
+        llm.invoke("hi")
+    assert llm.breaker.state == CircuitBreaker.OPEN
+    assert_recovers(llm)
+
+
+def test_probe_deadline_exceeded_reopens():
+    class SlowStream(ScriptedLLM):
+        def stream(self, prompt, **kwargs):
+            self._next()
+            time.sleep(0.05)
+            yield AIMessageChunk(content="slow")
+
+    llm = make_llm(SlowStream(StatusError(500), StatusError(500)), timeout=0.02)
+    open_breaker(llm)
+    with pytest.raises(DeadlineExceeded):
+        list(llm.stream("hi"))
+    assert llm.breaker.state == CircuitBreaker.OPEN
+    llm.timeout = 5
+    assert_recovers(llm)
+
+
+def test_probe_stream_closed_early_releases_probe():
+    llm = make_llm(ScriptedLLM(StatusError(500), StatusError(500), "a b c"))
+    open_breaker(llm)
+    stream = llm.stream("hi")
+    assert next(stream).content == "a"
+    stream.close()
+    assert llm.breaker.state == CircuitBreaker.HALF_OPEN
+    assert llm.concurrency.in_flight == 0
+    # 试探名额已释放，下一次调用可以再次试探
+    assert llm.invoke("hi").content == "ok"
+    assert llm.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_probe_interrupted_releases_probe():
+    llm = make_llm(ScriptedLLM(StatusError(500), StatusError(500), KeyboardInterrupt()))
+    open_breaker(llm)
+    with pytest.raises(KeyboardInterrupt):
+        llm.invoke("hi")
+    assert llm.breaker.state == CircuitBreaker.HALF_OPEN
+    assert llm.concurrency.in_flight == 0
+    assert llm.invoke("hi").content == "ok"
+    assert llm.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_only_one_probe_in_half_open():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=RESET)
+    assert breaker.on_failure()
+    time.sleep(RESET * 1.5)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
+
+
+def test_closed_breaker_ignores_non_transient_failures():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=RESET)
+    assert not breaker.on_failure(transient=False)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+# ==================== 自适应并发与令牌桶 ====================
+def test_adaptive_limiter_halves_on_rate_limit_with_cooldown():
+    limiter = AdaptiveLimiter(max_limit=8, min_limit=1)
+    assert limiter.on_rate_limited()
+    assert limiter.limit == 4
+    # 冷却期内的429不再继续减半
+    assert not limiter.on_rate_limited()
+    assert limiter.limit == 4
+
+
+def test_adaptive_limiter_increases_additively():
+    limiter = AdaptiveLimiter(max_limit=8, min_limit=1)
+    limiter.on_rate_limited()
+    for _ in range(4):
+        limiter.acquire(float("inf"))
+        limiter.release()
+        limiter.on_success()
+    assert limiter.limit == pytest.approx(5.0, abs=0.1)
+
+
+def test_token_bucket_disabled_and_deadline():
+    assert TokenBucket(0).acquire(100, time.monotonic()) == 0.0
+    bucket = TokenBucket(60)  # 每秒补充1个
+    assert bucket.acquire(60, float("inf")) == 0.0
+    with pytest.raises(DeadlineExceeded):
+        bucket.acquire(30, time.monotonic() + 0.05)
+
+
+def test_abandoned_request_not_retried():
+    client = ScriptedLLM(StatusError(500), "ok")
+    llm = make_llm(client, max_retries=3, breaker_threshold=10)
+    cancelled = threading.Event()
+    cancelled.set()
+    token = abandoned.set(cancelled)
+    try:
+        with pytest.raises(StatusError):
+            llm.invoke("hi")
+    finally:
+        abandoned.reset(token)
+    assert client.calls == 1
@@ -0,0 +1,32 @@
+"""
+File: test_simulate.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+批量模拟测试：逐局记录的收集不依赖游戏历史的保留窗口
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.agents.fake import FakeChatModel
+from src.agents.llm import override_llm
+from src.app.simulate import _run_games
+from src.graph import history
+
+
+@pytest.mark.parametrize("window", [0, 2])
+def test_records_collected_for_any_history_window(monkeypatch, window):
+    monkeypatch.setattr(history, "HISTORY_WINDOW", window)
+    with override_llm(FakeChatModel(seed=1, ttft_ms=0, tokens_per_sec=0)):
+        stats = asyncio.run(_run_games(4, seed=11, concurrency=2, collect_records=True))
+    assert stats.errors == 0, stats.error_samples
+    assert stats.games == 4
+    records = stats.records
+    assert len(records) == 4
+    # 每局每回合都有投票记录，同一玩家不会被淘汰两次
+    for game in range(len(records)):
+        for round_index in range(int(records.rounds[game])):
+            assert (records.votes[game, round_index] >= 0).any()
+        eliminated = records.eliminated[game][records.eliminated[game] >= 0]
+        assert len(np.unique(eliminated)) == len(eliminated)
@@ -0,0 +1,34 @@
+"""
+File: test_startup.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+冷启动测试：在全新解释器中导入入口模块，不加载模型客户端、游戏图与词语对仓库
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# 项目根目录（py_code），子进程在此目录下运行以导入 src 包
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# 导入 src.app.main 时不应加载的模块（开始游戏、编译游戏图时才加载）
+LAZY = ["langchain_openai", "langgraph", "src.graph.builder", "numpy", "src.constants.word_store"]
+
+
+@pytest.fixture(scope="module")
+def loaded_modules() -> set[str]:
+    code = "import json, sys\nimport src.app.main\nprint(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+    )
+    return set(json.loads(result.stdout.splitlines()[-1]))
+
+
+@pytest.mark.parametrize("module", LAZY)
+def test_main_import_is_lazy(loaded_modules, module):
+    assert "src.app.main" in loaded_modules
+    loaded = sorted(name for name in loaded_modules if name == module or name.startswith(f"{module}."))
+    assert not loaded, f"导入 src.app.main 时加载了 {loaded}"
@@ -0,0 +1,36 @@
+"""
+File: test_suspicion.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+本地可疑度评分测试：用字偏离多数人的发言得分最高，排序与投票确定
+"""
+import pytest
+
+from src.graph.suspicion import format_hint, local_vote, rank, score_speeches
+
+
+def test_outlier_speech_scores_highest():
+    speeches = {
+        0: "夏天吃的水果，红色的瓤，很甜",
+        1: "水果，瓤是红色的，夏天很解渴",
+        2: "冬天煮汤用的，皮是绿色的",
+        3: "红瓤的水果，夏天常吃，很甜",
+    }
+    scores = score_speeches(speeches)
+    assert max(scores, key=scores.get) == 2
+    assert all(0.0 <= score <= 1.0 for score in scores.values())
+
+
+def test_degenerate_inputs():
+    assert score_speeches({}) == {}
+    assert score_speeches({1: "只有一条发言"}) == {1: 0.0}
+    # 全部相同的发言互相完全相似
+    assert score_speeches({1: "一样", 2: "一样"}) == {1: pytest.approx(0.0), 2: pytest.approx(0.0)}
+
+
+def test_rank_and_local_vote_are_deterministic():
+    scores = {1: 0.5, 2: 0.9, 3: 0.5}
+    assert rank(scores, {1, 2, 3}) == [2, 1, 3]
+    assert local_vote(scores, {1, 3}) == 1
+    hint = format_hint(scores, {1, 2})
+    assert hint.index("玩家2") < hint.index("玩家1")
@@ -0,0 +1,135 @@
+"""
+File: test_types.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+牌桌配置测试：人数与卧底/白板数的校验；多卧底、白板时的胜负判定；按种子分配身份与词语可复现
+"""
+from collections import Counter
+
+import pytest
+
+from src.graph.types import (
+    MAX_PLAYERS,
+    MIN_PLAYERS,
+    Player,
+    PlayerRegistry,
+    PlayerRole,
+    PlayerType,
+    TableConfig,
+    UnderCoverGameManager,
+)
+
+
+# ==================== 牌桌配置校验 ====================
+@pytest.mark.parametrize("num_players", [MIN_PLAYERS, 10, MAX_PLAYERS])
+def test_valid_player_counts(num_players):
+    assert TableConfig(num_players, 1, 0).num_players == num_players
+
+
+@pytest.mark.parametrize("num_players", [0, MIN_PLAYERS - 1, MAX_PLAYERS + 1])
+def test_player_count_out_of_range(num_players):
+    with pytest.raises(ValueError, match="玩家数"):
+        TableConfig(num_players, 1, 0)
+
+
+@pytest.mark.parametrize(
+    "num_players, num_undercovers, num_blanks",
+    [(6, 3, 0), (8, 4, 0), (6, 2, 1), (7, 1, 3), (MAX_PLAYERS, 25, 0)],
+)
+def test_hidden_roles_must_be_outnumbered(num_players, num_undercovers, num_blanks):
+    with pytest.raises(ValueError, match="平民人数"):
+        TableConfig(num_players, num_undercovers, num_blanks)
+
+
+@pytest.mark.parametrize("num_undercovers, num_blanks", [(0, 0), (0, 1), (1, -1)])
+def test_undercover_and_blank_counts(num_undercovers, num_blanks):
+    with pytest.raises(ValueError, match="卧底"):
+        TableConfig(6, num_undercovers, num_blanks)
+
+
+def test_largest_valid_hidden_counts():
+    assert TableConfig(7, 2, 1).num_blanks == 1
+    assert TableConfig(MAX_PLAYERS, 12, 12).num_undercovers == 12
+
+
+# ==================== 胜负判定 ====================
+def make_registry(roles: list[PlayerRole]) -> PlayerRegistry:
+    return PlayerRegistry([
+        Player(id=i, name=f"AI{i}", player_type=PlayerType.AI, player_role=role) for i, role in enumerate(roles)
+    ])
+
+
+def test_winner_with_several_undercovers_and_blanks():
+    N, U, B = PlayerRole.NORMAL, PlayerRole.UNDERCOVER, PlayerRole.BLANK
+    # 0-4 平民，5-6 卧底，7 白板
+    registry = make_registry([N, N, N, N, N, U, U, B])
+    assert registry.winner() is None
+    # 淘汰一名卧底后仍有卧底与白板存活
+    registry.eliminate(5)
+    assert registry.winner() is None
+    # 平民（3）不多于卧底与白板之和（2）之前游戏继续
+    registry.eliminate(0)
+    registry.eliminate(1)
+    assert registry.winner() is None
+    registry.eliminate(2)
+    assert registry.winner() == PlayerRole.UNDERCOVER
+
+
+def test_blank_wins_when_undercovers_are_out():
+    N, U, B = PlayerRole.NORMAL, PlayerRole.UNDERCOVER, PlayerRole.BLANK
+    registry = make_registry([N, N, N, N, U, B, B])
+    registry.eliminate(4)
+    assert registry.winner() is None
+    registry.eliminate(0)
+    assert registry.winner() is None
+    registry.eliminate(1)
+    assert registry.winner() == PlayerRole.BLANK
+
+
+def test_normal_wins_when_all_hidden_roles_are_out():
+    N, U, B = PlayerRole.NORMAL, PlayerRole.UNDERCOVER, PlayerRole.BLANK
+    registry = make_registry([N, N, N, N, N, U, U, B])
+    for player_id in (5, 7):
+        registry.eliminate(player_id)
+        assert registry.winner() is None
+    registry.eliminate(6)
+    assert registry.winner() == PlayerRole.NORMAL
+    # 重复淘汰不影响计数
+    registry.eliminate(6)
+    assert registry.alive_count() == 5
+
+
+# ==================== 身份分配 ====================
+def assignment(state) -> list[tuple]:
+    return [(p.id, p.name, p.player_type, p.player_role, p.word) for p in state["players"]]
+
+
+def test_seeded_role_assignment():
+    table = TableConfig(9, 2, 1)
+    manager = UnderCoverGameManager()
+    state = manager.initialize_game(num_humans=2, seed=42, table=table)
+    assert state["seed"] == 42
+    assert assignment(manager.initialize_game(num_humans=2, seed=42, table=table)) == assignment(state)
+
+    players = list(state["players"])
+    assert [p.id for p in players] == list(range(9))
+    roles = Counter(p.player_role for p in players)
+    assert roles == {PlayerRole.NORMAL: 6, PlayerRole.UNDERCOVER: 2, PlayerRole.BLANK: 1}
+    assert sum(p.player_type == PlayerType.HUMAN for p in players) == 2
+    # 同一身份的玩家拿到同一个词语，白板没有词语，平民与卧底的词语不同
+    words = {role: {p.word for p in players if p.player_role == role} for role in roles}
+    assert words[PlayerRole.BLANK] == {""}
+    assert len(words[PlayerRole.NORMAL]) == len(words[PlayerRole.UNDERCOVER]) == 1
+    assert words[PlayerRole.NORMAL] != words[PlayerRole.UNDERCOVER]
+
+
+def test_different_seeds_give_different_assignments():
+    table = TableConfig(9, 2, 1)
+    manager = UnderCoverGameManager()
+    assignments = {tuple(assignment(manager.initialize_game(num_humans=0, seed=seed, table=table))) for seed in range(5)}
+    assert len(assignments) > 1
+
+
+def test_human_count_out_of_range():
+    with pytest.raises(ValueError, match="人类玩家数"):
+        UnderCoverGameManager().initialize_game(num_humans=7, seed=1, table=TableConfig(6, 1, 0))
@@ -0,0 +1,237 @@
+"""
+File: test_votes.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+投票测试：投票解析与兜底、模型回答无效时的重试与兜底；计票的各平票策略、弃权与非法票、空输入；经淘汰节点的重投路径与重投上限；无人淘汰回合数上限保证对局结束
+"""
+import random
+
+from src.agents.fake import FakeChatModel
+from src.agents.llm import override_llm
+from src.graph import nodes, votes
+from src.graph.builder import GAME_RECURSION_LIMIT, get_game_graph
+from src.graph.suspicion import VoteMode
+from src.graph.types import GameStatus, TableConfig, UnderCoverGameManager
+from src.graph.votes import TiePolicy, fallback_vote, parse_vote, tally
+
+
+class BadVoteLLM(FakeChatModel):
+    """前 bad 次投票请求返回无法解析的回答，之后返回正常回答"""
+    bad: int = 0
+    calls: int = 0
+
+    def invoke(self, prompt, **kwargs):
+        message = super().invoke(prompt, **kwargs)
+        self.calls += 1
+        if self.calls <= self.bad:
+            message.content = "我还没想好"
+        return message
+
+
+# ==================== 投票解析与兜底 ====================
+def test_parse_json_and_plain_numbers():
+    assert parse_vote('{"vote": 3}', {1, 2, 3}) == 3
+    assert parse_vote('{"player_id": "2"}', {1, 2, 3}) == 2
+    assert parse_vote("我投3号", {1, 2, 3}) == 3
+
+
+def test_parse_full_width_digits():
+    assert parse_vote("我投２号", {1, 2, 3}) == 2
+    assert parse_vote('{"vote": "３"}', {1, 2, 3}) == 3
+
+
+def test_parse_extra_text():
+    text = '分析：2号的描述太笼统，5号也可疑。\n最终决定：{"vote": 5, "reason": "描述偏离"}'
+    assert parse_vote(text, {1, 2, 5}) == 5
+    # JSON 中的编号不合法时，取文本中第一个合法编号
+    assert parse_vote('我怀疑4号 {"vote": 9}', {3, 4}) == 4
+    assert parse_vote("没有合适的人选", {1, 2}) is None
+
+
+def test_parse_rejects_self_and_dead_players():
+    # 投票者1不在自己的候选人中，3号已出局
+    candidates = {2, 4}
+    assert parse_vote('{"vote": 1}', candidates) is None
+    assert parse_vote("投3号", candidates) is None
+    assert parse_vote("1号和3号都不投，投4号", candidates) == 4
+
+
+def test_fallback_vote_is_deterministic_and_valid():
+    candidates = {2, 4, 5}
+    picks = [fallback_vote(1, candidates, game_round) for game_round in range(1, 7)]
+    assert set(picks) == candidates
+    assert picks == [fallback_vote(1, candidates, game_round) for game_round in range(1, 7)]
+    assert fallback_vote(3, {4}, 2) == 4
+
+
+def test_ai_vote_retries_then_falls_back(monkeypatch):
+    monkeypatch.setattr(nodes, "VOTE_MAX_RETRIES", 2)
+    monkeypatch.setattr(nodes, "VOTE_RETRY_BACKOFF", 0)
+    manager = UnderCoverGameManager()
+    state = manager.initialize_game(num_humans=0, seed=7)
+    players = list(state["players"])
+    speeches = {player.id: f"玩家{player.id}的发言" for player in players}
+    player, ballot = players[0], list(speeches)
+    candidates = {player_id for player_id in ballot if player_id != player.id}
+    client = BadVoteLLM(seed=7, ttft_ms=0, tokens_per_sec=0, bad=3)
+    before = votes.get_vote_stats().as_dict()
+
+    with override_llm(client):
+        vote = nodes._ai_vote(manager, player, speeches, ballot, 2, 0, "无", "test", votes.VoteCollector())
+
+    after = votes.get_vote_stats().as_dict()
+    assert vote == fallback_vote(player.id, candidates, 2)
+    assert client.calls == 3
+    assert after["requests"] - before["requests"] == 3
+    assert after["invalid"] - before["invalid"] == 3
+    assert after["retries"] - before["retries"] == 2
+    assert after["fallbacks"] - before["fallbacks"] == 1
+
+
+# ==================== 计票 ====================
+def test_single_top_eliminated():
+    result = tally({1: 2, 2: 3, 3: 2, 4: 2}, [1, 2, 3, 4])
+    assert result.eliminated == 2
+    assert result.counts == {2: 3, 3: 1}
+    assert not result.tied and not result.revote
+
+
+def test_tie_revote_policy():
+    result = tally({1: 2, 2: 1, 3: 4, 4: 3}, [1, 2, 3, 4], TiePolicy.REVOTE)
+    assert result.eliminated is None
+    assert result.tied == [1, 2, 3, 4]
+    assert result.revote
+
+
+def test_tie_revote_exhausted_eliminates_nobody():
+    result = tally({1: 2, 2: 1}, [1, 2], TiePolicy.REVOTE, allow_revote=False)
+    assert result.eliminated is None
+    assert result.tied == [1, 2]
+    assert not result.revote
+
+
+def test_tie_none_policy():
+    result = tally({1: 2, 2: 1, 3: 1, 4: 2}, [1, 2, 3, 4], TiePolicy.NONE)
+    assert result.eliminated is None
+    assert result.tied == [1, 2]
+    assert not result.revote
+
+
+def test_tie_random_policy_is_seeded():
+    ballots = {1: 2, 2: 1, 3: 4, 4: 3}
+    picks = {tally(ballots, [1, 2, 3, 4], TiePolicy.RANDOM, random.Random(seed)).eliminated for seed in range(20)}
+    assert picks <= {1, 2, 3, 4} and len(picks) > 1
+    first = tally(ballots, [1, 2, 3, 4], TiePolicy.RANDOM, random.Random(7))
+    again = tally(ballots, [1, 2, 3, 4], TiePolicy.RANDOM, random.Random(7))
+    assert first.eliminated == again.eliminated
+    assert first.tied == [1, 2, 3, 4] and not first.revote
+
+
+def test_abstentions_and_invalid_votes():
+    # 3 弃权；4 投给自己；5 投给非候选人；6 投给越界编号
+    ballots = {1: 2, 2: 1, 3: None, 4: 4, 5: 9, 6: 42, 7: 2}
+    result = tally(ballots, [1, 2, 3, 4, 5, 6, 7])
+    assert result.eliminated == 2
+    assert result.counts == {2: 2, 1: 1}
+    assert result.abstentions == [3]
+    assert result.invalid == [4, 5, 6]
+
+
+def test_no_valid_votes():
+    result = tally({1: None, 2: 2, 3: 99}, [1, 2, 3])
+    assert result.eliminated is None
+    assert result.counts == {}
+    assert result.abstentions == [1]
+    assert result.invalid == [2, 3]
+
+
+def test_empty_input():
+    result = tally({}, [])
+    assert result.eliminated is None
+    assert result.counts == {} and result.abstentions == [] and result.invalid == []
+    assert tally({}, [1, 2, 3]).eliminated is None
+
+
+def test_force_elimination_picks_from_tied_then_candidates():
+    tied = tally({1: 2, 2: 1}, [1, 2, 3], TiePolicy.NONE)
+    assert votes.force_elimination(tied, [1, 2, 3], random.Random(0)).eliminated in {1, 2}
+    empty = tally({1: None}, [1, 2, 3])
+    assert votes.force_elimination(empty, [1, 2, 3], random.Random(0)).eliminated in {1, 2, 3}
+
+
+# ==================== 淘汰节点 ====================
+def tied_state(seed: int = 1) -> dict:
+    """4人局第1回合，所有人互投形成四人平票"""
+    state = UnderCoverGameManager().initialize_game(num_humans=0, seed=seed, table=TableConfig(4, 1, 0))
+    ids = sorted(state["players"].alive_ids)
+    state["round_votes"] = {voter: ids[(i + 1) % len(ids)] for i, voter in enumerate(ids)}
+    return state
+
+
+def test_revote_path_stops_after_limit(monkeypatch):
+    monkeypatch.setattr(nodes, "VOTE_TIE_POLICY", TiePolicy.REVOTE)
+    monkeypatch.setattr(nodes, "VOTE_MAX_REVOTES", 2)
+    monkeypatch.setattr(nodes, "VOTE_MAX_IDLE_ROUNDS", 10)
+    state = tied_state()
+    ids = sorted(state["players"].alive_ids)
+
+    for revotes in (1, 2):
+        state = nodes.process_elimination_node(state)
+        assert state["vote_result"].revote
+        assert state["revote_candidates"] == ids
+        assert state["revotes"] == revotes
+        assert not state["eliminated_players"]
+
+    # 重投次数用尽：仍平票则本回合无人淘汰，并清空重投候选人
+    state = nodes.process_elimination_node(state)
+    assert not state["vote_result"].revote
+    assert state["vote_result"].eliminated is None
+    assert state["revote_candidates"] == []
+    assert state["revotes"] == 2
+    assert not state["eliminated_players"]
+
+
+def test_revote_only_counts_tied_candidates(monkeypatch):
+    monkeypatch.setattr(nodes, "VOTE_TIE_POLICY", TiePolicy.REVOTE)
+    state = tied_state()
+    ids = sorted(state["players"].alive_ids)
+    state["revote_candidates"] = ids[:2]
+    state["round_votes"] = {ids[0]: ids[1], ids[1]: ids[0], ids[2]: ids[1], ids[3]: ids[2]}
+    state = nodes.process_elimination_node(state)
+    assert state["vote_result"].eliminated == ids[1]
+    assert state["vote_result"].invalid == [ids[3]]
+    assert state["eliminated_players"] == [ids[1]]
+
+
+def test_idle_round_limit_forces_elimination(monkeypatch):
+    monkeypatch.setattr(nodes, "VOTE_TIE_POLICY", TiePolicy.NONE)
+    monkeypatch.setattr(nodes, "VOTE_MAX_IDLE_ROUNDS", 2)
+    state = tied_state()
+    for game_round in (1, 2):
+        state["current_round"] = game_round
+        state = nodes.process_elimination_node(state)
+        assert state["vote_result"].eliminated is None
+    state["current_round"] = 3
+    state = nodes.process_elimination_node(state)
+    assert state["vote_result"].eliminated in state["vote_result"].tied
+    assert state["eliminated_players"] == [state["vote_result"].eliminated]
+
+
+def test_perpetual_ties_still_end_game(monkeypatch):
+    """投票永远平票且不重投时，对局仍在有限回合内结束，而不是一直跑到递归上限"""
+    monkeypatch.setattr(nodes, "VOTE_TIE_POLICY", TiePolicy.NONE)
+    monkeypatch.setattr(nodes, "VOTE_MAX_IDLE_ROUNDS", 2)
+    monkeypatch.setattr(nodes, "VOTE_MODE", VoteMode.LLM)
+    monkeypatch.setattr(nodes, "VOTE_MAX_RETRIES", 0)
+    # 模型投票总是无法解析，兜底投给下一个编号的候选人：每位候选人恰好一票
+    monkeypatch.setattr(
+        votes, "fallback_vote",
+        lambda voter_id, candidates, game_round: min((c for c in candidates if c > voter_id), default=min(candidates)),
+    )
+    state = UnderCoverGameManager().initialize_game(num_humans=0, seed=2, table=TableConfig(5, 1, 0))
+    with override_llm(BadVoteLLM(seed=2, ttft_ms=0, tokens_per_sec=0, bad=10 ** 9)):
+        final = get_game_graph().invoke(state, {"recursion_limit": GAME_RECURSION_LIMIT})
+    assert final["game_status"] == GameStatus.GAME_END
+    idle_rounds = final["current_round"] - len(final["eliminated_players"])
+    assert idle_rounds <= nodes.VOTE_MAX_IDLE_ROUNDS
+    assert final["eliminated_players"]
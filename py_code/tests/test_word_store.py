@@ -0,0 +1,62 @@
+"""
+File: test_word_store.py
+Created Time: 2026-10-17
+Author: falcon (liuc47810@gmail.com)
+词语对仓库测试：精确n-gram相似度、相似度缓存（含内置词语对）与按条件抽样
+"""
+import math
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from src.constants.word_store import WordPairStore, _ngrams, pair_similarity
+
+
+def cosine(left: str, right: str) -> float:
+    a, b = Counter(_ngrams(left)), Counter(_ngrams(right))
+    dot = sum(a[gram] * b[gram] for gram in a)
+    return dot / math.sqrt(sum(v * v for v in a.values()) * sum(v * v for v in b.values()))
+
+
+def test_no_false_similarity_without_shared_grams():
+    similarity = pair_similarity(["平板", "西瓜", "路由器"], ["电子书", "冬瓜", "调制解调器"])
+    assert similarity[0] == 0.0
+    assert similarity[1] == pytest.approx(1 / 3)
+    assert similarity[2] == pytest.approx(cosine("路由器", "调制解调器"))
+
+
+def test_matches_dense_reference():
+    rng = random.Random(0)
+    alphabet = "天地人和春夏秋冬山水花草"
+    words = ["".join(rng.choices(alphabet, k=rng.randint(1, 5))) for _ in range(400)]
+    normal, undercover = words[:200], words[200:]
+    expected = [cosine(a, b) for a, b in zip(normal, undercover)]
+    np.testing.assert_allclose(pair_similarity(normal, undercover), expected, rtol=1e-5)
+
+
+def test_builtin_store_caches_similarity(tmp_path):
+    store = WordPairStore.from_builtin(str(tmp_path))
+    similarity = store.similarity
+    cached = list(tmp_path.glob("builtin.*.similarity.npy"))
+    assert len(cached) == 1
+    # 再次加载时以内存映射方式读取缓存
+    reloaded = WordPairStore.from_builtin(str(tmp_path)).similarity
+    assert isinstance(reloaded, np.memmap)
+    np.testing.assert_array_equal(reloaded, similarity)
+    assert WordPairStore.from_builtin().cache_path is None
+
+
+def test_load_csv_and_sample_by_difficulty(tmp_path):
+    path = tmp_path / "pairs.csv"
+    path.write_text("normal,undercover,category\n西瓜,冬瓜,水果\n平板,电子书,数码\n", encoding="utf-8")
+    store = WordPairStore.load(str(path))
+    rng = random.Random(1)
+    assert store.sample(rng, difficulty="easy") == ("平板", "电子书")
+    assert store.sample(rng, difficulty="normal") == ("西瓜", "冬瓜")
+    assert store.sample(rng, category="水果") == ("西瓜", "冬瓜")
+    with pytest.raises(ValueError):
+        store.sample(rng, difficulty="hard")
+    with pytest.raises(ValueError):
+        store.sample(rng, category="不存在")